@@ -1,8 +1,15 @@
 import streamlit as st
+from core.lazy import start_prewarm
 
 st.set_page_config(layout="wide")
 
 def main():
+    # The performance page is left out of the navigation; it is shown for ?view=performance.
+    if st.query_params.get("view") == "performance":
+        import Performance
+        Performance.main()
+        return
+
     st.write(
     """
     # Contoso Suites Main Page
@@ -21,5 +28,8 @@ def main():
     """
     )
 
+    # Load the SDKs the other pages use while the user reads this one.
+    start_prewarm()
+
 if __name__ == "__main__":
     main()
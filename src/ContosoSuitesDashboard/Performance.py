@@ -0,0 +1,70 @@
+import pandas as pd
+import streamlit as st
+from core.services import get_service_layer
+from core.telemetry import get_telemetry
+
+# Seconds between refreshes of the live metrics.
+REFRESH_SECONDS = 5
+
+def metrics_frame(snapshot):
+    """Convert a telemetry snapshot into a table with latencies in milliseconds."""
+
+    frame = pd.DataFrame(snapshot, columns=["kind", "name", "count", "errors", "p50_s", "p95_s", "p99_s",
+                                            "max_s", "mean_s", "payload_bytes", "tokens"])
+    for column in ("p50", "p95", "p99", "max", "mean"):
+        frame[f"{column}_ms"] = frame.pop(f"{column}_s") * 1000
+    return frame
+
+@st.fragment(run_every=REFRESH_SECONDS)
+def show_live_metrics():
+    """Show latency percentiles, cache hit rates and service queues, refreshed every few seconds."""
+
+    telemetry = get_telemetry()
+    frame = metrics_frame(telemetry.snapshot())
+    latency_columns = {column: st.column_config.NumberColumn(format="%.1f")
+                       for column in ("p50_ms", "p95_ms", "p99_ms", "max_ms", "mean_ms")}
+
+    st.write("## Dependencies")
+    st.dataframe(frame[~frame["kind"].isin(["page", "phase", "import"])], hide_index=True, column_config=latency_columns)
+
+    st.write("## Pages, phases and imports")
+    st.dataframe(frame[frame["kind"].isin(["page", "phase", "import"])].drop(columns=["payload_bytes", "tokens"]),
+                 hide_index=True, column_config=latency_columns)
+
+    st.write("## Caches")
+    st.dataframe(pd.DataFrame([{"cache": name, "hits": stats["hits"], "hit_rate": stats["hit_rate"]}
+                               for name, stats in telemetry.cache_stats().items()]),
+                 hide_index=True, column_config={"hit_rate": st.column_config.ProgressColumn(min_value=0, max_value=1)})
+
+    st.write("## Service queues")
+    services = get_service_layer()
+    st.dataframe(pd.DataFrame([{"dependency": name, **stats} for name, stats in services.stats.items()]),
+                 hide_index=True)
+    rate_limits = services.rate_limit_stats()
+    if rate_limits:
+        st.dataframe(pd.DataFrame([{"deployment": deployment, **stats} for deployment, stats in rate_limits.items()]),
+                     hide_index=True, column_config={"queued": st.column_config.TextColumn()})
+
+    st.caption(f"Since {pd.Timestamp(telemetry.started, unit='s'):%Y-%m-%d %H:%M:%S} UTC, "
+               f"refreshed every {REFRESH_SECONDS} seconds.")
+
+def main():
+    """Main function for the performance page. It is not listed in the navigation;
+    open the main page with ?view=performance to see it."""
+
+    st.write(
+    """
+    # Performance
+
+    Latency of every dependency call and page phase in this process, with p50, p95 and p99.
+    """
+    )
+
+    show_live_metrics()
+
+    if st.button("Reset metrics"):
+        get_telemetry().reset()
+        st.rerun()
+
+if __name__ == "__main__":
+    main()
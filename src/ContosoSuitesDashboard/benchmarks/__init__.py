@@ -0,0 +1,4 @@
+"""Benchmarks for the Contoso Suites dashboard.
+
+Run them from the ContosoSuitesDashboard folder, for example:
+    python -m benchmarks.bench_clients"""
@@ -0,0 +1,85 @@
+"""Recall/latency benchmark for the IVF index against exact search.
+
+The corpus is synthetic 1536-dimension vectors drawn around cluster centres,
+one of which is the sample query in data/Query_Vector.txt, so the data has
+the kind of structure real embeddings do. Queries are that sample query plus
+perturbed corpus vectors. Reports recall@k, QPS, build time and memory for
+each nprobe, next to the exact index.
+
+    python -m benchmarks.bench_ann --vectors 50000 --queries 200 --nprobe 1,4,8,16,32"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from benchmarks.stats import print_table
+from core.ann_index import IVFIndex
+from core.vector_index import normalize_rows, top_k
+
+QUERY_VECTOR_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "data", "Query_Vector.txt")
+
+
+def load_query_vector():
+    with open(QUERY_VECTOR_PATH, encoding="utf-8") as f:
+        return np.asarray(json.load(f), dtype=np.float32)
+
+
+def make_corpus(rng, count, clusters, seed_vector, spread=0.6):
+    dimensions = len(seed_vector)
+    centres = normalize_rows(rng.standard_normal((clusters, dimensions), dtype=np.float32))
+    centres[0] = normalize_rows(seed_vector)[0]
+    labels = rng.integers(0, clusters, count)
+    noise = rng.standard_normal((count, dimensions), dtype=np.float32) * (spread / np.sqrt(dimensions))
+    return normalize_rows(centres[labels] + noise)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=50_000)
+    parser.add_argument("--clusters", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--nprobe", default="1,4,8,16,32")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    query_vector = load_query_vector()
+    corpus = make_corpus(rng, args.vectors, args.clusters, query_vector)
+    items = [{"id": str(i)} for i in range(args.vectors)]
+    picks = rng.choice(args.vectors, args.queries - 1, replace=False)
+    queries = normalize_rows(np.vstack([
+        query_vector,
+        corpus[picks] + rng.standard_normal((len(picks), corpus.shape[1]), dtype=np.float32) * 0.01
+    ]))
+
+    # Exact search is the ground truth.
+    start = time.perf_counter()
+    truth = [set(top_k(corpus @ q, args.k).tolist()) for q in queries]
+    exact_qps = len(queries) / (time.perf_counter() - start)
+    rows = [{"index": "exact", "nprobe": "-", "recall": 1.0, "qps": exact_qps,
+             "build_s": 0.0, "memory_mb": corpus.nbytes / 2**20}]
+
+    start = time.perf_counter()
+    index = IVFIndex.build(items, corpus, nlist=args.nlist)
+    build_seconds = time.perf_counter() - start
+
+    for nprobe in (int(n) for n in args.nprobe.split(",")):
+        hits = 0
+        start = time.perf_counter()
+        for q, expected in zip(queries, truth):
+            found = index.search(q, args.k, minimum_similarity_score=-1.0, nprobe=nprobe)
+            hits += len(expected & {int(r["id"]) for r in found})
+        qps = len(queries) / (time.perf_counter() - start)
+        rows.append({"index": f"ivf{index.nlist}", "nprobe": nprobe, "recall": hits / (args.k * len(queries)),
+                     "qps": qps, "build_s": build_seconds, "memory_mb": index.memory_bytes() / 2**20})
+
+    print(f"recall@{args.k} over {args.vectors} vectors, {len(queries)} queries")
+    print_table(rows, ["index", "nprobe", "recall", "qps", "build_s", "memory_mb"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Cache size, cache-hit cost and browser payload of a hotel's bookings on the API Integration page.
+
+Fetches --bookings bookings for one hotel from a local stub of the Web API
+and compares, per rerun that hits st.cache_data:
+- response cache: the old page code; the cached httpx response is unpickled,
+  decoded from JSON again and every row is sent to the browser by st.table
+- typed frame: the cached typed DataFrame is unpickled and one page of
+  --page-size rows is sent to the browser by st.dataframe
+- typed frame, from date: the same with a start date pushed down to
+  /Hotels/{hotelId}/Bookings/{min_date}, which also shrinks the transfer
+
+Browser payloads are measured with Streamlit's own Arrow serializer.
+
+    python -m benchmarks.bench_bookings --bookings 50000 --page-size 500"""
+
+import argparse
+import datetime
+import pickle
+import statistics
+import time
+
+import pandas as pd
+from streamlit.dataframe_util import convert_anything_to_arrow_bytes
+
+from benchmarks.fakes import FakeWebApiHandler, start_fake_server
+from benchmarks.stats import print_table
+from core.bookings import bookings_frame, bookings_path, get_page
+from core.webapi import WebApiClient, WebApiSettings
+
+
+def time_reruns(rerun, count):
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        payload = rerun()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), payload
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bookings", type=int, default=50000)
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--min-date", type=datetime.date.fromisoformat, default=datetime.date(2024, 7, 1))
+    parser.add_argument("--reruns", type=int, default=5)
+    args = parser.parse_args()
+
+    FakeWebApiHandler.bookings_per_hotel = args.bookings
+    server, url = start_fake_server(FakeWebApiHandler)
+    client = WebApiClient(WebApiSettings(base_url=url, http2=False))
+    rows = []
+    try:
+        response = client.get(bookings_path(1))
+        response.read()
+        cached = pickle.dumps(response)
+
+        def response_rerun():
+            bookings = pickle.loads(cached).json()
+            return convert_anything_to_arrow_bytes(pd.DataFrame(bookings))
+
+        seconds, payload = time_reruns(response_rerun, args.reruns)
+        rows.append({"cache": "response cache", "rows": args.bookings, "transfer_kb": len(response.content) / 1024,
+                     "cached_kb": len(cached) / 1024, "rerun_ms": seconds * 1000, "browser_kb": len(payload) / 1024})
+
+        for name, min_date in (("typed frame", None), ("typed frame, from date", args.min_date)):
+            response = client.get(bookings_path(1, min_date))
+            frame = bookings_frame(response.json())
+            cached = pickle.dumps(frame)
+
+            def frame_rerun():
+                return convert_anything_to_arrow_bytes(get_page(pickle.loads(cached), 1, args.page_size))
+
+            seconds, payload = time_reruns(frame_rerun, args.reruns)
+            rows.append({"cache": name, "rows": len(frame), "transfer_kb": len(response.content) / 1024,
+                         "cached_kb": len(cached) / 1024, "rerun_ms": seconds * 1000,
+                         "browser_kb": len(payload) / 1024})
+    finally:
+        client.close()
+        server.shutdown()
+
+    print(f"{args.bookings} bookings, pages of {args.page_size}, from date {args.min_date}")
+    print_table(rows, ["cache", "rows", "transfer_kb", "cached_kb", "rerun_ms", "browser_kb"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Throughput of loading user reviews into Cosmos DB: one at a time versus the bulk loader.
+
+Writes --records synthetic reviews to a JSON file shaped like
+src/data/UserReviews.json and loads them into FakeCosmosContainer, a local
+stand-in that rejects requests beyond --ru-per-second with 429s, using a
+simulated embedding endpoint. Compares:
+- one at a time: embed each review and upsert it, for --single reviews
+- bulk, full load: load_corpus() into an empty container
+- bulk, unchanged: the same file again; the manifest skips every record
+- bulk, 1% changed: the file with 1% of the reviews edited
+
+    python -m benchmarks.bench_bulk_load --records 20000 --ru-per-second 100000"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from azure.cosmos.exceptions import CosmosHttpResponseError
+
+from benchmarks.fakes import FakeCosmosContainer
+from benchmarks.stats import print_table
+from core.batch_embeddings import BatchEmbedder
+from core.bulk_load import CORPORA, LoadManifest, iter_json_records, load_corpus, retry_after_seconds
+
+WORDS = ("great stay friendly staff pool breakfast clean room noisy air conditioning broken "
+         "ocean view suite shuttle airport late checkout spa loved would return").split()
+
+
+def write_reviews(path, count, seed=42, changed=0.0):
+    """Write count reviews as a JSON array; a changed fraction of them get a different text."""
+
+    rng = random.Random(seed)
+    change = random.Random(seed + 1)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[\n")
+        for i in range(count):
+            text = " ".join(rng.choice(WORDS) for _ in range(40))
+            if change.random() < changed:
+                text += " Updated after the stay."
+            review = {"hotel_id": i % 20 + 1, "hotel": f"Contoso Suites {i % 20 + 1}", "user_id": i,
+                      "rating": i % 5 + 1, "text": text}
+            f.write(("," if i else "") + json.dumps(review) + "\n")
+        f.write("]\n")
+
+
+def make_embedder(latency, dimensions, max_batch_items):
+    def embed_batch(texts):
+        time.sleep(latency)
+        return [[(len(text) % 97) / 97] * dimensions for text in texts]
+
+    embedder = BatchEmbedder(embed_batch, max_batch_items=max_batch_items, max_in_flight=8)
+    return lambda texts: [vector.tolist() for vector in embedder.embed(texts)]
+
+
+def load_one_at_a_time(corpus, path, container, embed, count):
+    start = time.perf_counter()
+    for record in list(iter_json_records(path))[:count]:
+        document = corpus.make_document(record, embed([corpus.text.format_map(record)])[0])
+        while True:
+            try:
+                container.upsert_item(body=document)
+                break
+            except CosmosHttpResponseError as error:
+                time.sleep(retry_after_seconds(error, 1))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--single", type=int, default=300,
+        help="How many reviews to load one at a time for the baseline.")
+    parser.add_argument("--ru-per-second", type=float, default=100000,
+        help="Provisioned throughput of the fake container.")
+    parser.add_argument("--round-trip", type=float, default=0.005)
+    parser.add_argument("--embedding-latency", type=float, default=0.05,
+        help="Simulated seconds per embedding request.")
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--max-concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    corpus = CORPORA["reviews"]
+    embed = make_embedder(args.embedding_latency, args.dimensions, max_batch_items=1000)
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "UserReviews.json")
+        changed_path = os.path.join(directory, "UserReviewsChanged.json")
+        write_reviews(path, args.records)
+        write_reviews(changed_path, args.records, changed=0.01)
+
+        def container():
+            return FakeCosmosContainer(partition_key_path=corpus.partition_key, round_trip=args.round_trip,
+                                       ru_per_second=args.ru_per_second)
+
+        baseline = container()
+        elapsed = load_one_at_a_time(corpus, path, baseline, embed, args.single)
+        rows.append({"run": "one at a time", "records": args.single, "written": len(baseline.items),
+                     "ru": baseline.request_charge, "throttled": baseline.throttled, "seconds": elapsed,
+                     "records_per_s": args.single / elapsed, "min_per_million": elapsed / args.single * 1e6 / 60})
+
+        bulk = container()
+        manifest = LoadManifest(os.path.join(directory, "manifest.sqlite3"))
+        for name, run_path in (("bulk, full load", path), ("bulk, unchanged", path), ("bulk, 1% changed", changed_path)):
+            charge_before = bulk.request_charge
+            report = load_corpus(corpus, run_path, bulk, embed=embed, manifest=manifest,
+                                 max_concurrency=args.max_concurrency)
+            rows.append({"run": name, "records": report["read"], "written": report["written"],
+                         "ru": bulk.request_charge - charge_before, "throttled": report["throttles"],
+                         "seconds": report["elapsed_s"], "records_per_s": report["records_per_second"],
+                         "min_per_million": report["elapsed_s"] / report["read"] * 1e6 / 60})
+        manifest.close()
+        assert len(bulk.items) == args.records
+
+    print(f"{args.ru_per_second:g} RU/s provisioned, {args.round_trip * 1000:g} ms round trips, "
+          f"{args.embedding_latency * 1000:g} ms per embedding request, {args.dimensions} dimensions")
+    print_table(rows, ["run", "records", "written", "ru", "throttled", "seconds", "records_per_s", "min_per_million"])
+
+
+if __name__ == "__main__":
+    main()
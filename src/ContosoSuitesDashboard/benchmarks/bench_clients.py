@@ -0,0 +1,76 @@
+"""Compare cold and warm per-call latency of Azure OpenAI chat requests.
+
+Cold calls build a new credential, token provider and client for every
+request, the way the pages used to. Warm calls reuse one client from the
+shared registry, with its cached token and pooled connections.
+
+    python -m benchmarks.bench_clients --calls 200 --token-latency 0.05"""
+
+import argparse
+import time
+
+from benchmarks.fakes import FakeAzureOpenAIHandler, FakeCredential, start_fake_server
+from benchmarks.stats import print_table, summarize_latencies
+from core.clients import CachedTokenProvider, build_openai_client
+
+MESSAGES = [{"role": "user", "content": "How many rooms are available tonight?"}]
+
+
+def time_call(client):
+    start = time.perf_counter()
+    client.chat.completions.create(model="gpt-4o", messages=MESSAGES)
+    return time.perf_counter() - start
+
+
+def run_cold(endpoint, calls, token_latency):
+    """Build everything from scratch on every call."""
+
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        token_provider = CachedTokenProvider(FakeCredential(token_latency))
+        client = build_openai_client(endpoint, token_provider)
+        time_call(client)
+        samples.append(time.perf_counter() - start)
+        client.close()
+    return samples
+
+
+def run_warm(endpoint, calls, token_latency):
+    """Reuse one client, token and connection pool for every call."""
+
+    credential = FakeCredential(token_latency)
+    client = build_openai_client(endpoint, CachedTokenProvider(credential))
+    # Prime the token cache and the connection pool.
+    time_call(client)
+    samples = [time_call(client) for _ in range(calls)]
+    client.close()
+    return samples, credential.token_requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--token-latency", type=float, default=0.05,
+        help="Simulated seconds to acquire a token from the credential chain.")
+    parser.add_argument("--server-latency", type=float, default=0.0,
+        help="Simulated seconds the fake endpoint takes to answer.")
+    args = parser.parse_args()
+
+    FakeAzureOpenAIHandler.latency = args.server_latency
+    server, endpoint = start_fake_server(FakeAzureOpenAIHandler)
+    try:
+        cold = run_cold(endpoint, args.calls, args.token_latency)
+        warm, warm_token_requests = run_warm(endpoint, args.calls, args.token_latency)
+    finally:
+        server.shutdown()
+
+    rows = [
+        {"mode": "cold", "token_requests": args.calls, **summarize_latencies(cold)},
+        {"mode": "warm", "token_requests": warm_token_requests, **summarize_latencies(warm)}
+    ]
+    print_table(rows, ["mode", "count", "token_requests", "mean_ms", "p50_ms", "p95_ms", "p99_ms"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Measure embedding throughput: one request per text versus the batch embedder.
+
+    python -m benchmarks.bench_embeddings --texts 2000 --latency 0.05"""
+
+import argparse
+import random
+import time
+
+from benchmarks.fakes import FakeAzureOpenAIHandler, FakeCredential, start_fake_server
+from core.batch_embeddings import BatchEmbedder
+from core.clients import CachedTokenProvider, build_openai_client
+
+WORDS = ("guest room booking pool towel checkout late air conditioning broken "
+         "reservation refund ocean view suite breakfast shuttle airport").split()
+
+
+def make_texts(count, words_per_text=120):
+    rng = random.Random(42)
+    return [" ".join(rng.choice(WORDS) for _ in range(words_per_text)) + f" call {i}" for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--single", type=int, default=100,
+        help="How many texts to embed one request at a time for the baseline.")
+    parser.add_argument("--latency", type=float, default=0.05,
+        help="Simulated seconds the fake endpoint takes per request.")
+    parser.add_argument("--batch-items", type=int, default=256)
+    parser.add_argument("--in-flight", type=int, default=4)
+    args = parser.parse_args()
+
+    FakeAzureOpenAIHandler.latency = args.latency
+    server, endpoint = start_fake_server(FakeAzureOpenAIHandler)
+    client = build_openai_client(endpoint, CachedTokenProvider(FakeCredential(0)))
+
+    def embed_batch(texts):
+        response = client.embeddings.create(model="text-embedding-ada-002", input=texts)
+        return [item.embedding for item in response.data]
+
+    texts = make_texts(args.texts)
+    try:
+        start = time.perf_counter()
+        for text in texts[:args.single]:
+            embed_batch([text])
+        single_rate = args.single / (time.perf_counter() - start)
+
+        embedder = BatchEmbedder(embed_batch, max_batch_items=args.batch_items, max_in_flight=args.in_flight)
+        start = time.perf_counter()
+        vectors = embedder.embed(texts)
+        batched_rate = len(vectors) / (time.perf_counter() - start)
+    finally:
+        client.close()
+        server.shutdown()
+
+    print(f"one per request: {single_rate * 60:,.0f} texts/minute")
+    print(f"batched:         {batched_rate * 60:,.0f} texts/minute "
+          f"({embedder.requests_sent} requests for {len(texts)} texts)")
+
+
+if __name__ == "__main__":
+    main()
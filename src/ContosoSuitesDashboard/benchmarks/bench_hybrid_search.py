@@ -0,0 +1,187 @@
+"""Quality and latency of hybrid (BM25 + vector) transcript search against vector-only.
+
+The corpus is synthetic call transcripts: each one a guest name, booking code
+and room number around one of a dozen complaints. A transcript's embedding is
+its complaint's direction plus noise, so, like real embeddings, it tells
+complaints apart but not one guest's booking from another's. Three kinds of
+query are run:
+
+- exact: a booking code, or a room number and surname; one transcript is relevant.
+- mixed: a guest's full name and a paraphrase of their complaint; one is relevant.
+- semantic: a paraphrase of a complaint sharing few words with the transcripts;
+  every transcript about that complaint is relevant.
+
+For each mode and kind the report shows hit rate@k and MRR (precision@k for
+semantic queries), and the search latency. total_p50_ms adds --embed-ms for
+the query embedding: vector-only search waits for it, while hybrid search
+runs the lexical half during it, as the Call Center Search page does.
+
+    python -m benchmarks.bench_hybrid_search --transcripts 20000 --queries 200"""
+
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.stats import percentile, print_table, summarize_latencies
+from core.lexical_index import BM25Index, hybrid_search
+from core.vector_index import VectorIndex, normalize_rows
+
+DIMENSIONS = 1536
+# Each complaint as a guest describes it in a transcript, and as a paraphrased search.
+COMPLAINTS = [
+    ("The air conditioning stopped working and it is far too hot to sleep.",
+     "cooling broken, unbearably warm overnight"),
+    ("There is a mistake on my bill, I was charged twice for the spa.",
+     "paid double for a massage treatment"),
+    ("The shower has had no hot water for two mornings.",
+     "freezing bathroom tap when washing"),
+    ("I would like to extend my stay by two more nights.",
+     "keep our suite a couple of extra days"),
+    ("The pool was closed all afternoon without any notice.",
+     "swimming area shut without warning"),
+    ("Housekeeping did not clean the room yesterday.",
+     "nobody tidied up after us"),
+    ("I left my passport in the safe after checking out.",
+     "forgot travel documents in the locker when leaving"),
+    ("The wifi keeps dropping in the conference hall.",
+     "internet connection unstable during our meeting"),
+    ("We want to book a table at the restaurant for our anniversary.",
+     "reserve dinner to celebrate a special date"),
+    ("The airport shuttle never arrived this morning.",
+     "transfer from the terminal did not show up"),
+    ("There is loud music from next door every night.",
+     "neighbours too noisy, cannot rest"),
+    ("My credit card was declined at check in.",
+     "payment refused on arrival"),
+]
+FIRST_NAMES = ["Amara", "Bruno", "Chen", "Dana", "Emeka", "Farah", "Goran", "Hana", "Ivan", "Julia",
+               "Kenji", "Lena", "Mateo", "Nia", "Omar", "Priya", "Quinn", "Rosa", "Sven", "Tariq"]
+SYLLABLES = ["ka", "lo", "mi", "ne", "ra", "sto", "vel", "din", "bar", "tor", "wen", "zu", "ha", "gri", "pol"]
+MODES = ("vector", "hybrid")
+KINDS = ("exact", "mixed", "semantic")
+
+
+def make_corpus(rng, count, dimensions, noise):
+    complaints = normalize_rows(rng.standard_normal((len(COMPLAINTS), dimensions), dtype=np.float32))
+    labels = rng.integers(0, len(COMPLAINTS), count)
+    guests = []
+    texts = []
+    for row, label in enumerate(labels):
+        guest = {
+            "first": FIRST_NAMES[rng.integers(len(FIRST_NAMES))],
+            "last": "".join(rng.choice(SYLLABLES, 3)).capitalize(),
+            "booking": f"BK-{row:06d}",
+            "room": str(rng.integers(100, 1300))
+        }
+        guests.append(guest)
+        texts.append(
+            f"Thank you for calling Contoso Suites. My name is {guest['first']} {guest['last']}, booking "
+            f"{guest['booking']}, room {guest['room']}. {COMPLAINTS[label][0]} Is there anything else?"
+        )
+    vectors = normalize_rows(complaints[labels] + perturbation(rng, count, dimensions, noise))
+    return complaints, labels, guests, texts, vectors
+
+
+def perturbation(rng, count, dimensions, scale):
+    return rng.standard_normal((count, dimensions), dtype=np.float32) * (scale / np.sqrt(dimensions))
+
+
+def make_queries(rng, count, complaints, labels, guests, noise):
+    """(kind, text, embedding, relevant rows) for count queries of each kind."""
+
+    dimensions = complaints.shape[1]
+    unrelated = normalize_rows(rng.standard_normal((1, dimensions), dtype=np.float32))[0]
+    queries = []
+    for row in rng.choice(len(labels), count, replace=False):
+        guest = guests[row]
+        text = f"booking {guest['booking']}" if row % 2 else f"room {guest['room']} {guest['last']}"
+        # The embedding of a code or a name says little about which transcript it is in.
+        embedding = normalize_rows(unrelated + perturbation(rng, 1, dimensions, noise))[0]
+        queries.append(("exact", text, embedding, {int(row)}))
+    for row in rng.choice(len(labels), count, replace=False):
+        guest = guests[row]
+        label = labels[row]
+        text = f"{guest['first']} {guest['last']} {COMPLAINTS[label][1]}"
+        embedding = normalize_rows(complaints[label] + perturbation(rng, 1, dimensions, noise))[0]
+        queries.append(("mixed", text, embedding, {int(row)}))
+    for label in rng.integers(0, len(COMPLAINTS), count):
+        embedding = normalize_rows(complaints[label] + perturbation(rng, 1, dimensions, noise))[0]
+        queries.append(("semantic", COMPLAINTS[label][1], embedding, set(np.flatnonzero(labels == label).tolist())))
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--transcripts", type=int, default=20_000)
+    parser.add_argument("--queries", type=int, default=200, help="Queries of each kind.")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--dimensions", type=int, default=DIMENSIONS)
+    parser.add_argument("--noise", type=float, default=1.0, help="Norm of the noise added to embeddings.")
+    parser.add_argument("--minimum-similarity", type=float, default=0.0,
+        help="Vector results below this are dropped, as with the page's Minimum Similarity Score.")
+    parser.add_argument("--embed-ms", type=float, default=60.0, help="Query embedding latency to add.")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    complaints, labels, guests, texts, vectors = make_corpus(rng, args.transcripts, args.dimensions, args.noise)
+    queries = make_queries(rng, args.queries, complaints, labels, guests, args.noise)
+
+    with tempfile.TemporaryDirectory() as directory:
+        index = VectorIndex(directory)
+        index.add([{"id": str(row)} for row in range(args.transcripts)], vectors)
+        start = time.perf_counter()
+        lexical_index = BM25Index()
+        lexical_index.add(texts)
+        build_seconds = time.perf_counter() - start
+
+        # A first search of each kind builds the cached postings arrays, as a warm replica has them.
+        for _, text, embedding, _ in queries[::args.queries]:
+            hybrid_search(index, lexical_index.search(text), embedding, args.k, args.minimum_similarity)
+
+        measurements = {(mode, kind): [] for mode in MODES for kind in KINDS}
+        for kind, text, embedding, relevant in queries:
+            start = time.perf_counter()
+            results = index.search(embedding, args.k, args.minimum_similarity)
+            measurements["vector", kind].append((time.perf_counter() - start, 0.0, results, relevant))
+
+            start = time.perf_counter()
+            hits = lexical_index.search(text)
+            lexical_seconds = time.perf_counter() - start
+            results = hybrid_search(index, hits, embedding, args.k, args.minimum_similarity)
+            measurements["hybrid", kind].append((time.perf_counter() - start, lexical_seconds, results, relevant))
+
+    embed_seconds = args.embed_ms / 1000
+    rows = []
+    for kind, mode in ((kind, mode) for kind in KINDS for mode in MODES):
+        samples = measurements[mode, kind]
+        quality = []
+        reciprocal_ranks = []
+        totals = []
+        for seconds, lexical_seconds, results, relevant in samples:
+            found = [int(result["id"]) for result in results]
+            if kind == "semantic":
+                quality.append(sum(row in relevant for row in found) / args.k)
+            else:
+                quality.append(float(bool(relevant & set(found))))
+            ranks = [rank for rank, row in enumerate(found, start=1) if row in relevant]
+            reciprocal_ranks.append(1 / ranks[0] if ranks else 0.0)
+            # The lexical search runs while the query is being embedded.
+            totals.append(max(embed_seconds, lexical_seconds) + seconds - lexical_seconds)
+        latency = summarize_latencies([seconds for seconds, *_ in samples])
+        rows.append({
+            "mode": mode, "kind": kind,
+            "metric": f"precision@{args.k}" if kind == "semantic" else f"hit@{args.k}",
+            "quality": float(np.mean(quality)), "mrr": float(np.mean(reciprocal_ranks)),
+            "p50_ms": latency["p50_ms"], "p95_ms": latency["p95_ms"],
+            "total_p50_ms": percentile(totals, 50) * 1000
+        })
+
+    print(f"{args.transcripts} transcripts, {args.queries} queries of each kind, "
+          f"BM25 index built in {build_seconds:.2f} s")
+    print_table(rows, ["kind", "mode", "metric", "quality", "mrr", "p50_ms", "p95_ms", "total_p50_ms"])
+
+
+if __name__ == "__main__":
+    main()
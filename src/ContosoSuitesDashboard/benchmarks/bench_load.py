@@ -0,0 +1,380 @@
+"""Throughput and tail latency of the dashboard pages under concurrent users.
+
+Every Azure dependency is replaced by a local stand-in: fake HTTP servers for
+Azure OpenAI chat and embeddings and for the ContosoSuitesWebAPI routes, and
+in-process fakes for the Language service and Cosmos DB. The dashboard is
+pointed at them through a generated secrets file, so the page functions of
+pages/1_ to pages/6_ run unchanged, with their caches, service layer and
+rate limiting. Speech has no stand-in, so the Call Center page starts from a
+transcript.
+
+--users threads act as users for --seconds, each repeatedly picking one of
+the --pages at random and running what that page does for one interaction:
+- 1 Chat with Data: stream an answer through the semantic cache
+- 2 API Integration: list hotels, load a hotel's bookings, ask the chat endpoint
+- 3 Vector Search: vectorize a query and search maintenance requests
+- 4 Call Center: analyze a call, embed it and save it to Cosmos DB
+- 5 Call Center Search: embed a query and run the Cosmos DB vector search
+- 6 Copilot Chat: stream a reply from the maintenance copilot
+Questions and calls are drawn from --distinct-questions and --distinct-calls,
+so caches hit about as often as they would with that many distinct inputs.
+
+The report has throughput and p50/p95/p99 per page and per dependency call.
+Each run is appended to --history with its git commit, and compared with the
+last earlier run with the same settings, or with --baseline, a commit.
+
+    python -m benchmarks.bench_load --users 16 --seconds 30 --openai-latency 0.3 --tokens-per-second 50"""
+
+import argparse
+import datetime
+import importlib.util
+import json
+import os
+import random
+import subprocess
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import streamlit as st
+
+from benchmarks.fakes import (
+    FakeAsyncCosmosClient,
+    FakeAzureOpenAIHandler,
+    FakeCosmosContainer,
+    FakeCredential,
+    FakeLanguageClient,
+    FakeWebApiHandler,
+    start_fake_server
+)
+from benchmarks.stats import print_table, summarize_latencies
+
+PAGES_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pages")
+PAGES = {
+    1: ("Chat with Data", "1_Chat_with_Data.py"),
+    2: ("API Integration", "2_API_Integration.py"),
+    3: ("Vector Search", "3_Vector_Search.py"),
+    4: ("Call Center", "4_Call_Center.py"),
+    5: ("Call Center Search", "5_Call_Center_Search.py"),
+    6: ("Copilot Chat", "6_Copilot_Chat.py")
+}
+DEFAULT_HISTORY_PATH = os.path.join(".cache", "load_history.jsonl")
+
+SECRETS = """
+[aoai]
+endpoint = "{openai_url}"
+key = "fake-key"
+deployment_name = "gpt-4o"
+embedding_deployment_name = "text-embedding-ada-002"
+{quota}
+
+[api]
+endpoint = "{webapi_url}"
+
+[language]
+endpoint = "https://fake-language.local/"
+key = "fake-key"
+
+[speech]
+key = "fake-key"
+region = "fake-region"
+
+[cosmos]
+endpoint = "https://fake-cosmos.local:443/"
+database_name = "ContosoSuites"
+client_id = "fake-client-id"
+
+[embedding_cache]
+path = "{directory}/embeddings.sqlite3"
+
+[result_cache]
+path = "{directory}/results.sqlite3"
+
+[vector_index]
+path = "{directory}/transcript_index"
+"""
+
+
+def write_secrets(directory, openai_url, webapi_url, tokens_per_minute=None):
+    """Write a secrets file that points the dashboard at the stand-ins, with its caches in directory."""
+
+    quota = f"tokens_per_minute = {tokens_per_minute}" if tokens_per_minute else ""
+    path = os.path.join(directory, "secrets.toml")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(SECRETS.format(openai_url=openai_url, webapi_url=webapi_url, quota=quota,
+                               directory=directory.replace("\\", "/")))
+    return path
+
+
+def load_page(filename):
+    """Import a page as a module without running its main()."""
+
+    name = "page_" + os.path.splitext(filename)[0].lower()
+    spec = importlib.util.spec_from_file_location(name, os.path.join(PAGES_DIRECTORY, filename))
+    page = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(page)
+    return page
+
+
+def question(rng, args):
+    return f"Which hotels had the most maintenance requests in week {rng.randrange(args.distinct_questions)}?"
+
+
+def call_contents(rng, args):
+    n = rng.randrange(args.distinct_calls)
+    return [
+        "Thank you for calling Contoso Suites, this call is being recorded. How can I help you today?",
+        f"Hi, I am calling about my reservation number {n}. The air conditioning in my room is not working.",
+        "I am sorry to hear that. I have created a maintenance request and a technician will come by this afternoon.",
+        "Thank you, that is very helpful. Have a nice day."
+    ]
+
+
+def chat_with_data(page, rng, args):
+    messages = [{"role": "user", "content": question(rng, args)}]
+    if not "".join(page.stream_chat_answer(messages)):
+        raise ValueError("Empty answer.")
+
+
+def api_integration(page, rng, args):
+    hotel = rng.choice(page.get_hotels())
+    page.get_hotel_bookings(hotel["id"])
+    page.invoke_chat_endpoint(question(rng, args))
+
+
+def vector_search(page, rng, args):
+    query_vector = page.handle_query_vectorization(question(rng, args))
+    page.handle_vector_search(query_vector).raise_for_status()
+
+
+def call_center(page, rng, args):
+    contents = call_contents(rng, args)
+    page.analyze_call(contents, True, True)
+    transcript = " ".join(contents)
+    if not page.is_transcript_saved(transcript):
+        embedding = page.generate_embeddings_for_call_contents(transcript)
+        page.save_transcript_to_cosmos_db(page.make_transcript_item(transcript, embedding))
+
+
+def call_center_search(page, rng, args):
+    page.make_cosmos_db_vector_search_request(page.get_embedding(question(rng, args)))
+
+
+def copilot_chat(page, rng, args):
+    if not page.send_message_to_copilot(question(rng, args)):
+        raise ValueError("Empty reply.")
+
+
+INTERACTIONS = {1: chat_with_data, 2: api_integration, 3: vector_search, 4: call_center,
+                5: call_center_search, 6: copilot_chat}
+
+
+def install_fakes(args, directory):
+    """Start the stand-ins and point the dashboard at them, before any page is loaded.
+    Returns the fake servers and the Cosmos DB container."""
+
+    FakeAzureOpenAIHandler.latency = args.openai_latency
+    FakeAzureOpenAIHandler.stream_tokens = args.stream_tokens
+    FakeAzureOpenAIHandler.tokens_per_second = args.tokens_per_second
+    FakeWebApiHandler.latency = args.webapi_latency
+    FakeWebApiHandler.copilot_pieces = [f"piece{i} " for i in range(args.stream_tokens)]
+    FakeWebApiHandler.copilot_piece_delay = 1 / args.tokens_per_second if args.tokens_per_second else 0.0
+    openai_server, openai_url = start_fake_server(FakeAzureOpenAIHandler)
+    webapi_server, webapi_url = start_fake_server(FakeWebApiHandler)
+
+    # Must happen before anything reads st.secrets.
+    st.config.set_option("secrets.files", [write_secrets(directory, openai_url, webapi_url, args.tpm)])
+
+    import core.clients
+    from core.services import get_service_layer
+
+    credential = FakeCredential(token_latency=0)
+    core.clients.get_credential = lambda managed_identity_client_id=None: credential
+    container = FakeCosmosContainer(round_trip=args.cosmos_round_trip)
+    core.clients.get_cosmos_container = lambda container_name: container
+    services = get_service_layer()
+    services.factories["language"] = lambda: FakeLanguageClient(args.language_latency, args.language_job_seconds)
+    services.factories["cosmos"] = lambda: FakeAsyncCosmosClient(container, args.cosmos_round_trip)
+    return [openai_server, webapi_server], container
+
+
+def run_users(args, pages):
+    """Run --users users for --seconds. Returns the latencies and error count of each page."""
+
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    first_errors = {}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.seconds
+
+    def user(number):
+        rng = random.Random(args.seed * 1000 + number)
+        while time.perf_counter() < deadline:
+            page_number = rng.choice(args.pages)
+            start = time.perf_counter()
+            try:
+                INTERACTIONS[page_number](pages[page_number], rng, args)
+            except Exception as error:
+                with lock:
+                    errors[page_number] += 1
+                    first_errors.setdefault(page_number, repr(error))
+            else:
+                with lock:
+                    latencies[page_number].append(time.perf_counter() - start)
+            if args.think:
+                time.sleep(rng.expovariate(1 / args.think))
+
+    threads = [threading.Thread(target=user, args=(i,), daemon=True) for i in range(args.users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for page_number, error in sorted(first_errors.items()):
+        print(f"{PAGES[page_number][0]}: {errors[page_number]} failed, the first with {error}")
+    return latencies, errors
+
+
+def git_commit():
+    """The checked-out commit, with + appended when tracked files have changes, or None outside git."""
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        changed = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                                 text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("+" if changed else "")
+
+
+def find_baseline(history_path, settings, baseline=None):
+    """The last run in the history with the same settings, made at the commit baseline if given."""
+
+    if not os.path.exists(history_path):
+        return None
+    found = None
+    with open(history_path, encoding="utf-8") as f:
+        for line in f:
+            run = json.loads(line)
+            if run["settings"] != settings:
+                continue
+            if baseline and not (run.get("commit") or "").startswith(baseline):
+                continue
+            found = run
+    return found
+
+
+def append_history(history_path, run):
+    directory = os.path.dirname(history_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(history_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(run) + "\n")
+
+
+def change(now, before):
+    return f"{(now - before) / before * 100:+.1f}%" if before else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--pages", type=lambda value: [int(p) for p in value.split(",")],
+        default=sorted(PAGES), help="Comma-separated page numbers to drive, 1 to 6.")
+    parser.add_argument("--think", type=float, default=0.5,
+        help="Mean seconds a user pauses between interactions, exponentially distributed.")
+    parser.add_argument("--distinct-questions", type=int, default=1000)
+    parser.add_argument("--distinct-calls", type=int, default=200)
+    parser.add_argument("--openai-latency", type=float, default=0.3,
+        help="Seconds to an Azure OpenAI response, or to the first token of a streamed one.")
+    parser.add_argument("--stream-tokens", type=int, default=40)
+    parser.add_argument("--tokens-per-second", type=float, default=50,
+        help="Rate of streamed Azure OpenAI and copilot tokens; 0 sends them at once.")
+    parser.add_argument("--tpm", type=int, default=None, help="Tokens per minute quota of the chat deployment.")
+    parser.add_argument("--webapi-latency", type=float, default=0.05)
+    parser.add_argument("--language-latency", type=float, default=0.05)
+    parser.add_argument("--language-job-seconds", type=float, default=1.0)
+    parser.add_argument("--cosmos-round-trip", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--history", default=DEFAULT_HISTORY_PATH,
+        help="JSON-lines file each run is appended to; empty to keep no history.")
+    parser.add_argument("--baseline", help="Compare with the last run at this commit instead of the last run.")
+    parser.add_argument("--label", help="Note stored with the run in the history.")
+    args = parser.parse_args()
+    unknown = set(args.pages) - set(PAGES)
+    if unknown:
+        parser.error(f"Unknown pages: {sorted(unknown)}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        servers, container = install_fakes(args, directory)
+        from core.services import get_service_layer
+        from core.telemetry import get_telemetry
+
+        pages = {number: load_page(PAGES[number][1]) for number in args.pages}
+        try:
+            # One interaction per page first, so building clients and connection pools is not measured.
+            for number in args.pages:
+                INTERACTIONS[number](pages[number], random.Random(args.seed), args)
+            get_telemetry().reset()
+
+            start = time.perf_counter()
+            latencies, errors = run_users(args, pages)
+            elapsed = time.perf_counter() - start
+            dependencies = [metric for metric in get_telemetry().snapshot() if metric["kind"] not in ("page", "phase")]
+            caches = get_telemetry().cache_stats()
+        finally:
+            get_service_layer().close()
+            get_telemetry().close()
+            for server in servers:
+                server.shutdown()
+
+    results = {}
+    for number in args.pages:
+        results[PAGES[number][0]] = {**summarize_latencies(latencies[number]), "errors": errors[number],
+                                     "per_s": len(latencies[number]) / elapsed}
+    all_latencies = [sample for number in args.pages for sample in latencies[number]]
+    results["All pages"] = {**summarize_latencies(all_latencies), "errors": sum(errors.values()),
+                            "per_s": len(all_latencies) / elapsed}
+
+    settings = {key: value for key, value in vars(args).items() if key not in ("history", "baseline", "label")}
+    run = {"ts": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"), "commit": git_commit(),
+           "label": args.label, "settings": settings, "pages": results}
+    baseline = find_baseline(args.history, settings, args.baseline) if args.history else None
+
+    print(f"{args.users} users for {elapsed:.1f} s, pages {','.join(map(str, args.pages))}, commit {run['commit']}")
+    print_table([{"page": page, **result} for page, result in results.items()],
+                ["page", "count", "errors", "per_s", "mean_ms", "p50_ms", "p95_ms", "p99_ms"])
+    print()
+    print_table([{"dependency": metric["kind"], "call": metric["name"], "count": metric["count"],
+                  "errors": metric["errors"], "p50_ms": metric["p50_s"] * 1000, "p95_ms": metric["p95_s"] * 1000,
+                  "p99_ms": metric["p99_s"] * 1000} for metric in dependencies],
+                ["dependency", "call", "count", "errors", "p50_ms", "p95_ms", "p99_ms"])
+    print()
+    print_table([{"cache": name, "hits": stats["hits"], "hit_rate": stats["hit_rate"]} for name, stats in caches.items()],
+                ["cache", "hits", "hit_rate"])
+    print(f"Cosmos DB: {container.requests} writes and reads, {container.request_charge:.0f} RU")
+
+    if baseline:
+        print()
+        print(f"Compared with {baseline['commit']} at {baseline['ts']}" +
+              (f" ({baseline['label']})" if baseline.get("label") else ""))
+        rows = []
+        for page, result in results.items():
+            before = baseline["pages"].get(page)
+            if before:
+                rows.append({"page": page, "per_s_before": before["per_s"], "per_s": result["per_s"],
+                             "per_s_change": change(result["per_s"], before["per_s"]),
+                             "p95_ms_before": before["p95_ms"], "p95_ms": result["p95_ms"],
+                             "p95_change": change(result["p95_ms"], before["p95_ms"]),
+                             "p99_ms_before": before["p99_ms"], "p99_ms": result["p99_ms"],
+                             "p99_change": change(result["p99_ms"], before["p99_ms"])})
+        print_table(rows, ["page", "per_s_before", "per_s", "per_s_change", "p95_ms_before", "p95_ms",
+                           "p95_change", "p99_ms_before", "p99_ms", "p99_change"])
+    if args.history:
+        append_history(args.history, run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Interactive latency and 429s against a deployment's token quota, with and without the rate limiter.
+
+Runs a local stub of an Azure OpenAI deployment that enforces --tpm tokens
+per minute the way the service does: each request costs its prompt plus
+max_tokens when it arrives, quota refills over a 10 second window, and
+requests beyond it get a 429 with retry-after-ms. For --seconds,
+--interactive users ask a question every --think seconds while
+--background threads send summarization work back to back. Compares:
+- SDK retries: every caller uses the openai client and its built-in retries
+- rate limiter: calls go through the service layer, admitted by a
+  RateLimiter that knows the quota and puts interactive work first
+
+    python -m benchmarks.bench_rate_limit --tpm 300000 --interactive 8 --background 16"""
+
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+
+from benchmarks.fakes import FakeAzureOpenAIHandler, chat_completion_payload, start_fake_server
+from benchmarks.stats import print_table, summarize_latencies
+from core.clients import AOAI_API_VERSION
+from core.rate_limit import BACKGROUND, BURST_SECONDS, INTERACTIVE, TokenBucket, estimate_chat_tokens
+from core.services import ServiceLayer
+from core.webapi import RetryPolicy
+
+DEPLOYMENT = "gpt-4o"
+MAX_TOKENS = 400
+
+
+class QuotaOpenAIHandler(FakeAzureOpenAIHandler):
+    """Chat completions against a token quota, counted the way Azure OpenAI counts it."""
+
+    lock = threading.Lock()
+    bucket = None
+    throttled = 0
+
+    def do_POST(self):
+        request = json.loads(self.read_body() or b"{}")
+        # Azure OpenAI estimates prompt tokens from characters when the request arrives.
+        cost = sum(len(m["content"]) for m in request["messages"]) / 4 + request.get("max_tokens", 800)
+        with self.lock:
+            self.bucket.refill()
+            wait = self.bucket.wait_seconds(cost)
+            if wait == 0:
+                self.bucket.take(cost)
+            else:
+                type(self).throttled += 1
+            remaining = max(0, int(self.bucket.level))
+        if wait:
+            self.send_response(429)
+            self.send_header("retry-after-ms", str(int(wait * 1000) + 1))
+            self.send_header("x-ratelimit-remaining-tokens", str(remaining))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        time.sleep(self.latency)
+        body = json.dumps(chat_completion_payload("This is a fake completion.")).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("x-ratelimit-remaining-tokens", str(remaining))
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def messages_for(prompt_words):
+    return [{"role": "system", "content": "You summarize hotel call transcripts."},
+            {"role": "user", "content": " ".join(["booking"] * prompt_words)}]
+
+
+def run_load(args, send):
+    """Run interactive users and background workers for args.seconds and collect their outcomes."""
+
+    stop_at = time.perf_counter() + args.seconds
+    outcomes = {INTERACTIVE: [], BACKGROUND: []}
+    failures = {INTERACTIVE: 0, BACKGROUND: 0}
+    lock = threading.Lock()
+
+    def worker(priority, think):
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            try:
+                send(priority)
+                with lock:
+                    outcomes[priority].append(time.perf_counter() - start)
+            except (openai.RateLimitError, TimeoutError):
+                with lock:
+                    failures[priority] += 1
+            time.sleep(think)
+
+    with ThreadPoolExecutor(max_workers=args.interactive + args.background) as pool:
+        for _ in range(args.interactive):
+            pool.submit(worker, INTERACTIVE, args.think)
+        for _ in range(args.background):
+            pool.submit(worker, BACKGROUND, 0)
+    return outcomes, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tpm", type=int, default=300000, help="Tokens per minute the stub allows.")
+    parser.add_argument("--interactive", type=int, default=8)
+    parser.add_argument("--background", type=int, default=16)
+    parser.add_argument("--think", type=float, default=1.0, help="Seconds between an interactive user's questions.")
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--prompt-words", type=int, default=300)
+    args = parser.parse_args()
+
+    QuotaOpenAIHandler.latency = args.latency
+    server, url = start_fake_server(QuotaOpenAIHandler)
+    messages = messages_for(args.prompt_words)
+    rows = []
+
+    def record(mode, outcomes, failures, sent_before):
+        for priority, name in ((INTERACTIVE, "interactive"), (BACKGROUND, "background")):
+            rows.append({"mode": mode, "work": name, **summarize_latencies(outcomes[priority]),
+                         "per_s": len(outcomes[priority]) / args.seconds, "failed": failures[priority],
+                         "throttled_429": QuotaOpenAIHandler.throttled - sent_before if priority == INTERACTIVE else None})
+
+    try:
+        QuotaOpenAIHandler.bucket = TokenBucket(args.tpm)
+        QuotaOpenAIHandler.throttled = 0
+        client = openai.AzureOpenAI(api_key="fake-key", azure_endpoint=url, api_version=AOAI_API_VERSION)
+
+        def send_directly(priority):
+            client.chat.completions.create(model=DEPLOYMENT, messages=messages, max_tokens=MAX_TOKENS)
+
+        record("SDK retries", *run_load(args, send_directly), 0)
+        client.close()
+
+        QuotaOpenAIHandler.bucket = TokenBucket(args.tpm)
+        QuotaOpenAIHandler.throttled = 0
+        services = ServiceLayer(
+            factories={"openai": lambda: openai.AsyncAzureOpenAI(
+                api_key="fake-key", azure_endpoint=url, api_version=AOAI_API_VERSION, max_retries=0,
+                http_client=openai.DefaultAsyncHttpxClient(event_hooks={"response": [services.async_response_hook]}))},
+            rate_limits={DEPLOYMENT: (args.tpm, None)},
+            deadline_seconds={"openai": args.seconds},
+            retry=RetryPolicy(max_attempts=4)
+        )
+        tokens = estimate_chat_tokens(messages, MAX_TOKENS)
+
+        def send_through_limiter(priority):
+            services.call_sync("openai", lambda client: client.chat.completions.create(
+                model=DEPLOYMENT, messages=messages, max_tokens=MAX_TOKENS),
+                quota=DEPLOYMENT, tokens=tokens, priority=priority)
+
+        record("rate limiter", *run_load(args, send_through_limiter), 0)
+        stats = services.rate_limit_stats()[DEPLOYMENT]
+        services.close()
+    finally:
+        server.shutdown()
+
+    print(f"{args.tpm} tokens per minute ({args.tpm / 60 * BURST_SECONDS:.0f} per {BURST_SECONDS} s window), "
+          f"{args.interactive} interactive users every {args.think:g} s, {args.background} background workers, "
+          f"{args.seconds:g} s")
+    print_table(rows, ["mode", "work", "count", "per_s", "failed", "throttled_429", "p50_ms", "p95_ms", "p99_ms"])
+    print()
+    print(f"Rate limiter: interactive wait p95 {stats['interactive_wait_p95_s'] * 1000:.0f} ms, "
+          f"background wait p95 {stats['background_wait_p95_s'] * 1000:.0f} ms, "
+          f"{stats['throttled']} 429s seen")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Throughput of the WAV normalization stage, in audio-seconds per wall-second.
+
+Writes synthetic stereo recordings at common sample rates to temporary WAV
+files, then converts each to 16 kHz mono int16 block by block, the way the
+Call Center page does before transcription.
+
+    python -m benchmarks.bench_resample --minutes 10"""
+
+import argparse
+import os
+import tempfile
+import time
+from contextlib import closing
+
+import numpy as np
+from scipy.io import wavfile
+
+from benchmarks.stats import print_table
+from core.audio import open_audio_buffer, read_wav
+from core.resample import iter_speech_frames
+
+FORMATS = (
+    ("44.1 kHz stereo int16", 44100, 2, np.int16),
+    ("48 kHz stereo int16", 48000, 2, np.int16),
+    ("48 kHz stereo float32", 48000, 2, np.float32),
+    ("16 kHz mono int16", 16000, 1, np.int16),
+)
+
+
+def write_recording(path, rate, channels, dtype, seconds):
+    rng = np.random.default_rng(0)
+    t = np.arange(int(rate * seconds), dtype=np.float32) / rate
+    signal = 0.3 * np.sin(2 * np.pi * 440 * t) + 0.05 * rng.standard_normal(len(t), dtype=np.float32)
+    samples = np.repeat(signal[:, None], channels, axis=1)
+    if dtype == np.int16:
+        samples = (samples * 32767).astype(np.int16)
+    wavfile.write(path, rate, samples.astype(dtype, copy=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--minutes", type=float, default=10.0)
+    args = parser.parse_args()
+
+    seconds = args.minutes * 60
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        for name, rate, channels, dtype in FORMATS:
+            path = os.path.join(directory, "call.wav")
+            write_recording(path, rate, channels, dtype, seconds)
+            output_bytes = 0
+            start = time.perf_counter()
+            with open_audio_buffer(path) as buffer:
+                wav = read_wav(buffer)
+                with closing(iter_speech_frames(buffer, wav)) as frames:
+                    for frame in frames:
+                        output_bytes += len(frame)
+            elapsed = time.perf_counter() - start
+            rows.append({
+                "input": name,
+                "audio_s": seconds,
+                "wall_s": elapsed,
+                "audio_s_per_wall_s": seconds / elapsed,
+                "output_s": output_bytes / 2 / 16000
+            })
+            os.remove(path)
+
+    print_table(rows, ["input", "audio_s", "wall_s", "audio_s_per_wall_s", "output_s"])
+
+
+if __name__ == "__main__":
+    main()
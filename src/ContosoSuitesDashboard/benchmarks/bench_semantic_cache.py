@@ -0,0 +1,105 @@
+"""Hit rate and wrong answers of the semantic answer cache.
+
+The embedding stands in for ada-002, which scores questions that differ
+only in a number or an ID above the 0.95 threshold: it hashes the words of a
+question and gives words with digits, and filler words, little weight. The
+run stores an answer for questions about every other hotel and then asks:
+
+- rephrasings of a stored question, which should hit;
+- the same questions about other hotels, dates and bookings, which must miss.
+
+The run fails, with exit status 1, when a question is answered with an
+answer stored for a different number or ID:
+
+    python -m benchmarks.bench_semantic_cache --hotels 20"""
+
+import argparse
+import hashlib
+import sys
+
+import numpy as np
+
+from benchmarks.stats import print_table
+from core.semantic_cache import SemanticCache
+
+DIMENSIONS = 256
+# Weight of a word containing a digit, or of a filler word, in the embedding, against 1.0 for other words.
+LITERAL_WEIGHT = 0.05
+FILLER_WEIGHT = 0.1
+FILLER_WORDS = frozenset("how many are there for this the on of is what what's me show does have list".split())
+QUESTIONS = [
+    ("How many bookings are there for hotel {hotel} this week?",
+     "This week, how many bookings does hotel {hotel} have?"),
+    ("List the bookings for hotel {hotel} on 2024-06-{day:02d}.",
+     "Show me the bookings for hotel {hotel} on 2024-06-{day:02d}."),
+    ("What is the status of booking BK-{hotel}{day:03d}?",
+     "What's the status of booking BK-{hotel}{day:03d}?"),
+]
+
+
+def word_vector(word):
+    seed = int.from_bytes(hashlib.sha256(word.encode("utf-8")).digest()[:8], "little")
+    return np.random.default_rng(seed).standard_normal(DIMENSIONS)
+
+
+def fake_embedding(text):
+    vector = np.zeros(DIMENSIONS)
+    for word in text.lower().replace("?", " ").replace(".", " ").split():
+        weight = 1.0
+        if any(character.isdigit() for character in word):
+            weight = LITERAL_WEIGHT
+        elif word in FILLER_WORDS:
+            weight = FILLER_WEIGHT
+        vector += weight * word_vector(word)
+    return vector / np.linalg.norm(vector)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hotels", type=int, default=20)
+    parser.add_argument("--threshold", type=float, default=0.95)
+    args = parser.parse_args()
+
+    cache = SemanticCache(fake_embedding, threshold=args.threshold)
+    stored_hotels = range(1, args.hotels + 1, 2)
+    for hotel in stored_hotels:
+        for question, _ in QUESTIONS:
+            text = question.format(hotel=hotel, day=hotel)
+            cache.store(text, text)
+
+    rows = []
+    failures = []
+    for kind in ("rephrased", "other_ids"):
+        hits = wrong = asked = 0
+        closest = []
+        for hotel in stored_hotels:
+            for question, rephrasing in QUESTIONS:
+                expected = question.format(hotel=hotel, day=hotel)
+                if kind == "rephrased":
+                    text = rephrasing.format(hotel=hotel, day=hotel)
+                else:
+                    # The next hotel, whose questions were not stored.
+                    other = hotel + 1
+                    text = question.format(hotel=other, day=other + 1)
+                    expected = None
+                    closest.append(float(fake_embedding(text) @ fake_embedding(question.format(hotel=hotel, day=hotel))))
+                answer = cache.lookup(text)
+                asked += 1
+                hits += answer is not None
+                if answer is not None and answer != expected:
+                    wrong += 1
+                    failures.append(f"{text!r} was answered with the answer to {answer!r}")
+        rows.append({
+            "questions": kind, "asked": asked, "hit_rate": hits / asked, "wrong_answers": wrong,
+            "similarity_to_stored": float(np.mean(closest)) if closest else None
+        })
+
+    print(f"{args.hotels} hotels, threshold {args.threshold}")
+    print_table(rows, ["questions", "asked", "hit_rate", "wrong_answers", "similarity_to_stored"])
+    for failure in failures[:10]:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
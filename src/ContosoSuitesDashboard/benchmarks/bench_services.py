@@ -0,0 +1,196 @@
+"""Isolation, limits, retries and deadlines of the shared service layer.
+
+Runs a ServiceLayer against local stubs of Azure OpenAI and the Web API and
+reports, per scenario, the latency seen by callers, the most requests the
+stub ever had in flight, and the retries and failures:
+- webapi alone: --webapi-users threads calling the Web API
+- webapi / openai, saturated: the same while --openai-users threads call a
+  slow Azure OpenAI; the Web API should not slow down, and Azure OpenAI should
+  never have more than --openai-concurrency requests in flight
+- openai, throttled: every --throttle-every-th request gets a 429 with
+  retry-after-ms; every call should still succeed
+- openai, past deadline: a deadline shorter than the stub's latency; calls
+  should fail with DeadlineExceeded at the deadline instead of hanging
+- get_many: fanning out to every hotel's bookings with asyncio.run() and a
+  new connection pool per call, versus the shared loop and pool
+
+    python -m benchmarks.bench_services --openai-users 64 --openai-latency 0.5"""
+
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+
+from benchmarks.fakes import FakeAzureOpenAIHandler, FakeWebApiHandler, start_fake_server
+from benchmarks.stats import print_table, summarize_latencies
+from core.clients import AOAI_API_VERSION
+from core.services import DeadlineExceeded, ServiceLayer
+from core.webapi import RetryPolicy, WebApiClient, WebApiSettings
+
+
+class CountingHandlerMixin:
+    """Counts requests in flight on the stub and throttles every Nth request."""
+
+    lock = threading.Lock()
+    in_flight = 0
+    max_in_flight = 0
+    requests = 0
+    throttle_every = 0
+
+    @classmethod
+    def reset(cls, throttle_every=0):
+        cls.in_flight = cls.max_in_flight = cls.requests = 0
+        cls.throttle_every = throttle_every
+
+    def handle_counted(self, handle):
+        cls = type(self)
+        with cls.lock:
+            cls.requests += 1
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+            throttled = cls.throttle_every and cls.requests % cls.throttle_every == 0
+        try:
+            if throttled:
+                self.read_body()
+                self.send_response(429)
+                self.send_header("retry-after-ms", "50")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            else:
+                handle()
+        except (BrokenPipeError, ConnectionResetError):
+            # The caller gave up at its deadline.
+            pass
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+
+class CountingOpenAIHandler(CountingHandlerMixin, FakeAzureOpenAIHandler):
+    def do_POST(self):
+        self.handle_counted(super().do_POST)
+
+
+class CountingWebApiHandler(CountingHandlerMixin, FakeWebApiHandler):
+    def do_GET(self):
+        self.handle_counted(super().do_GET)
+
+
+def run_users(users, calls_per_user, call):
+    """Run call() calls_per_user times from each of users threads.
+    Returns latencies of the calls that succeeded and the number that failed."""
+
+    def user(_):
+        samples, errors = [], 0
+        for i in range(calls_per_user):
+            start = time.perf_counter()
+            try:
+                call(i)
+            except DeadlineExceeded:
+                errors += 1
+                continue
+            samples.append(time.perf_counter() - start)
+        return samples, errors
+
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        results = list(pool.map(user, range(users)))
+    return [s for samples, _ in results for s in samples], sum(errors for _, errors in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--webapi-users", type=int, default=8)
+    parser.add_argument("--webapi-latency", type=float, default=0.01)
+    parser.add_argument("--openai-users", type=int, default=64)
+    parser.add_argument("--openai-latency", type=float, default=0.5)
+    parser.add_argument("--openai-concurrency", type=int, default=16)
+    parser.add_argument("--calls", type=int, default=20, help="Calls per user thread.")
+    parser.add_argument("--throttle-every", type=int, default=5)
+    parser.add_argument("--hotels", type=int, default=20)
+    args = parser.parse_args()
+
+    CountingOpenAIHandler.latency = args.openai_latency
+    CountingWebApiHandler.latency = args.webapi_latency
+    CountingWebApiHandler.hotel_count = args.hotels
+    openai_server, openai_url = start_fake_server(CountingOpenAIHandler)
+    webapi_server, webapi_url = start_fake_server(CountingWebApiHandler)
+
+    services = ServiceLayer(
+        factories={"openai": lambda: openai.AsyncAzureOpenAI(
+            api_key="fake-key", azure_endpoint=openai_url, api_version=AOAI_API_VERSION, max_retries=0)},
+        concurrency={"openai": args.openai_concurrency},
+        retry=RetryPolicy(max_attempts=4, backoff_seconds=0.05)
+    )
+    webapi = WebApiClient(WebApiSettings(base_url=webapi_url, http2=False, max_concurrency=args.hotels),
+                          services=services)
+
+    def chat(_):
+        services.call_sync("openai", lambda client: client.chat.completions.create(
+            model="gpt-4o", messages=[{"role": "user", "content": "Hello"}]))
+
+    def bookings(i):
+        webapi.get(f"/Hotels/{i % args.hotels + 1}/Bookings").raise_for_status()
+
+    def row(scenario, handler, samples, errors, retries_before=0, dependency="webapi"):
+        return {"scenario": scenario, **summarize_latencies(samples), "failed": errors,
+                "retries": services.stats[dependency]["retries"] - retries_before,
+                "max_in_flight": handler.max_in_flight}
+
+    rows = []
+    try:
+        CountingWebApiHandler.reset()
+        samples, errors = run_users(args.webapi_users, args.calls, bookings)
+        rows.append(row("webapi alone", CountingWebApiHandler, samples, errors))
+
+        CountingWebApiHandler.reset()
+        CountingOpenAIHandler.reset()
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            openai_run = pool.submit(run_users, args.openai_users, args.calls // 4, chat)
+            # Let the Azure OpenAI callers fill their limit before measuring the Web API.
+            time.sleep(args.openai_latency)
+            webapi_run = pool.submit(run_users, args.webapi_users, args.calls, bookings)
+            rows.append(row("webapi, openai saturated", CountingWebApiHandler, *webapi_run.result()))
+            rows.append(row("openai, saturated", CountingOpenAIHandler, *openai_run.result(), dependency="openai"))
+
+        CountingOpenAIHandler.latency = 0.02
+        CountingOpenAIHandler.reset(throttle_every=args.throttle_every)
+        retries_before = services.stats["openai"]["retries"]
+        samples, errors = run_users(args.webapi_users, args.calls, chat)
+        rows.append(row("openai, throttled", CountingOpenAIHandler, samples, errors, retries_before, "openai"))
+
+        CountingOpenAIHandler.latency = args.openai_latency
+        CountingOpenAIHandler.reset()
+        services.deadline_seconds["openai"] = args.openai_latency / 2
+        retries_before = services.stats["openai"]["retries"]
+        timeouts_before = services.stats["openai"]["timeouts"]
+        start = time.perf_counter()
+        _, errors = run_users(args.webapi_users, 2, chat)
+        rows.append({"scenario": "openai, past deadline", "count": args.webapi_users * 2, "failed": errors,
+                     "mean_ms": (time.perf_counter() - start) / 2 * 1000,
+                     "retries": services.stats["openai"]["retries"] - retries_before,
+                     "max_in_flight": CountingOpenAIHandler.max_in_flight})
+        assert services.stats["openai"]["timeouts"] - timeouts_before == errors
+
+        paths = [f"/Hotels/{hotel_id}/Bookings" for hotel_id in range(1, args.hotels + 1)]
+        per_call = WebApiClient(WebApiSettings(base_url=webapi_url, http2=False, max_concurrency=args.hotels))
+        for scenario, client in (("get_many, asyncio.run", per_call), ("get_many, shared loop", webapi)):
+            CountingWebApiHandler.latency = args.webapi_latency
+            CountingWebApiHandler.reset()
+            samples, errors = run_users(1, args.calls, lambda _: client.get_many(paths))
+            rows.append(row(scenario, CountingWebApiHandler, samples, errors))
+        per_call.close()
+    finally:
+        webapi.close()
+        services.close()
+        openai_server.shutdown()
+        webapi_server.shutdown()
+
+    print(f"Azure OpenAI answers in {args.openai_latency * 1000:g} ms with at most {args.openai_concurrency} "
+          f"in flight; the Web API answers in {args.webapi_latency * 1000:g} ms")
+    print_table(rows, ["scenario", "count", "failed", "retries", "max_in_flight", "mean_ms", "p50_ms", "p95_ms"])
+
+
+if __name__ == "__main__":
+    main()
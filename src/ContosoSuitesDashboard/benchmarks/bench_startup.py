@@ -0,0 +1,117 @@
+"""Cold import time of the main page and every dashboard page.
+
+Each page is imported --repeats times, each in a fresh interpreter, the way
+a container's first request for the page imports it, without running its
+main(). For every page the report shows the median and worst import time,
+the deferred SDKs from core.lazy that importing it loaded anyway, and the
+packages that took longest, from python -X importtime.
+
+The run fails, with exit status 1, when a page loads one of the deferred SDKs
+at import or when its median import time is above --max-seconds, so it can
+guard against startup regressions in CI:
+
+    python -m benchmarks.bench_startup --repeats 5 --max-seconds 1.5"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+from benchmarks.stats import print_table
+from core.lazy import DEFERRED_MODULES
+
+DASHBOARD_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = ["Index.py"] + sorted(
+    os.path.join("pages", name) for name in os.listdir(os.path.join(DASHBOARD_DIRECTORY, "pages"))
+    if name.endswith(".py")
+)
+# Packages that are not worth reporting: every page imports them.
+BASELINE_PACKAGES = ("streamlit", "core", "encodings", "importlib")
+
+IMPORT_PAGE = """
+import importlib.util, json, sys, time
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location("page", sys.argv[1])
+spec.loader.exec_module(importlib.util.module_from_spec(spec))
+seconds = time.perf_counter() - start
+print(json.dumps({"seconds": seconds, "loaded": [name for name in json.loads(sys.argv[2]) if name in sys.modules]}))
+"""
+
+
+def package_name(module):
+    """The distribution-level package of a module: azure.cosmos for azure.cosmos.aio, numpy for numpy.linalg."""
+
+    parts = module.split(".")
+    return ".".join(parts[:2]) if parts[0] == "azure" else parts[0]
+
+
+def parse_importtime(stderr):
+    """Cumulative microseconds of each package, from python -X importtime output."""
+
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, module = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        package = package_name(module.strip())
+        # A package's first import holds the time of everything under it.
+        packages[package] = max(packages.get(package, 0), int(cumulative))
+    return packages
+
+
+def import_page(page):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", IMPORT_PAGE, page, json.dumps(DEFERRED_MODULES)],
+        cwd=DASHBOARD_DIRECTORY, capture_output=True, text=True, check=True
+    )
+    measurement = json.loads(result.stdout.strip().splitlines()[-1])
+    return measurement["seconds"], measurement["loaded"], parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--max-seconds", type=float, default=None,
+        help="Fail when a page's median import time is above this.")
+    parser.add_argument("--top", type=int, default=3, help="Slowest packages to list per page.")
+    args = parser.parse_args()
+
+    rows = []
+    failures = []
+    for page in PAGES:
+        seconds = []
+        loaded = set()
+        packages = defaultdict(list)
+        for _ in range(args.repeats):
+            page_seconds, page_loaded, page_packages = import_page(page)
+            seconds.append(page_seconds)
+            loaded.update(page_loaded)
+            for package, microseconds in page_packages.items():
+                packages[package].append(microseconds)
+        slowest = sorted(((statistics.median(times) / 1000, package) for package, times in packages.items()
+                          if package not in BASELINE_PACKAGES), reverse=True)[:args.top]
+        median = statistics.median(seconds)
+        rows.append({
+            "page": page, "median_s": median, "max_s": max(seconds),
+            "deferred_loaded": ", ".join(sorted(loaded)) or "-",
+            "slowest_packages": ", ".join(f"{package} {ms:.0f} ms" for ms, package in slowest)
+        })
+        if loaded:
+            failures.append(f"{page} imports {', '.join(sorted(loaded))} at import; use core.lazy.lazy_module()")
+        if args.max_seconds is not None and median > args.max_seconds:
+            failures.append(f"{page} takes {median:.2f} s to import, more than {args.max_seconds:.2f} s")
+
+    print(f"Cold imports, median of {args.repeats} fresh interpreters")
+    print_table(rows, ["page", "median_s", "max_s", "deferred_loaded", "slowest_packages"])
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
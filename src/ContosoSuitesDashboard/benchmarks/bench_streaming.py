@@ -0,0 +1,150 @@
+"""Render calls and bytes sent to the browser while streaming a chat answer.
+
+A synthetic markdown answer of --tokens tokens, with paragraphs, a list and a
+code block, arrives one token at a time at --tokens-per-second. Compares:
+- every delta: re-render the whole response on each delta (the old page code)
+- throttled: StreamRenderer re-rendering on its time and size thresholds only
+- throttled + paragraphs: StreamRenderer also freezing finished paragraphs
+
+Time is simulated, so the comparison runs instantly. A final run streams the
+same answer from a local stub of /MaintenanceCopilotChat through the Web API
+client, in real time, the way the Copilot Chat page does.
+
+    python -m benchmarks.bench_streaming --tokens 1000 --tokens-per-second 50"""
+
+import argparse
+import time
+
+from benchmarks.fakes import FakeWebApiHandler, start_fake_server
+from benchmarks.stats import print_table
+from core.streaming import StreamRenderer, iter_response_text
+from core.webapi import WebApiClient, WebApiSettings
+
+WORDS = ("the", "guest", "reported", "that", "room", "air", "conditioning", "was", "not",
+         "cooling", "and", "maintenance", "scheduled", "a", "technician", "for", "tomorrow")
+
+
+def make_answer_tokens(count):
+    """Return count tokens of a markdown answer, roughly a word each."""
+
+    tokens = []
+    while len(tokens) < count:
+        position = len(tokens)
+        if position and position % 120 == 0:
+            tokens.append("\n\n```python\nrequest = create_request(room=205)\n```\n\n")
+        elif position and position % 60 == 0:
+            tokens.append("\n\n")
+        elif position % 60 == 40:
+            tokens.append("\n- ")
+        else:
+            tokens.append(("" if position % 60 == 0 else " ") + WORDS[position % len(WORDS)])
+    return tokens
+
+
+class CountingElement:
+    def __init__(self, counter):
+        self.counter = counter
+
+    def markdown(self, text):
+        self.counter["render_calls"] += 1
+        self.counter["bytes_sent"] += len(text.encode("utf-8"))
+
+
+class CountingContainer:
+    """Stands in for st.chat_message(); counts what would be sent to the browser."""
+
+    def __init__(self):
+        self.counter = {"render_calls": 0, "bytes_sent": 0, "elements": 0}
+
+    def empty(self):
+        self.counter["elements"] += 1
+        return CountingElement(self.counter)
+
+
+class SimulatedClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def render_every_delta(tokens):
+    container = CountingContainer()
+    element = container.empty()
+    full_response = ""
+    for token in tokens:
+        full_response += token
+        element.markdown(full_response + "▌")
+    element.markdown(full_response)
+    return container.counter, full_response
+
+
+def render_throttled(tokens, tokens_per_second, split_paragraphs):
+    container = CountingContainer()
+    clock = SimulatedClock()
+    renderer = StreamRenderer(container, split_paragraphs=split_paragraphs, clock=clock)
+    for token in tokens:
+        clock.now += 1 / tokens_per_second
+        renderer.write(token)
+    return container.counter, renderer.close()
+
+
+def render_from_copilot_stub(tokens, tokens_per_second):
+    FakeWebApiHandler.copilot_pieces = tokens
+    FakeWebApiHandler.copilot_piece_delay = 1 / tokens_per_second
+    server, url = start_fake_server(FakeWebApiHandler)
+    client = WebApiClient(WebApiSettings(base_url=url, http2=False))
+    try:
+        container = CountingContainer()
+        renderer = StreamRenderer(container)
+        start = time.perf_counter()
+        with client.stream("POST", "/MaintenanceCopilotChat", json="Create a request", timeout=60) as response:
+            response.raise_for_status()
+            for text in iter_response_text(response):
+                renderer.write(text)
+        text = renderer.close()
+        return container.counter, text, time.perf_counter() - start
+    finally:
+        client.close()
+        server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=1000)
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--stub-tokens-per-second", type=float, default=500.0,
+        help="Token rate of the real-time run against the Copilot stub.")
+    args = parser.parse_args()
+
+    tokens = make_answer_tokens(args.tokens)
+    answer = "".join(tokens)
+    scale = 1000 / args.tokens
+    rows = []
+    for name, run in (
+        ("every delta", lambda: render_every_delta(tokens)),
+        ("throttled", lambda: render_throttled(tokens, args.tokens_per_second, split_paragraphs=False)),
+        ("throttled + paragraphs", lambda: render_throttled(tokens, args.tokens_per_second, split_paragraphs=True))
+    ):
+        counter, text = run()
+        assert text == answer
+        rows.append({"renderer": name, "render_calls": counter["render_calls"],
+                     "kb_sent": counter["bytes_sent"] / 1024, "elements": counter["elements"],
+                     "calls_per_1k_tokens": counter["render_calls"] * scale,
+                     "kb_per_1k_tokens": counter["bytes_sent"] / 1024 * scale})
+
+    counter, text, elapsed = render_from_copilot_stub(tokens, args.stub_tokens_per_second)
+    assert text == answer
+    rows.append({"renderer": "copilot stub (real time)", "render_calls": counter["render_calls"],
+                 "kb_sent": counter["bytes_sent"] / 1024, "elements": counter["elements"],
+                 "calls_per_1k_tokens": counter["render_calls"] * scale,
+                 "kb_per_1k_tokens": counter["bytes_sent"] / 1024 * scale})
+
+    print(f"{args.tokens} tokens, {len(answer)} characters at {args.tokens_per_second:g} tokens/s "
+          f"(stub run: {args.stub_tokens_per_second:g} tokens/s, {elapsed:.1f} s)")
+    print_table(rows, ["renderer", "render_calls", "kb_sent", "elements", "calls_per_1k_tokens", "kb_per_1k_tokens"])
+
+
+if __name__ == "__main__":
+    main()
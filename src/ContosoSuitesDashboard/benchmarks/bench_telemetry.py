@@ -0,0 +1,98 @@
+"""Cost and accuracy of the telemetry layer.
+
+Measures:
+- the cost of one record() and one measure() block
+- the overhead on Web API calls through the service layer against a local
+  stub, without telemetry, with it, and with it exporting to a JSON-lines file
+- the error of the histogram's percentiles against exact ones, on --samples
+  log-normal latencies
+
+    python -m benchmarks.bench_telemetry --calls 1000 --latency 0.005"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.fakes import FakeWebApiHandler, start_fake_server
+from benchmarks.stats import percentile, print_table
+from core.services import ServiceLayer
+from core.telemetry import JsonLinesExporter, LatencyHistogram, Telemetry
+from core.webapi import WebApiClient, WebApiSettings
+
+
+def per_call_ns(function, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        function()
+    return (time.perf_counter() - start) / count * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.005,
+        help="Simulated seconds the stub takes to answer each request.")
+    parser.add_argument("--samples", type=int, default=100000)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    telemetry = Telemetry()
+    record_ns = per_call_ns(lambda: telemetry.record("webapi", "GET /Hotels", 0.0123, payload_bytes=892), 100000)
+
+    def block():
+        with telemetry.measure("phase", "transcription"):
+            pass
+    measure_ns = per_call_ns(block, 100000)
+    print(f"record(): {record_ns:.0f} ns, measure() block: {measure_ns:.0f} ns")
+    print()
+
+    FakeWebApiHandler.latency = args.latency
+    server, url = start_fake_server(FakeWebApiHandler)
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        variants = (("no telemetry", lambda: None),
+                    ("telemetry", Telemetry),
+                    ("telemetry + JSON lines", lambda: Telemetry([JsonLinesExporter(os.path.join(directory, "t.jsonl"))])))
+        timings = {name: [] for name, _ in variants}
+        for _ in range(args.repeats):
+            # Interleaved, so drift in the stub's latency affects every variant alike.
+            for name, make_telemetry in variants:
+                services = ServiceLayer(telemetry=make_telemetry())
+                client = WebApiClient(WebApiSettings(base_url=url, http2=False), services=services)
+                client.get("/Hotels")
+                start = time.perf_counter()
+                for i in range(args.calls):
+                    client.get(f"/Hotels/{i % 10 + 1}/Bookings")
+                timings[name].append((time.perf_counter() - start) / args.calls)
+                client.close()
+                services.close()
+                if services.telemetry is not None:
+                    services.telemetry.close()
+        baseline = min(timings["no telemetry"])
+        for name, _ in variants:
+            seconds = min(timings[name])
+            rows.append({"variant": name, "calls": args.calls, "ms_per_call": seconds * 1000,
+                         "overhead_pct": (seconds - baseline) / baseline * 100})
+    server.shutdown()
+    print_table(rows, ["variant", "calls", "ms_per_call", "overhead_pct"])
+    print()
+
+    rng = random.Random(42)
+    samples = [rng.lognormvariate(-3, 1) for _ in range(args.samples)]
+    histogram = LatencyHistogram()
+    for sample in samples:
+        histogram.record(sample)
+    accuracy = []
+    for pct in (50, 95, 99, 99.9):
+        exact = percentile(samples, pct)
+        estimate = histogram.percentile(pct)
+        accuracy.append({"percentile": f"p{pct:g}", "exact_ms": exact * 1000, "histogram_ms": estimate * 1000,
+                         "error_pct": (estimate - exact) / exact * 100})
+    print(f"{args.samples} log-normal latencies in {len(histogram.counts)} buckets")
+    print_table(accuracy, ["percentile", "exact_ms", "histogram_ms", "error_pct"])
+
+
+if __name__ == "__main__":
+    main()
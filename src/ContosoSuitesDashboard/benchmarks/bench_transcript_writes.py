@@ -0,0 +1,121 @@
+"""Request units and latency of saving call transcripts to Cosmos DB, per 1,000 transcripts.
+
+Runs against FakeCosmosContainer, a local stand-in for the CallTranscripts
+container with simulated round trips and request charges. A fraction of the
+transcripts (--stored) were saved before. Compares:
+- one at a time: the old page code; embed every transcript, then create_item
+  with a random ID, which stores a duplicate of a transcript saved before
+- bulk: check for the stored document by its content-derived ID with a point
+  read, embed only the new transcripts, and upsert them with save_transcripts()
+
+    python -m benchmarks.bench_transcript_writes --transcripts 1000 --stored 0.3"""
+
+import argparse
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fakes import EMBEDDING_DIMENSIONS, FakeCosmosContainer
+from benchmarks.stats import print_table
+from core.transcript_store import RequestCharge, is_transcript_stored, make_transcript_item, save_transcripts
+
+WORDS = ("guest room booking pool towel checkout late air conditioning broken "
+         "reservation refund ocean view suite breakfast shuttle airport").split()
+
+
+def make_transcripts(count, words_per_transcript=300):
+    rng = random.Random(42)
+    return [" ".join(rng.choice(WORDS) for _ in range(words_per_transcript)) + f" call {i}" for i in range(count)]
+
+
+def make_embedder(latency):
+    def embed(text):
+        time.sleep(latency)
+        rng = random.Random(text)
+        return [rng.random() for _ in range(EMBEDDING_DIMENSIONS)]
+    return embed
+
+
+def make_container(args, stored_transcripts, embed):
+    container = FakeCosmosContainer(round_trip=args.round_trip)
+    for transcript in stored_transcripts:
+        item = make_transcript_item(transcript, embed(transcript))
+        container.items[(item["call_id"], item["id"])] = item
+    return container
+
+
+def save_one_at_a_time(container, transcripts, embed):
+    request_charge = RequestCharge()
+    for transcript in transcripts:
+        call_id = abs(hash(transcript)) % (10 ** 8)
+        container.create_item(body={
+            "id": f"{call_id}_{uuid.uuid4()}",
+            "call_id": call_id,
+            "call_transcript": transcript,
+            "request_vector": embed(transcript)
+        }, response_hook=request_charge.hook)
+    return {"embedded": len(transcripts), "written": len(transcripts), "request_charge": request_charge.total}
+
+
+def save_bulk(container, transcripts, embed, max_concurrency):
+    request_charge = RequestCharge()
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        stored = list(executor.map(
+            lambda transcript: is_transcript_stored(container, transcript, request_charge=request_charge),
+            transcripts))
+        new_transcripts = [transcript for transcript, is_stored in zip(transcripts, stored) if not is_stored]
+        vectors = list(executor.map(embed, new_transcripts))
+    items = [make_transcript_item(transcript, vector) for transcript, vector in zip(new_transcripts, vectors)]
+    result = save_transcripts(container, items, max_concurrency=max_concurrency)
+    return {"embedded": len(new_transcripts), "written": result["documents"],
+            "request_charge": request_charge.total + result["request_charge"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--transcripts", type=int, default=1000)
+    parser.add_argument("--single", type=int, default=200,
+        help="How many transcripts to save one at a time for the baseline.")
+    parser.add_argument("--stored", type=float, default=0.3,
+        help="Fraction of the transcripts that are already in the container.")
+    parser.add_argument("--round-trip", type=float, default=0.005,
+        help="Simulated seconds of a Cosmos DB round trip.")
+    parser.add_argument("--embedding-latency", type=float, default=0.02,
+        help="Simulated seconds to embed one transcript.")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    embed = make_embedder(args.embedding_latency)
+    rows = []
+    for name, count, run in (
+        ("one at a time", args.single, lambda container, transcripts: save_one_at_a_time(container, transcripts, embed)),
+        ("bulk", args.transcripts,
+         lambda container, transcripts: save_bulk(container, transcripts, embed, args.concurrency))
+    ):
+        transcripts = make_transcripts(count)
+        stored = transcripts[:int(count * args.stored)]
+        container = make_container(args, stored, make_embedder(0))
+        start = time.perf_counter()
+        result = run(container, transcripts)
+        elapsed = time.perf_counter() - start
+        scale = 1000 / count
+        rows.append({
+            "path": name,
+            "transcripts": count,
+            "embedded": result["embedded"],
+            "written": result["written"],
+            "documents": len(container.items),
+            "requests": container.requests,
+            "ru_per_1k": result["request_charge"] * scale,
+            "seconds_per_1k": elapsed * scale
+        })
+
+    print(f"{args.stored:.0%} already stored, {args.round_trip * 1000:g} ms round trips, "
+          f"{args.embedding_latency * 1000:g} ms per embedding, concurrency {args.concurrency}")
+    print_table(rows, ["path", "transcripts", "embedded", "written", "documents", "requests",
+                       "ru_per_1k", "seconds_per_1k"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Size reduction against recall@k for the compact vector codecs.
+
+Uses the same synthetic corpus as bench_ann: 1536-dimension vectors drawn
+around cluster centres, one of which is the sample query in
+data/Query_Vector.txt. For each codec and PCA size the report shows the
+memory of one encoded vector, the JSON size of a document's vector (for the
+codecs documents can use, which keep every dimension), and recall@k of the
+compact scan alone and after exact re-ranking of its --rerank best rows,
+against exact float32 search.
+
+    python -m benchmarks.bench_vector_codec --vectors 50000 --queries 200 --components 0,256,128"""
+
+import argparse
+import json
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_ann import load_query_vector, make_corpus
+from benchmarks.stats import print_table
+from core.vector_codec import CODECS, CompactIndex, encode_document_vector
+from core.vector_index import VectorIndex, normalize_rows, top_k
+
+DOCUMENT_SAMPLES = 100
+
+
+def document_bytes(vectors, kind):
+    """Mean JSON size of request_vector, and request_vector_scale when there is one."""
+
+    sizes = []
+    for vector in vectors[:DOCUMENT_SAMPLES]:
+        values, scale = encode_document_vector(vector, kind)
+        document = {"request_vector": values}
+        if scale is not None:
+            document["request_vector_scale"] = scale
+        sizes.append(len(json.dumps(document)))
+    return float(np.mean(sizes))
+
+
+def recall(index, queries, truth, k, rerank):
+    hits = 0
+    start = time.perf_counter()
+    for query, expected in zip(queries, truth):
+        found = index.search(query, k, minimum_similarity_score=-1.0, rerank=rerank)
+        hits += len(expected & {int(result["id"]) for result in found})
+    return hits / (k * len(queries)), len(queries) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=50_000)
+    parser.add_argument("--clusters", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rerank", type=int, default=100)
+    parser.add_argument("--components", default="0,256,128", help="PCA sizes to try; 0 keeps every dimension.")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    query_vector = load_query_vector()
+    corpus = make_corpus(rng, args.vectors, args.clusters, query_vector)
+    picks = rng.choice(args.vectors, args.queries - 1, replace=False)
+    queries = normalize_rows(np.vstack([
+        query_vector,
+        corpus[picks] + rng.standard_normal((len(picks), corpus.shape[1]), dtype=np.float32) * 0.02
+    ]))
+    truth = [set(top_k(corpus @ q, args.k).tolist()) for q in queries]
+    full_bytes = corpus.shape[1] * 4
+
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        exact_index = VectorIndex(directory)
+        exact_index.add([{"id": str(i)} for i in range(args.vectors)], corpus)
+        for components in (int(c) for c in args.components.split(",")):
+            for kind in CODECS:
+                if kind == "float32" and not components:
+                    continue
+                start = time.perf_counter()
+                index = CompactIndex.build(exact_index, kind, components or None, args.rerank)
+                build_seconds = time.perf_counter() - start
+                coarse_recall, _ = recall(index, queries, truth, args.k, args.k)
+                reranked_recall, qps = recall(index, queries, truth, args.k, args.rerank)
+                bytes_per_vector = index.codec.bytes_per_vector(corpus.shape[1])
+                rows.append({
+                    "codec": kind, "components": components or corpus.shape[1],
+                    "bytes": bytes_per_vector, "reduction": full_bytes / bytes_per_vector,
+                    "doc_json_bytes": document_bytes(corpus, kind) if not components else None,
+                    "recall_coarse": coarse_recall, "recall_reranked": reranked_recall,
+                    "qps": qps, "build_s": build_seconds
+                })
+
+        start = time.perf_counter()
+        for query in queries:
+            exact_index.search(query, args.k, -1.0)
+        rows.insert(0, {
+            "codec": "exact", "components": corpus.shape[1], "bytes": full_bytes, "reduction": 1.0,
+            "doc_json_bytes": document_bytes(corpus, "float32"), "recall_coarse": 1.0, "recall_reranked": 1.0,
+            "qps": len(queries) / (time.perf_counter() - start), "build_s": 0.0
+        })
+
+    print(f"recall@{args.k} over {args.vectors} vectors, {len(queries)} queries, "
+          f"{args.rerank} candidates re-ranked exactly")
+    print_table(rows, ["codec", "components", "bytes", "reduction", "doc_json_bytes",
+                       "recall_coarse", "recall_reranked", "qps", "build_s"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Measure local vector index query latency against corpus size.
+
+    python -m benchmarks.bench_vector_index --sizes 1000,10000,50000 --queries 200"""
+
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.stats import print_table, summarize_latencies
+from core.vector_index import VectorIndex
+
+DIMENSIONS = 1536
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,50000")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--dimensions", type=int, default=DIMENSIONS)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    rows = []
+    for size in (int(s) for s in args.sizes.split(",")):
+        with tempfile.TemporaryDirectory() as directory:
+            index = VectorIndex(directory)
+            start = time.perf_counter()
+            for offset in range(0, size, 10_000):
+                count = min(10_000, size - offset)
+                vectors = rng.standard_normal((count, args.dimensions), dtype=np.float32)
+                index.add([{"id": str(offset + i)} for i in range(count)], vectors)
+            build_seconds = time.perf_counter() - start
+
+            # Reopening maps the file instead of reading it, so this is the replica start-up cost.
+            start = time.perf_counter()
+            reopened = VectorIndex(directory)
+            open_ms = (time.perf_counter() - start) * 1000
+
+            queries = rng.standard_normal((args.queries, args.dimensions), dtype=np.float32)
+            samples = []
+            for query in queries:
+                start = time.perf_counter()
+                reopened.search(query, args.k, minimum_similarity_score=-1.0)
+                samples.append(time.perf_counter() - start)
+            del index, reopened
+        rows.append({"vectors": size, "build_s": build_seconds, "open_ms": open_ms, **summarize_latencies(samples)})
+
+    print_table(rows, ["vectors", "build_s", "open_ms", "mean_ms", "p50_ms", "p95_ms", "p99_ms"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Load test the shared Web API client against a local stub of ContosoSuitesWebAPI.
+
+Compares three ways of calling the API under concurrent users:
+- bare: requests.get() per call, a new connection every time (the old page code)
+- pooled: the shared keep-alive client
+- fan-out: bookings for every hotel fetched concurrently in one call
+
+    python -m benchmarks.bench_webapi --users 8 --requests 50 --latency 0.01"""
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.fakes import FakeWebApiHandler, start_fake_server
+from benchmarks.stats import print_table, summarize_latencies
+from core.webapi import WebApiClient, WebApiSettings
+
+
+def run_users(users, requests_per_user, call):
+    """Run call() requests_per_user times from each of users threads.
+    Returns per-call latencies and the wall-clock time of the whole run."""
+
+    def user(_):
+        samples = []
+        for i in range(requests_per_user):
+            start = time.perf_counter()
+            call(i)
+            samples.append(time.perf_counter() - start)
+        return samples
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        results = list(pool.map(user, range(users)))
+    elapsed = time.perf_counter() - start
+    return [s for samples in results for s in samples], elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=50, help="Requests per user.")
+    parser.add_argument("--hotels", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.01,
+        help="Simulated seconds the stub takes to answer each request.")
+    args = parser.parse_args()
+
+    FakeWebApiHandler.latency = args.latency
+    FakeWebApiHandler.hotel_count = args.hotels
+    server, endpoint = start_fake_server(FakeWebApiHandler)
+    client = WebApiClient(WebApiSettings(base_url=endpoint, max_concurrency=args.hotels))
+    hotel_ids = list(range(1, args.hotels + 1))
+    rows = []
+    try:
+        def bare(i):
+            requests.get(f"{endpoint}/Hotels/{i % args.hotels + 1}/Bookings", timeout=10).json()
+
+        def pooled(i):
+            client.get(f"/Hotels/{i % args.hotels + 1}/Bookings").json()
+
+        for mode, call in (("bare", bare), ("pooled", pooled)):
+            samples, elapsed = run_users(args.users, args.requests, call)
+            rows.append({"mode": mode, "rps": len(samples) / elapsed, **summarize_latencies(samples)})
+
+        # Warming every hotel: one request after another versus all at once.
+        start = time.perf_counter()
+        for hotel_id in hotel_ids:
+            client.get(f"/Hotels/{hotel_id}/Bookings").json()
+        sequential = time.perf_counter() - start
+        start = time.perf_counter()
+        client.get_many([f"/Hotels/{hotel_id}/Bookings" for hotel_id in hotel_ids])
+        fan_out = time.perf_counter() - start
+    finally:
+        client.close()
+        server.shutdown()
+
+    print_table(rows, ["mode", "count", "rps", "mean_ms", "p50_ms", "p95_ms", "p99_ms"])
+    print()
+    print(f"Warm bookings for {args.hotels} hotels: sequential {sequential * 1000:.1f} ms, "
+          f"fan-out {fan_out * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,518 @@
+"""Local stand-ins for the Azure services the dashboard calls.
+
+Each HTTP fake runs an HTTP/1.1 keep-alive server on localhost in a
+background thread, so benchmarks exercise real sockets without touching
+Azure. FakeCosmosContainer is an in-process stand-in for a Cosmos DB
+container client that simulates round-trip latency and request charges.
+FakeLanguageClient and FakeAsyncCosmosClient stand in for the async
+Language and Cosmos DB clients of the service layer, which need aiohttp
+to talk to the real services."""
+
+import asyncio
+import base64
+import datetime
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from azure.ai.textanalytics import (
+    AbstractiveSummary,
+    AbstractiveSummaryAction,
+    AbstractiveSummaryResult,
+    AnalyzeSentimentAction,
+    AnalyzeSentimentResult,
+    ExtractiveSummaryAction,
+    ExtractiveSummaryResult,
+    SentenceSentiment,
+    SentimentConfidenceScores,
+    SummarySentence
+)
+from azure.core.credentials import AccessToken
+from azure.cosmos.exceptions import (
+    CosmosHttpResponseError,
+    CosmosResourceExistsError,
+    CosmosResourceNotFoundError
+)
+
+from core.transcript_store import estimate_document_bytes
+
+EMBEDDING_DIMENSIONS = 1536
+
+
+class FakeCredential:
+    """Credential that simulates the latency of probing the credential chain
+    and fetching a token from Microsoft Entra ID."""
+
+    def __init__(self, token_latency=0.05, token_lifetime=3600):
+        self.token_latency = token_latency
+        self.token_lifetime = token_lifetime
+        self.token_requests = 0
+
+    def get_token(self, *scopes, **kwargs):
+        self.token_requests += 1
+        time.sleep(self.token_latency)
+        return AccessToken("fake-token", int(time.time()) + self.token_lifetime)
+
+
+class FakeServiceHandler(BaseHTTPRequestHandler):
+    """Base request handler that keeps connections alive and sends JSON."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length) if length else b""
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_chunks(self, content_type, chunks, delay=0.0):
+        """Send a body a chunk at a time with chunked transfer encoding, delay seconds apart,
+        the way a server that flushes a streamed reply would."""
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, chunk in enumerate(chunks):
+            data = chunk.encode("utf-8")
+            if data:
+                if i and delay:
+                    time.sleep(delay)
+                self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def send_json_string_chunks(self, pieces, delay=0.0):
+        """Send a JSON string body a piece at a time."""
+
+        # Each piece is encoded on its own, without the surrounding quotes.
+        encoded = [json.dumps(piece)[1:-1] for piece in pieces]
+        self.send_chunks("application/json; charset=utf-8", ['"', *encoded, '"'], delay)
+
+
+class FakeAzureOpenAIHandler(FakeServiceHandler):
+    """Answers Azure OpenAI chat completion and embedding requests.
+    latency is the time to the response, or to the first token of a streamed one;
+    a streamed completion then sends stream_tokens tokens at tokens_per_second,
+    or as fast as it can when tokens_per_second is None. Embeddings are seeded
+    from the text, so the same text always gets the same vector."""
+
+    latency = 0.0
+    stream_tokens = 20
+    tokens_per_second = None
+
+    def do_POST(self):
+        request = json.loads(self.read_body() or b"{}")
+        time.sleep(self.latency)
+        if self.path.split("?")[0].endswith("/chat/completions") and request.get("stream"):
+            delay = 1 / self.tokens_per_second if self.tokens_per_second else 0.0
+            events = [chat_completion_chunk_payload(None)]
+            events += [chat_completion_chunk_payload(f"token{i} ") for i in range(self.stream_tokens)]
+            self.send_chunks("text/event-stream",
+                             [f"data: {json.dumps(event)}\n\n" for event in events] + ["data: [DONE]\n\n"], delay)
+        elif self.path.split("?")[0].endswith("/chat/completions"):
+            self.send_json(chat_completion_payload("This is a fake completion."))
+        elif self.path.split("?")[0].endswith("/embeddings"):
+            inputs = request.get("input", [])
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            self.send_json(embedding_payload(len(inputs), texts=inputs,
+                                             encoding_format=request.get("encoding_format", "float")))
+        else:
+            self.send_json({"error": {"code": "404", "message": "Not found"}}, status=404)
+
+
+class FakeWebApiHandler(FakeServiceHandler):
+    """Answers the ContosoSuitesWebAPI routes with canned data."""
+
+    latency = 0.0
+    hotel_count = 10
+    bookings_per_hotel = 25
+    # When set, /MaintenanceCopilotChat streams these pieces instead of a canned reply.
+    copilot_pieces = None
+    copilot_piece_delay = 0.0
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        parts = [p for p in self.path.split("?")[0].split("/") if p]
+        if parts == ["Hotels"]:
+            self.send_json(fake_hotels(self.hotel_count))
+        elif len(parts) in (3, 4) and parts[0] == "Hotels" and parts[2] == "Bookings":
+            bookings = fake_bookings(int(parts[1]), self.bookings_per_hotel)
+            if len(parts) == 4:
+                # /Hotels/{hotelId}/Bookings/{min_date}
+                bookings = [booking for booking in bookings if booking["stayBeginDate"][:10] >= parts[3][:10]]
+            self.send_json(bookings)
+        elif parts == ["Vectorize"]:
+            self.send_json([0.0] * EMBEDDING_DIMENSIONS)
+        else:
+            self.send_json({"error": "Not found"}, status=404)
+
+    def do_POST(self):
+        self.read_body()
+        time.sleep(self.latency)
+        path = self.path.split("?")[0].rstrip("/")
+        if path == "/Chat":
+            self.send_json("There are 3 bookings for hotel 3 this week.")
+        elif path == "/VectorSearch":
+            self.send_json([{
+                "hotelId": 1, "hotel": "Oceanic Resort", "details": "The air conditioning is broken.",
+                "source": "customer", "similarityScore": 0.91
+            }])
+        elif path == "/MaintenanceCopilotChat" and self.copilot_pieces:
+            self.send_json_string_chunks(self.copilot_pieces, self.copilot_piece_delay)
+        elif path == "/MaintenanceCopilotChat":
+            self.send_json("I have created a maintenance request for room 205.")
+        else:
+            self.send_json({"error": "Not found"}, status=404)
+
+
+def fake_hotels(count):
+    """Return hotels shaped like the Web API's Hotel entity."""
+
+    return [
+        {"hotelID": i, "hotelName": f"Contoso Suites {i}", "city": "Nassau", "country": "Bahamas"}
+        for i in range(1, count + 1)
+    ]
+
+
+def fake_bookings(hotel_id, count):
+    """Return bookings shaped like the Web API's Booking entity, with stays spread over 2022-2024."""
+
+    first_stay = datetime.date(2022, 1, 1)
+    bookings = []
+    for i in range(count):
+        begin = first_stay + datetime.timedelta(days=i * 1096 // max(count, 1))
+        end = begin + datetime.timedelta(days=i % 7 + 1)
+        bookings.append({
+            "bookingID": hotel_id * 100000 + i, "customerID": i % 500 + 1, "hotelID": hotel_id,
+            "stayBeginDate": f"{begin.isoformat()}T00:00:00",
+            "stayEndDate": f"{end.isoformat()}T00:00:00",
+            "numberOfGuests": i % 4 + 1
+        })
+    return bookings
+
+
+def chat_completion_payload(content):
+    """Return a chat completion response body with a single choice."""
+
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": "gpt-4o",
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": content}
+        }],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+    }
+
+
+def chat_completion_chunk_payload(content):
+    """Return one event of a streamed chat completion. Azure OpenAI's first event has
+    no choices, only the prompt's content filter results; pass None for it."""
+
+    choices = [] if content is None else [{"index": 0, "finish_reason": None, "delta": {"content": content}}]
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": "gpt-4o",
+        "choices": choices
+    }
+
+
+def fake_embedding(text, dimensions=EMBEDDING_DIMENSIONS):
+    """Return a unit vector seeded from text: the same text always gets the same vector,
+    and different texts get nearly orthogonal ones."""
+
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def embedding_payload(count, dimensions=EMBEDDING_DIMENSIONS, texts=None, encoding_format="float"):
+    """Return an embeddings response body with one vector per input: zeros, or seeded
+    from each of texts when given. encoding_format "base64" encodes the float32 bytes,
+    as the service does for the openai SDK."""
+
+    vectors = [fake_embedding(text, dimensions) for text in texts] if texts else \
+        [np.zeros(dimensions, dtype=np.float32)] * count
+    if encoding_format == "base64":
+        encoded = [base64.b64encode(vector.tobytes()).decode("ascii") for vector in vectors]
+    else:
+        encoded = [vector.tolist() for vector in vectors]
+    return {
+        "object": "list",
+        "model": "text-embedding-ada-002",
+        "data": [
+            {"object": "embedding", "index": i, "embedding": embedding}
+            for i, embedding in enumerate(encoded)
+        ],
+        "usage": {"prompt_tokens": count, "total_tokens": count}
+    }
+
+
+class FakeCosmosContainer:
+    """In-memory Cosmos DB container with the methods of ContainerProxy the dashboard uses.
+    Every request sleeps for round_trip seconds plus transfer time, and reports
+    a request charge in the x-ms-request-charge header passed to response_hook:
+    read_ru for a point read, and write_ru plus write_ru_per_kb per KB written.
+    A transactional batch is one round trip charged the sum of its operations.
+    With ru_per_second set, requests beyond that provisioned throughput are
+    rejected with a 429 and an x-ms-retry-after-ms header, as the service does."""
+
+    MAX_BATCH_OPERATIONS = 100
+
+    def __init__(self, partition_key_path="call_id", round_trip=0.005, seconds_per_kb=0.00002,
+                 read_ru=1.0, write_ru=5.5, write_ru_per_kb=0.6, ru_per_second=None):
+        self.partition_key_path = partition_key_path
+        self.round_trip = round_trip
+        self.seconds_per_kb = seconds_per_kb
+        self.read_ru = read_ru
+        self.write_ru = write_ru
+        self.write_ru_per_kb = write_ru_per_kb
+        self.ru_per_second = ru_per_second
+        self.items = {}
+        self.requests = 0
+        self.throttled = 0
+        self.request_charge = 0.0
+        self._ru_available = ru_per_second or 0.0
+        self._ru_updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _admit(self, charge):
+        """Spend charge from the provisioned throughput, or raise a 429 like the service."""
+
+        if self.ru_per_second is None:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._ru_available = min(self.ru_per_second,
+                                     self._ru_available + (now - self._ru_updated) * self.ru_per_second)
+            self._ru_updated = now
+            # A request larger than a second's budget is let through once the budget is full.
+            needed = min(charge, self.ru_per_second)
+            if self._ru_available >= needed:
+                self._ru_available -= charge
+                return
+            self.throttled += 1
+            retry_after_ms = (needed - self._ru_available) / self.ru_per_second * 1000
+        time.sleep(self.round_trip)
+        error = CosmosHttpResponseError(status_code=429, message="Request rate is large.")
+        error.headers = {"x-ms-retry-after-ms": str(int(retry_after_ms) + 1)}
+        raise error
+
+    def _respond(self, charge, kilobytes, response_hook, result):
+        time.sleep(self.round_trip + kilobytes * self.seconds_per_kb)
+        with self._lock:
+            self.requests += 1
+            self.request_charge += charge
+        if response_hook is not None:
+            response_hook({"x-ms-request-charge": f"{charge:.2f}"}, result)
+        return result
+
+    def _write_charge(self, body):
+        kilobytes = estimate_document_bytes(body) / 1024
+        return self.write_ru + self.write_ru_per_kb * kilobytes, kilobytes
+
+    def read_item(self, item, partition_key, response_hook=None, **kwargs):
+        with self._lock:
+            body = self.items.get((partition_key, item))
+        if body is None:
+            time.sleep(self.round_trip)
+            raise CosmosResourceNotFoundError(message=f"Item {item} not found.")
+        self._admit(self.read_ru)
+        return self._respond(self.read_ru, 0, response_hook, dict(body))
+
+    def create_item(self, body, response_hook=None, **kwargs):
+        key = (body[self.partition_key_path], body["id"])
+        charge, kilobytes = self._write_charge(body)
+        self._admit(charge)
+        with self._lock:
+            exists = key in self.items
+            if not exists:
+                self.items[key] = dict(body)
+        if exists:
+            time.sleep(self.round_trip)
+            raise CosmosResourceExistsError(message=f"Item {body['id']} already exists.")
+        return self._respond(charge, kilobytes, response_hook, dict(body))
+
+    def upsert_item(self, body, response_hook=None, **kwargs):
+        charge, kilobytes = self._write_charge(body)
+        self._admit(charge)
+        with self._lock:
+            self.items[(body[self.partition_key_path], body["id"])] = dict(body)
+        return self._respond(charge, kilobytes, response_hook, dict(body))
+
+    def execute_item_batch(self, batch_operations, partition_key, response_hook=None, **kwargs):
+        if len(batch_operations) > self.MAX_BATCH_OPERATIONS:
+            raise ValueError("A transactional batch holds at most 100 operations.")
+        charge = 0.0
+        kilobytes = 0.0
+        results = []
+        for operation, args in batch_operations:
+            if operation != "upsert":
+                raise ValueError(f"FakeCosmosContainer does not support {operation!r} in a batch.")
+            body = args[0]
+            if body[self.partition_key_path] != partition_key:
+                raise ValueError("Every item in a transactional batch must share the partition key.")
+            item_charge, item_kilobytes = self._write_charge(body)
+            charge += item_charge
+            kilobytes += item_kilobytes
+            results.append({"statusCode": 200, "requestCharge": item_charge, "resourceBody": body})
+        self._admit(charge)
+        with self._lock:
+            for _, (body,) in batch_operations:
+                self.items[(partition_key, body["id"])] = dict(body)
+        return self._respond(charge, kilobytes, response_hook, results)
+
+
+class FakeAsyncCosmosClient:
+    """In-process stand-in for the async CosmosClient, with the calls query_items() in
+    core.services makes. Queries ignore their SQL apart from TOP and the similarity
+    threshold, and rank the items of container by cosine similarity to @request_vector
+    after round_trip seconds."""
+
+    TOP = re.compile(r"\bTOP\s+(\d+)", re.IGNORECASE)
+    THRESHOLD = re.compile(r"\)\s*>\s*([-\d.]+)")
+
+    def __init__(self, container, round_trip=0.01):
+        self.container = container
+        self.round_trip = round_trip
+        self.queries = 0
+
+    def get_database_client(self, database):
+        return self
+
+    def get_container_client(self, container):
+        return self
+
+    async def query_items(self, query, parameters=None, **kwargs):
+        await asyncio.sleep(self.round_trip)
+        self.queries += 1
+        values = {parameter["name"]: parameter["value"] for parameter in parameters or []}
+        top = self.TOP.search(query)
+        threshold = self.THRESHOLD.search(query)
+        items = list(self.container.items.values())
+        if not items or "@request_vector" not in values:
+            return
+        query_vector = np.asarray(values["@request_vector"], dtype=np.float32)
+        vectors = np.asarray([item["request_vector"] for item in items], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1) * (np.linalg.norm(query_vector) or 1.0)
+        scores = vectors @ query_vector / np.where(norms, norms, 1.0)
+        ranked = np.argsort(-scores)[:int(top.group(1)) if top else len(items)]
+        for index in ranked:
+            if threshold and scores[index] <= float(threshold.group(1)):
+                break
+            item = items[index]
+            yield {"id": item["id"], "call_id": item["call_id"], "call_transcript": item["call_transcript"],
+                   "abstractive_summary": item.get("abstractive_summary"), "SimilarityScore": float(scores[index])}
+
+    async def close(self):
+        pass
+
+
+class FakeLanguageClient:
+    """In-process stand-in for the async TextAnalyticsClient. Every request takes latency
+    seconds, and an analyze-actions job job_seconds more before its results are ready.
+    Results are the SDK's own models, with the first sentences of each document as
+    its summaries."""
+
+    def __init__(self, latency=0.05, job_seconds=0.5):
+        self.latency = latency
+        self.job_seconds = job_seconds
+        self.requests = 0
+        self.jobs = 0
+
+    async def analyze_sentiment(self, documents, show_opinion_mining=False, **kwargs):
+        await asyncio.sleep(self.latency)
+        self.requests += 1
+        return [fake_sentiment_result(i, document) for i, document in enumerate(documents)]
+
+    async def begin_analyze_actions(self, documents, actions, **kwargs):
+        await asyncio.sleep(self.latency)
+        self.requests += 1
+        self.jobs += 1
+        return FakeAnalyzeActionsPoller(self, documents, actions)
+
+    async def close(self):
+        pass
+
+
+class FakeAnalyzeActionsPoller:
+    def __init__(self, client, documents, actions):
+        self.client = client
+        self.documents = documents
+        self.actions = actions
+
+    async def result(self):
+        await asyncio.sleep(self.client.job_seconds)
+        return self._results()
+
+    async def _results(self):
+        for i, document in enumerate(self.documents):
+            yield [fake_action_result(action, i, document) for action in self.actions]
+
+
+def fake_sentences(document, count=None):
+    sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+", document) if s.strip()]
+    return sentences[:count] if count else sentences
+
+
+def fake_sentiment_result(index, document):
+    """Return a positive AnalyzeSentimentResult for document, one SentenceSentiment per sentence."""
+
+    scores = SentimentConfidenceScores(positive=0.8, neutral=0.15, negative=0.05)
+    return AnalyzeSentimentResult(
+        id=str(index), sentiment="positive", confidence_scores=scores, is_error=False,
+        sentences=[SentenceSentiment(text=sentence, sentiment="positive", confidence_scores=scores, mined_opinions=[])
+                   for sentence in fake_sentences(document)]
+    )
+
+
+def fake_action_result(action, index, document):
+    if isinstance(action, ExtractiveSummaryAction):
+        return ExtractiveSummaryResult(id=str(index), is_error=False, sentences=[
+            SummarySentence(text=sentence, rank_score=1.0, offset=0, length=len(sentence))
+            for sentence in fake_sentences(document, action.max_sentence_count or 3)])
+    if isinstance(action, AbstractiveSummaryAction):
+        return AbstractiveSummaryResult(id=str(index), is_error=False, summaries=[
+            AbstractiveSummary(text=" ".join(fake_sentences(document, action.sentence_count or 3)))])
+    if isinstance(action, AnalyzeSentimentAction):
+        return fake_sentiment_result(index, document)
+    raise ValueError(f"FakeLanguageClient does not support {type(action).__name__}.")
+
+
+class FakeHTTPServer(ThreadingHTTPServer):
+    """Threaded server with a listen backlog deep enough for load tests."""
+
+    request_queue_size = 1024
+
+
+def start_fake_server(handler_class):
+    """Start a fake server on a free localhost port.
+    Returns the server and its base URL; call server.shutdown() when finished."""
+
+    server = FakeHTTPServer(("127.0.0.1", 0), handler_class)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address
+    return server, f"http://{host}:{port}"
@@ -0,0 +1,41 @@
+"""Helpers for summarizing and printing benchmark measurements."""
+
+import statistics
+
+
+def percentile(samples, pct):
+    """Return the pct-th percentile of samples using nearest-rank."""
+
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def summarize_latencies(samples):
+    """Summarize latencies (in seconds) as milliseconds."""
+
+    return {
+        "count": len(samples),
+        "mean_ms": statistics.fmean(samples) * 1000 if samples else 0.0,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000
+    }
+
+
+def print_table(rows, columns):
+    """Print a list of dicts as a fixed-width table."""
+
+    widths = {c: max(len(c), *(len(format_value(r.get(c))) for r in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    print("  ".join("-" * widths[c] for c in columns))
+    for row in rows:
+        print("  ".join(format_value(row.get(c)).ljust(widths[c]) for c in columns))
+
+
+def format_value(value):
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return "" if value is None else str(value)
@@ -0,0 +1 @@
+"""Shared building blocks used by the Contoso Suites dashboard pages."""
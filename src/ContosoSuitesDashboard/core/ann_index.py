@@ -0,0 +1,208 @@
+"""Approximate nearest-neighbour search with an inverted-file (IVF) index.
+
+Vectors are clustered with k-means into nlist lists. A query is scored
+against the centroids first, and then exactly against the vectors in the
+nprobe closest lists only. Raising nprobe trades speed for recall;
+nprobe == nlist is an exact search.
+
+build() trains the centroids offline and stores each list as a contiguous
+slice of the vector matrix. add() assigns new vectors to their closest
+list without retraining; call build() again once many vectors have been
+added. save() and load() persist the index, with the matrix memory-mapped
+on load. IVFIndex has the same add() and search() methods as
+core.vector_index.VectorIndex, so either can back a search page."""
+
+import json
+import os
+import threading
+
+import numpy as np
+
+from core.lazy import lazy_module
+from core.vector_index import normalize_rows, top_k
+
+# Only build() needs scikit-learn; loading an index to search it does not.
+cluster = lazy_module("sklearn.cluster")
+
+DEFAULT_NPROBE = 8
+# k-means is trained on at most this many vectors.
+MAX_TRAINING_SAMPLES = 50_000
+
+
+def default_nlist(count):
+    """Rule of thumb: about sqrt(n) lists, at least one."""
+
+    return max(1, int(np.sqrt(count)))
+
+
+class IVFIndex:
+    """Inverted-file index over unit-length float32 vectors."""
+
+    def __init__(self, centroids, matrix, list_offsets, items, nprobe=DEFAULT_NPROBE):
+        self.centroids = centroids
+        self.nprobe = nprobe
+        self._matrix = matrix
+        # Rows list_offsets[i]:list_offsets[i + 1] belong to list i.
+        self._list_offsets = list_offsets
+        self._items = list(items)
+        self._ids = {item["id"]: row for row, item in enumerate(self._items)}
+        # Vectors added after build() are kept apart, with the list each one belongs to.
+        self._extra_vectors = np.empty((0, centroids.shape[1]), dtype=np.float32)
+        self._extra_lists = np.empty(0, dtype=np.int64)
+        # The index is shared by every session, so add() and search() take turns.
+        self._lock = threading.RLock()
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, item_id):
+        return item_id in self._ids
+
+    @classmethod
+    def build(cls, items, vectors, nlist=None, nprobe=DEFAULT_NPROBE, seed=42):
+        """Train centroids on vectors and build the inverted lists."""
+
+        vectors = normalize_rows(vectors)
+        if not len(vectors):
+            raise ValueError("There are no vectors to build an IVF index from.")
+        nlist = min(nlist or default_nlist(len(vectors)), len(vectors))
+        rng = np.random.default_rng(seed)
+        sample = vectors
+        if len(vectors) > MAX_TRAINING_SAMPLES:
+            sample = vectors[rng.choice(len(vectors), MAX_TRAINING_SAMPLES, replace=False)]
+        kmeans = cluster.MiniBatchKMeans(n_clusters=nlist, random_state=seed, n_init=3,
+                                 batch_size=max(1024, 4 * nlist)).fit(sample)
+        centroids = normalize_rows(kmeans.cluster_centers_)
+
+        assignments = cls._assign(centroids, vectors)
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=nlist)
+        list_offsets = np.concatenate([[0], np.cumsum(counts)])
+        items = [items[row] for row in order]
+        return cls(centroids, np.ascontiguousarray(vectors[order]), list_offsets, items, nprobe)
+
+    @staticmethod
+    def _assign(centroids, vectors, batch_size=8192):
+        assignments = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), batch_size):
+            assignments[start:start + batch_size] = np.argmax(
+                vectors[start:start + batch_size] @ centroids.T, axis=1)
+        return assignments
+
+    def add(self, items, vectors):
+        """Assign new vectors to their closest lists. Items already indexed are skipped."""
+
+        with self._lock:
+            vectors = normalize_rows(vectors)
+            new_rows = [row for row, item in enumerate(items) if item["id"] not in self._ids]
+            if not new_rows:
+                return 0
+            vectors = vectors[new_rows]
+            for row in new_rows:
+                self._ids[items[row]["id"]] = len(self._items)
+                self._items.append(items[row])
+            self._extra_vectors = np.concatenate([self._extra_vectors, vectors])
+            self._extra_lists = np.concatenate([self._extra_lists, self._assign(self.centroids, vectors)])
+            return len(new_rows)
+
+    def rebuild(self, nlist=None):
+        """Retrain the centroids on every vector, including those added since build()."""
+
+        with self._lock:
+            vectors = np.concatenate([np.asarray(self._matrix), self._extra_vectors])
+            items = list(self._items)
+        return IVFIndex.build(items, vectors, nlist or self.nlist, self.nprobe)
+
+    def search(self, query_vector, max_results=5, minimum_similarity_score=0.0, nprobe=None):
+        """Return up to max_results items from the nprobe closest lists, best first."""
+
+        with self._lock:
+            if not self._items:
+                return []
+            query = normalize_rows(query_vector)[0]
+            nprobe = min(nprobe or self.nprobe, self.nlist)
+            probes = top_k(self.centroids @ query, nprobe)
+
+            row_blocks = []
+            score_blocks = []
+            for probe in probes:
+                start, end = self._list_offsets[probe], self._list_offsets[probe + 1]
+                if end > start:
+                    row_blocks.append(np.arange(start, end))
+                    score_blocks.append(self._matrix[start:end] @ query)
+            if len(self._extra_lists):
+                extra = np.flatnonzero(np.isin(self._extra_lists, probes))
+                if len(extra):
+                    row_blocks.append(extra + len(self._matrix))
+                    score_blocks.append(self._extra_vectors[extra] @ query)
+            if not row_blocks:
+                return []
+
+            rows = np.concatenate(row_blocks)
+            scores = np.concatenate(score_blocks)
+            results = []
+            for position in top_k(scores, max_results):
+                score = float(scores[position])
+                if score < minimum_similarity_score:
+                    break
+                results.append({**self._items[rows[position]], "SimilarityScore": score})
+            return results
+
+    def memory_bytes(self):
+        """Approximate bytes used by vectors, centroids and list structures."""
+
+        return (self._matrix.nbytes + self._extra_vectors.nbytes + self._extra_lists.nbytes
+                + self.centroids.nbytes + self._list_offsets.nbytes)
+
+    def save(self, directory):
+        """Persist the index. Vectors added since build() are folded into their lists."""
+
+        index = self.rebuild_lists()
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "centroids.npy"), index.centroids)
+        np.save(os.path.join(directory, "vectors.npy"), np.asarray(index._matrix))
+        np.save(os.path.join(directory, "list_offsets.npy"), index._list_offsets)
+        with open(os.path.join(directory, "items.jsonl"), "w", encoding="utf-8") as f:
+            for item in index._items:
+                f.write(json.dumps(item) + "\n")
+        with open(os.path.join(directory, "ivf.json"), "w", encoding="utf-8") as f:
+            json.dump({"nlist": index.nlist, "nprobe": index.nprobe, "count": len(index)}, f)
+
+    def rebuild_lists(self):
+        """Return an index whose lists include the added vectors, keeping the current centroids."""
+
+        with self._lock:
+            if not len(self._extra_lists):
+                return self
+            built_lists = np.repeat(np.arange(self.nlist), np.diff(self._list_offsets))
+            assignments = np.concatenate([built_lists, self._extra_lists])
+            vectors = np.concatenate([np.asarray(self._matrix), self._extra_vectors])
+            order = np.argsort(assignments, kind="stable")
+            counts = np.bincount(assignments, minlength=self.nlist)
+            list_offsets = np.concatenate([[0], np.cumsum(counts)])
+            items = [self._items[row] for row in order]
+            return IVFIndex(self.centroids, np.ascontiguousarray(vectors[order]), list_offsets, items, self.nprobe)
+
+    @classmethod
+    def load(cls, directory, nprobe=None):
+        """Load a saved index, memory-mapping the vector matrix."""
+
+        with open(os.path.join(directory, "ivf.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(os.path.join(directory, "items.jsonl"), encoding="utf-8") as f:
+            items = [json.loads(line) for line in f]
+        return cls(
+            np.load(os.path.join(directory, "centroids.npy")),
+            np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r"),
+            np.load(os.path.join(directory, "list_offsets.npy")),
+            items,
+            nprobe or meta["nprobe"]
+        )
+
+    @staticmethod
+    def exists(directory):
+        return os.path.exists(os.path.join(directory, "ivf.json"))
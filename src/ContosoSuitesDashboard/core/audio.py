@@ -0,0 +1,199 @@
+"""Streaming ingestion of WAV audio into the Speech service.
+
+The WAV file is viewed through a memoryview, backed by mmap for files on disk
+or by the upload's own buffer, so it is never copied as a whole. Fixed-size
+frames are pushed to the conversation transcriber as they are read, and
+finalized transcript segments are yielded as soon as the service returns them.
+Peak memory is a few frames no matter how long the call is.
+
+A transcription that the service cancels with an error, or whose audio cannot
+be read to the end, raises instead of ending early with a partial transcript."""
+
+import logging
+import mmap
+import os
+import queue
+import struct
+import threading
+from collections import namedtuple
+from contextlib import closing, contextmanager
+
+from core.lazy import lazy_module
+
+speechsdk = lazy_module("azure.cognitiveservices.speech")
+
+logger = logging.getLogger(__name__)
+
+# The Speech service's native input format.
+SPEECH_SAMPLE_RATE = 16000
+SPEECH_BITS_PER_SAMPLE = 16
+SPEECH_CHANNELS = 1
+# Push audio in frames of this many milliseconds.
+FRAME_MILLISECONDS = 100
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+WavInfo = namedtuple("WavInfo", [
+    "format_tag", "channels", "sample_rate", "bits_per_sample", "block_align", "data_offset", "data_size"
+])
+
+
+class TranscriptionError(RuntimeError):
+    """The Speech service canceled a transcription because of an error."""
+
+
+@contextmanager
+def open_audio_buffer(source):
+    """Yield a read-only memoryview over an audio source without copying it.
+    source may be a file path, an object with getbuffer() such as a Streamlit
+    UploadedFile, or any file-like object."""
+
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                yield view
+            finally:
+                view.release()
+    elif hasattr(source, "getbuffer"):
+        view = source.getbuffer()
+        try:
+            yield view
+        finally:
+            view.release()
+    else:
+        yield memoryview(source.read())
+
+
+def read_wav(buffer):
+    """Parse the RIFF header of a WAV file held in buffer.
+    Returns a WavInfo with the format and the position of the sample data in buffer."""
+
+    if bytes(buffer[0:4]) != b"RIFF" or bytes(buffer[8:12]) != b"WAVE":
+        raise ValueError("The audio file is not a WAV file.")
+    fmt = None
+    offset = 12
+    while offset + 8 <= len(buffer):
+        chunk_id = bytes(buffer[offset:offset + 4])
+        (chunk_size,) = struct.unpack_from("<I", buffer, offset + 4)
+        body = offset + 8
+        if chunk_id == b"fmt ":
+            fmt = struct.unpack_from("<HHIIHH", buffer, body)
+            format_tag = fmt[0]
+            if format_tag == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 26:
+                # The real format is the first two bytes of the sub-format GUID.
+                (format_tag,) = struct.unpack_from("<H", buffer, body + 24)
+            fmt = (format_tag,) + fmt[1:]
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise ValueError("The WAV file has no fmt chunk before its data.")
+            format_tag, channels, sample_rate, _, block_align, bits_per_sample = fmt
+            # Streaming writers may leave the size unset; take everything that is there.
+            data_size = min(chunk_size, len(buffer) - body)
+            data_size -= data_size % block_align
+            return WavInfo(format_tag, channels, sample_rate, bits_per_sample, block_align, body, data_size)
+        offset = body + chunk_size + (chunk_size & 1)
+    raise ValueError("The WAV file has no data chunk.")
+
+
+def iter_frames(buffer, wav, frame_bytes):
+    """Yield consecutive memoryview slices of the sample data of at most frame_bytes each.
+    Each slice is released when the next one is requested, so do not keep references to it."""
+
+    end = wav.data_offset + wav.data_size
+    for start in range(wav.data_offset, end, frame_bytes):
+        with buffer[start:min(start + frame_bytes, end)] as frame:
+            yield frame
+
+
+def frame_size(wav, milliseconds=FRAME_MILLISECONDS):
+    """Bytes in a frame of the given duration, rounded to whole samples."""
+
+    return max(1, wav.sample_rate * milliseconds // 1000) * wav.block_align
+
+
+def is_speech_format(wav):
+    return (wav.format_tag == WAVE_FORMAT_PCM and wav.sample_rate == SPEECH_SAMPLE_RATE
+            and wav.bits_per_sample == SPEECH_BITS_PER_SAMPLE and wav.channels == SPEECH_CHANNELS)
+
+
+def stream_transcription(source, speech_config, frame_milliseconds=FRAME_MILLISECONDS):
+    """Transcribe a WAV source, yielding each finalized transcript segment as it arrives.
+    Audio that is not already 16 kHz 16-bit mono PCM is downmixed and resampled block by block."""
+
+    # Imported here because core.resample builds on the helpers in this module.
+    from core.resample import iter_speech_frames
+
+    with open_audio_buffer(source) as buffer:
+        wav = read_wav(buffer)
+        if is_speech_format(wav):
+            frames = iter_frames(buffer, wav, frame_size(wav, frame_milliseconds))
+        else:
+            frames = iter_speech_frames(buffer, wav)
+        with closing(frames):
+            yield from transcribe_frames(frames, speech_config)
+
+
+def transcribe_frames(frames, speech_config):
+    """Push 16 kHz 16-bit mono PCM frames to a conversation transcriber on a
+    background thread, yielding finalized transcript segments as they arrive.
+    Raises TranscriptionError if the service cancels the transcription with an
+    error, or the error raised while reading the frames."""
+
+    wave_format = speechsdk.audio.AudioStreamFormat(SPEECH_SAMPLE_RATE, SPEECH_BITS_PER_SAMPLE, SPEECH_CHANNELS)
+    stream = speechsdk.audio.PushAudioInputStream(stream_format=wave_format)
+    audio_config = speechsdk.audio.AudioConfig(stream=stream)
+    transcriber = speechsdk.transcription.ConversationTranscriber(speech_config, audio_config)
+
+    segments = queue.Queue()
+    stop_pushing = threading.Event()
+    # The first error from the service or the pusher thread, raised once both have stopped.
+    errors = []
+
+    def handle_final_result(evt):
+        if evt.result.text:
+            segments.put(evt.result.text)
+
+    def stop_cb(evt):
+        logger.debug("Transcription session stopped: %s", evt)
+        segments.put(None)
+
+    def canceled_cb(evt):
+        details = evt.cancellation_details
+        if details.reason == speechsdk.CancellationReason.Error:
+            errors.append(TranscriptionError(
+                f"Transcription was canceled with error {details.code}: {details.error_details}"
+            ))
+        segments.put(None)
+
+    transcriber.transcribed.connect(handle_final_result)
+    transcriber.session_stopped.connect(stop_cb)
+    transcriber.canceled.connect(canceled_cb)
+
+    def push_frames():
+        try:
+            for frame in frames:
+                if stop_pushing.is_set():
+                    break
+                # Only this one frame is copied into the SDK's buffer.
+                stream.write(bytes(frame))
+        except BaseException as error:
+            errors.append(error)
+            segments.put(None)
+        finally:
+            stream.close()
+
+    transcriber.start_transcribing_async().get()
+    pusher = threading.Thread(target=push_frames, daemon=True)
+    pusher.start()
+    try:
+        while (text := segments.get()) is not None:
+            yield text
+    finally:
+        stop_pushing.set()
+        pusher.join()
+        transcriber.stop_transcribing_async().get()
+    if errors:
+        raise errors[0]
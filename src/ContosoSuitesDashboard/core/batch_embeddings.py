@@ -0,0 +1,134 @@
+"""Token-aware batched embedding engine.
+
+Texts are normalized, counted with tiktoken, split into chunks when they are
+longer than the model's input limit, and packed into requests that stay under
+the per-request item and token limits. Batches run concurrently with a bound on
+how many are in flight, and vectors come back in input order. A text that was
+split is represented by the token-weighted average of its chunk vectors."""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import tiktoken
+
+from core.text import normalize_text
+
+# Limits for text-embedding-ada-002 and the text-embedding-3 models.
+ENCODING_NAME = "cl100k_base"
+MAX_INPUT_TOKENS = 8191
+MAX_BATCH_ITEMS = 2048
+MAX_BATCH_TOKENS = 300_000
+MAX_IN_FLIGHT = 4
+
+
+def combine_chunk_vectors(vectors, weights):
+    """Average chunk vectors weighted by token count, then rescale to unit length."""
+
+    combined = np.average(np.asarray(vectors, dtype=np.float32), axis=0, weights=weights).astype(np.float32)
+    norm = np.linalg.norm(combined)
+    return combined / norm if norm else combined
+
+
+class BatchEmbedder:
+    """Embed many texts with as few requests as the model limits allow.
+    embed_batch is a callable that takes a list of strings and returns one vector per string."""
+
+    def __init__(self, embed_batch, encoding_name=ENCODING_NAME, max_input_tokens=MAX_INPUT_TOKENS,
+                 max_batch_items=MAX_BATCH_ITEMS, max_batch_tokens=MAX_BATCH_TOKENS,
+                 max_in_flight=MAX_IN_FLIGHT, cache=None, deployment_name=None):
+        self.embed_batch = embed_batch
+        self.encoding = tiktoken.get_encoding(encoding_name)
+        self.max_input_tokens = max_input_tokens
+        self.max_batch_items = max_batch_items
+        self.max_batch_tokens = max(max_batch_tokens, max_input_tokens)
+        self.max_in_flight = max_in_flight
+        self.cache = cache
+        self.deployment_name = deployment_name
+        self.requests_sent = 0
+
+    def split(self, text):
+        """Split normalized text into chunks of at most max_input_tokens tokens.
+        Returns a list of (chunk_text, token_count) pairs."""
+
+        tokens = self.encoding.encode(text)
+        if len(tokens) <= self.max_input_tokens:
+            return [(text, max(len(tokens), 1))]
+        return [
+            (self.encoding.decode(tokens[i:i + self.max_input_tokens]), len(tokens[i:i + self.max_input_tokens]))
+            for i in range(0, len(tokens), self.max_input_tokens)
+        ]
+
+    def pack(self, chunks):
+        """Greedily pack (chunk_text, token_count) pairs into batches under the item and token limits.
+        Returns a list of batches, each a list of indexes into chunks."""
+
+        batches = []
+        batch = []
+        batch_tokens = 0
+        for index, (_, token_count) in enumerate(chunks):
+            if batch and (len(batch) >= self.max_batch_items or batch_tokens + token_count > self.max_batch_tokens):
+                batches.append(batch)
+                batch = []
+                batch_tokens = 0
+            batch.append(index)
+            batch_tokens += token_count
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def embed(self, texts):
+        """Return one float32 vector per text, in input order."""
+
+        normalized = [normalize_text(text) for text in texts]
+        results = [None] * len(normalized)
+
+        # Serve what we can from the cache, and embed each distinct missing text once.
+        pending = {}
+        for position, text in enumerate(normalized):
+            if self.cache is not None:
+                vector = self.cache.get(text, self.deployment_name)
+                if vector is not None:
+                    results[position] = vector
+                    continue
+            pending.setdefault(text, []).append(position)
+        if not pending:
+            return results
+
+        # Split every pending text into chunks and remember which text each chunk belongs to.
+        chunks = []
+        owners = []
+        for text in pending:
+            for chunk in self.split(text):
+                chunks.append(chunk)
+                owners.append(text)
+
+        chunk_vectors = [None] * len(chunks)
+        batches = self.pack(chunks)
+
+        def run(batch):
+            return batch, self.embed_batch([chunks[i][0] for i in batch])
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            for batch, vectors in pool.map(run, batches):
+                for index, vector in zip(batch, vectors):
+                    chunk_vectors[index] = vector
+        self.requests_sent += len(batches)
+
+        # Reassemble chunk vectors into one vector per text.
+        by_text = {}
+        for index, text in enumerate(owners):
+            by_text.setdefault(text, []).append(index)
+        embedded = []
+        for text, indexes in by_text.items():
+            if len(indexes) == 1:
+                vector = np.asarray(chunk_vectors[indexes[0]], dtype=np.float32)
+            else:
+                vector = combine_chunk_vectors(
+                    [chunk_vectors[i] for i in indexes], [chunks[i][1] for i in indexes])
+            embedded.append((text, vector))
+            for position in pending[text]:
+                results[position] = vector
+
+        if self.cache is not None:
+            self.cache.put_many(embedded, self.deployment_name)
+        return results
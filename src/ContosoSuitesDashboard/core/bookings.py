@@ -0,0 +1,98 @@
+"""Typed, compact hotel bookings from the Web API.
+
+Bookings arrive as a JSON list of objects. They are parsed once into a
+pandas DataFrame with narrow column types: 32-bit IDs, an 8-bit guest count
+and datetime64 stay dates. st.cache_data stores such a frame as a few column
+buffers, far smaller and faster to restore than a pickled HTTP response that
+still has to be decoded from JSON on every rerun, and st.dataframe renders
+it in a virtualized grid.
+
+A start date is pushed down to the /Hotels/{hotelId}/Bookings/{min_date}
+route, so only the bookings needed are transferred. An end date and paging
+are applied to the frame."""
+
+import hashlib
+import math
+
+import pandas as pd
+
+BOOKING_COLUMNS = {
+    "bookingID": "int32",
+    "customerID": "int32",
+    "hotelID": "int32",
+    "stayBeginDate": "datetime64[ns]",
+    "stayEndDate": "datetime64[ns]",
+    "numberOfGuests": "int8"
+}
+DATE_COLUMNS = ("stayBeginDate", "stayEndDate")
+PAGE_SIZES = (100, 500, 1000, 5000)
+DEFAULT_PAGE_SIZE = 500
+
+
+def bookings_frame(records):
+    """Return a list of Booking objects from the Web API as a typed DataFrame."""
+
+    frame = pd.DataFrame.from_records(records, columns=list(BOOKING_COLUMNS))
+    for column, dtype in BOOKING_COLUMNS.items():
+        if column in DATE_COLUMNS:
+            frame[column] = pd.to_datetime(frame[column], format="ISO8601")
+        else:
+            frame[column] = frame[column].astype(dtype)
+    return frame
+
+
+def bookings_path(hotel_id, min_date=None):
+    """Web API route for a hotel's bookings, only stays beginning on or after min_date if given."""
+
+    if min_date is None:
+        return f"/Hotels/{hotel_id}/Bookings"
+    return f"/Hotels/{hotel_id}/Bookings/{min_date.isoformat()}"
+
+
+def fetch_bookings(client, hotel_id, min_date=None):
+    """Return a hotel's bookings as a typed DataFrame."""
+
+    response = client.get(bookings_path(hotel_id, min_date))
+    response.raise_for_status()
+    return bookings_frame(response.json())
+
+
+def fetch_bookings_for_hotels(client, hotel_ids, min_date=None):
+    """Return the bookings of every hotel as typed DataFrames keyed by hotel ID.
+    The requests are sent concurrently."""
+
+    responses = client.get_many([bookings_path(hotel_id, min_date) for hotel_id in hotel_ids])
+    bookings_by_hotel = {}
+    for hotel_id, response in zip(hotel_ids, responses):
+        response.raise_for_status()
+        bookings_by_hotel[hotel_id] = bookings_frame(response.json())
+    return bookings_by_hotel
+
+
+def bookings_fingerprint(bookings_by_hotel):
+    """Hash of the bookings of every hotel, which changes when any booking does."""
+
+    digest = hashlib.sha256()
+    for hotel_id in sorted(bookings_by_hotel):
+        digest.update(str(hotel_id).encode("utf-8"))
+        digest.update(pd.util.hash_pandas_object(bookings_by_hotel[hotel_id], index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def filter_stays(bookings, max_date=None):
+    """Keep the bookings whose stay begins on or before max_date."""
+
+    if max_date is None:
+        return bookings
+    return bookings[bookings["stayBeginDate"] < pd.Timestamp(max_date) + pd.Timedelta(days=1)]
+
+
+def page_count(bookings, page_size):
+    return max(1, math.ceil(len(bookings) / page_size))
+
+
+def get_page(bookings, page, page_size):
+    """Return the rows of a 1-based page."""
+
+    start = (page - 1) * page_size
+    return bookings.iloc[start:start + page_size]
@@ -0,0 +1,363 @@
+"""Bulk loading of the seed corpora in src/data into Cosmos DB.
+
+Records are read from a JSON array or JSON Lines file a block at a time, so a
+file of millions of records never has to fit in memory. Each record gets a
+stable document ID from its key fields and a hash of its contents. Records
+whose hash matches the load manifest of an earlier run are skipped, so a
+re-run only touches new and changed records. The text of the rest is
+embedded in batches, and the documents are upserted in transactional batches
+per partition key while the next chunk is being read and embedded.
+
+Writes run concurrently under an adaptive limit. A 429 response halves the
+number of batches in flight and pauses every writer for the retry-after
+interval the service asked for; successful batches raise the limit again a
+step at a time. The loader's Cosmos client has the SDK's own throttle
+retries turned off, so the limit sees every 429."""
+
+import hashlib
+import itertools
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from azure.cosmos.exceptions import CosmosHttpResponseError
+
+from core.transcript_store import RequestCharge, make_batches
+
+DEFAULT_MANIFEST_PATH = ".cache/bulk_load.sqlite3"
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_MAX_CONCURRENCY = 32
+DEFAULT_MAX_RETRIES = 10
+READ_BLOCK_CHARACTERS = 2**20
+MANIFEST_QUERY_SIZE = 500
+MAX_BACKOFF_SECONDS = 30
+THROTTLED = 429
+# Request timeout, retry-with and service unavailable are retried with backoff.
+TRANSIENT_STATUS_CODES = (408, 449, 503)
+RETRY_AFTER_MS_HEADER = "x-ms-retry-after-ms"
+
+
+class Corpus:
+    """How the records of one seed file become documents in a container.
+    text is a format string over a record's fields; records are embedded into
+    vector_field when it is set. extra_fields are added to every document."""
+
+    def __init__(self, file_name, container_name, partition_key, key_fields, text=None,
+                 vector_field=None, extra_fields=None):
+        self.file_name = file_name
+        self.container_name = container_name
+        self.partition_key = partition_key
+        self.key_fields = key_fields
+        self.text = text
+        self.vector_field = vector_field
+        self.extra_fields = extra_fields or {}
+
+    def document_id(self, record):
+        key = json.dumps([record.get(field) for field in self.key_fields], separators=(",", ":"), default=str)
+        return hashlib.sha256(f"{self.container_name}:{key}".encode("utf-8")).hexdigest()[:32]
+
+    def content_hash(self, record):
+        """Hash of the record and of how it is embedded; a change to either reloads it."""
+
+        payload = json.dumps([record, self.text, self.vector_field, self.extra_fields],
+                             sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def make_document(self, record, vector=None):
+        document = {**record, **self.extra_fields, "id": self.document_id(record),
+                    "content_hash": self.content_hash(record)}
+        if self.vector_field:
+            document[self.vector_field] = vector
+        return document
+
+
+# The maintenance request text matches what the vectorization function embeds;
+# "Vectorized" stops the function from embedding the loaded documents again.
+# Maintenance requests have no natural key, so an edited request is loaded as a new document.
+CORPORA = {
+    "maintenance": Corpus(
+        "PropertyMaintenance.json", "MaintenanceRequests", "hotel_id", ("hotel_id", "date", "source", "details"),
+        text="Hotel: {hotel}\n Request Details: {details}", vector_field="request_vector",
+        extra_fields={"type": "Vectorized"}
+    ),
+    "reviews": Corpus(
+        "UserReviews.json", "UserReviews", "hotel_id", ("hotel_id", "user_id"),
+        text="Hotel: {hotel}\n Review: {text}", vector_field="review_vector"
+    ),
+    "customers": Corpus("Customers.json", "Customers", "id", ("FullName",))
+}
+
+
+def iter_json_records(path, block_characters=READ_BLOCK_CHARACTERS):
+    """Yield the objects in a JSON array or JSON Lines file, reading it a block at a time."""
+
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8-sig") as f:
+        buffer = ""
+        position = 0
+        started = False
+        eof = False
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position >= len(buffer) or buffer[position] not in "[]{":
+                if position < len(buffer):
+                    raise ValueError(f"Unexpected {buffer[position]!r} in {path}.")
+                if eof:
+                    return
+                block = f.read(block_characters)
+                eof = not block
+                buffer, position = buffer[position:] + block, 0
+                continue
+            if buffer[position] == "[" and not started:
+                started = True
+                position += 1
+                continue
+            if buffer[position] == "]":
+                return
+            started = True
+            try:
+                record, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The record continues in the next block.
+                if eof:
+                    raise
+                block = f.read(block_characters)
+                eof = not block
+                buffer, position = buffer[position:] + block, 0
+                continue
+            yield record
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+class LoadManifest:
+    """Content hashes of the documents written by earlier runs, per container, in a SQLite file.
+    Use it from one thread."""
+
+    def __init__(self, path=DEFAULT_MANIFEST_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS loaded ("
+            " container TEXT NOT NULL,"
+            " id TEXT NOT NULL,"
+            " content_hash TEXT NOT NULL,"
+            " PRIMARY KEY (container, id))"
+        )
+
+    def unchanged(self, container_name, hashes):
+        """Return the IDs in hashes, a dict of ID to content hash, that were loaded with the same hash."""
+
+        ids = list(hashes)
+        unchanged = set()
+        for start in range(0, len(ids), MANIFEST_QUERY_SIZE):
+            group = ids[start:start + MANIFEST_QUERY_SIZE]
+            rows = self._conn.execute(
+                f"SELECT id, content_hash FROM loaded WHERE container = ? AND id IN ({','.join('?' * len(group))})",
+                (container_name, *group)
+            )
+            unchanged.update(document_id for document_id, content_hash in rows if hashes[document_id] == content_hash)
+        return unchanged
+
+    def record(self, container_name, hashes):
+        with self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO loaded VALUES (?, ?, ?)",
+                                   [(container_name, document_id, content_hash)
+                                    for document_id, content_hash in hashes.items()])
+
+    def clear(self, container_name):
+        with self._conn:
+            self._conn.execute("DELETE FROM loaded WHERE container = ?", (container_name,))
+
+    def close(self):
+        self._conn.close()
+
+
+class AdaptiveConcurrency:
+    """Limit on concurrent requests that follows the service's throttling:
+    additive increase on success, multiplicative decrease on a 429.
+
+    acquire() blocks until a slot is free and no pause is in effect, and returns a
+    token to pass to release(). Only one decrease is made per burst of 429s: a
+    request that started before the last decrease does not decrease the limit again."""
+
+    def __init__(self, max_concurrency, initial=None, min_concurrency=1, clock=time.monotonic):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = float(initial or max(min_concurrency, max_concurrency // 4))
+        self.clock = clock
+        self.in_flight = 0
+        self.throttles = 0
+        self.decreases = 0
+        self.paused_seconds = 0.0
+        self._paused_until = 0.0
+        self._last_decrease = float("-inf")
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while True:
+                delay = self._paused_until - self.clock()
+                if delay > 0:
+                    self._condition.wait(delay)
+                elif self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return self.clock()
+                else:
+                    self._condition.wait()
+
+    def release(self, started, throttled=False, retry_after=0.0):
+        with self._condition:
+            self.in_flight -= 1
+            now = self.clock()
+            if not throttled:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            else:
+                self.throttles += 1
+                if started >= self._last_decrease:
+                    self.limit = max(self.min_concurrency, self.limit / 2)
+                    self._last_decrease = now
+                    self.decreases += 1
+                if now + retry_after > self._paused_until:
+                    self.paused_seconds += now + retry_after - max(now, self._paused_until)
+                    self._paused_until = now + retry_after
+            self._condition.notify_all()
+
+
+def retry_after_seconds(error, attempt):
+    """Seconds to wait before retrying: the service's retry-after if it sent one,
+    otherwise exponential backoff with jitter."""
+
+    headers = getattr(error, "headers", None) or {}
+    if headers.get(RETRY_AFTER_MS_HEADER):
+        return float(headers[RETRY_AFTER_MS_HEADER]) / 1000
+    if headers.get("Retry-After"):
+        return float(headers["Retry-After"])
+    return min(MAX_BACKOFF_SECONDS, 0.1 * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+class BulkWriter:
+    """Upsert batches of documents into a container under an AdaptiveConcurrency limit,
+    retrying throttled and transient failures."""
+
+    def __init__(self, container, limiter, max_retries=DEFAULT_MAX_RETRIES):
+        self.container = container
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.request_charge = RequestCharge()
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def write(self, partition_key, documents):
+        """Upsert documents, which share partition_key, in one transactional batch."""
+
+        attempt = 0
+        while True:
+            started = self.limiter.acquire()
+            try:
+                self.container.execute_item_batch(
+                    batch_operations=[("upsert", (document,)) for document in documents],
+                    partition_key=partition_key,
+                    response_hook=self.request_charge.hook
+                )
+            except CosmosHttpResponseError as error:
+                retryable = error.status_code == THROTTLED or error.status_code in TRANSIENT_STATUS_CODES
+                if not retryable or attempt >= self.max_retries:
+                    self.limiter.release(started)
+                    raise
+                attempt += 1
+                with self._lock:
+                    self.retries += 1
+                delay = retry_after_seconds(error, attempt)
+                if error.status_code == THROTTLED:
+                    # The limiter pauses every writer for the retry-after interval.
+                    self.limiter.release(started, throttled=True, retry_after=delay)
+                else:
+                    self.limiter.release(started)
+                    time.sleep(delay)
+                continue
+            self.limiter.release(started)
+            return documents
+
+
+def load_corpus(corpus, path, container, embed=None, manifest=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                max_concurrency=DEFAULT_MAX_CONCURRENCY, max_retries=DEFAULT_MAX_RETRIES, progress=None):
+    """Load the records in path into container. embed is a callable that returns one vector
+    per text, required when the corpus has a vector field. Records the manifest has already
+    loaded with the same contents are skipped. progress, if given, is called with the
+    counts after every chunk. Returns a report of counts, timings and request charges."""
+
+    limiter = AdaptiveConcurrency(max_concurrency)
+    writer = BulkWriter(container, limiter, max_retries)
+    counts = {"read": 0, "unchanged": 0, "embedded": 0, "written": 0}
+    embed_seconds = 0.0
+    start = time.perf_counter()
+
+    def finish(done):
+        for future in done:
+            documents = future.result()
+            counts["written"] += len(documents)
+            if manifest is not None:
+                manifest.record(corpus.container_name,
+                                {document["id"]: document["content_hash"] for document in documents})
+
+    pending = set()
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        for records in chunked(iter_json_records(path), chunk_size):
+            counts["read"] += len(records)
+            # The last of several records with the same key wins, as it would one upsert at a time.
+            by_id = {corpus.document_id(record): record for record in records}
+            if manifest is not None:
+                unchanged = manifest.unchanged(corpus.container_name,
+                                               {document_id: corpus.content_hash(record)
+                                                for document_id, record in by_id.items()})
+                counts["unchanged"] += len(unchanged)
+                for document_id in unchanged:
+                    del by_id[document_id]
+            records = list(by_id.values())
+            if not records:
+                continue
+
+            vectors = [None] * len(records)
+            if corpus.vector_field:
+                embed_start = time.perf_counter()
+                vectors = embed([corpus.text.format_map(record) for record in records])
+                embed_seconds += time.perf_counter() - embed_start
+                counts["embedded"] += len(records)
+            documents = [corpus.make_document(record, vector) for record, vector in zip(records, vectors)]
+
+            for partition_key, batch in make_batches(documents, corpus.partition_key):
+                pending.add(executor.submit(writer.write, partition_key, batch))
+            # Let the writers catch up before reading further, so memory stays bounded.
+            while len(pending) > 2 * max_concurrency:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                finish(done)
+            if progress is not None:
+                progress(counts)
+        done, pending = wait(pending)
+        finish(done)
+
+    elapsed = time.perf_counter() - start
+    return {
+        **counts,
+        "elapsed_s": elapsed,
+        "embed_s": embed_seconds,
+        "records_per_second": counts["read"] / elapsed if elapsed else 0.0,
+        "request_charge": writer.request_charge.total,
+        "retries": writer.retries,
+        "throttles": limiter.throttles,
+        "paused_s": limiter.paused_seconds,
+        "final_concurrency": int(limiter.limit)
+    }
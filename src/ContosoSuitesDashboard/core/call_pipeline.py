@@ -0,0 +1,256 @@
+"""Headless batch processing of recorded calls through the Call Center stages.
+
+Each WAV file is run through the same functions the Call Center page calls
+one button at a time: transcription, the compliance check, the extractive,
+abstractive and query-based summaries, sentiment analysis and opinion
+mining, embedding generation and the save to Cosmos DB. The page module is
+loaded by path, so the pipeline always uses exactly the page's code.
+
+Audio normalization (downmix and resample to 16 kHz mono) is CPU-bound and
+runs in a process pool. Every service call runs on a worker thread under
+asyncio, bounded by a semaphore per service, and at most max_calls calls are
+in flight at once. The analysis stages of a call run concurrently.
+
+After every stage, the call's results so far are written to a JSON
+checkpoint in the state directory. A rerun with the same state directory
+skips finished calls and resumes unfinished ones at their first incomplete
+stage. Each finished or failed call is logged at INFO or ERROR level."""
+
+import asyncio
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from core.audio import is_speech_format, open_audio_buffer, read_wav
+from core.resample import convert_to_speech_wav
+from core.transcript_store import make_transcript_item
+
+CALL_CENTER_PAGE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "pages", "4_Call_Center.py")
+DEFAULT_STATE_DIR = ".cache/call_pipeline"
+
+# Stages that only need the transcript, run concurrently once it exists.
+# The summaries and sentiment come from a single Language service job.
+ANALYSIS_STAGES = ("compliance", "language_analysis", "openai_summary")
+STAGES = ("audio", "transcription") + ANALYSIS_STAGES + ("embedding", "save")
+
+# Default concurrent requests per service.
+DEFAULT_SERVICE_CONCURRENCY = {"speech": 4, "language": 4, "openai": 8, "cosmos": 8}
+
+logger = logging.getLogger(__name__)
+
+
+def load_call_center_page():
+    """Import the Call Center page as a module without running its main()."""
+
+    spec = importlib.util.spec_from_file_location("call_center_page", CALL_CENTER_PAGE_PATH)
+    page = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(page)
+    return page
+
+
+def find_recordings(directory):
+    """Return the paths of the WAV files in directory, sorted by name."""
+
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith(".wav") and os.path.isfile(os.path.join(directory, name))
+    )
+
+
+def prepare_audio(source_path, work_dir):
+    """Return the path of a 16 kHz 16-bit mono copy of a recording and its duration in seconds.
+    Recordings already in that format are used as they are. Runs in a worker process."""
+
+    with open_audio_buffer(source_path) as buffer:
+        wav = read_wav(buffer)
+        if is_speech_format(wav):
+            return source_path, wav.data_size / wav.block_align / wav.sample_rate
+    name = hashlib.sha256(os.path.abspath(source_path).encode("utf-8")).hexdigest()[:16] + ".wav"
+    destination_path = os.path.join(work_dir, name)
+    seconds = convert_to_speech_wav(source_path, destination_path)
+    return destination_path, seconds
+
+
+class CallCheckpoint:
+    """Results of the finished stages for one recording, stored as JSON in the state directory."""
+
+    def __init__(self, state_dir, source_path):
+        self.source_path = source_path
+        name = os.path.splitext(os.path.basename(source_path))[0]
+        digest = hashlib.sha256(os.path.abspath(source_path).encode("utf-8")).hexdigest()[:8]
+        self.path = os.path.join(state_dir, f"{name}-{digest}.json")
+        self.state = {"source": source_path, "stages": {}, "error": None}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                self.state = json.load(f)
+
+    @property
+    def completed(self):
+        return all(stage in self.state["stages"] for stage in STAGES)
+
+    def has(self, stage):
+        return stage in self.state["stages"]
+
+    def result(self, stage):
+        return self.state["stages"][stage]["result"]
+
+    def record(self, stage, result, seconds):
+        self.state["stages"][stage] = {"result": result, "seconds": seconds}
+        self.state["error"] = None
+        self.save()
+
+    def record_error(self, error):
+        self.state["error"] = f"{type(error).__name__}: {error}"
+        self.save()
+
+    def save(self):
+        # Write to a temporary file first so a crash never leaves a torn checkpoint.
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(temporary_path, self.path)
+
+
+class CallPipeline:
+    """Run a batch of recordings through the Call Center stages."""
+
+    def __init__(self, page, state_dir=DEFAULT_STATE_DIR, audio_workers=None, max_calls=8,
+                 service_concurrency=None, include_recording_message=True, is_relevant_to_topic=True):
+        self.page = page
+        self.state_dir = state_dir
+        self.work_dir = os.path.join(state_dir, "audio")
+        self.audio_workers = audio_workers
+        self.max_calls = max_calls
+        self.service_concurrency = {**DEFAULT_SERVICE_CONCURRENCY, **(service_concurrency or {})}
+        self.include_recording_message = include_recording_message
+        self.is_relevant_to_topic = is_relevant_to_topic
+
+    def run(self, recordings):
+        """Process every recording and return a report of throughput and stage timings."""
+
+        os.makedirs(self.work_dir, exist_ok=True)
+        return asyncio.run(self._run(recordings))
+
+    async def _run(self, recordings):
+        loop = asyncio.get_running_loop()
+        # Service calls block on I/O, so give every permitted request its own thread.
+        threads = sum(self.service_concurrency.values())
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=threads, thread_name_prefix="call-pipeline"))
+        self._calls = asyncio.Semaphore(self.max_calls)
+        self._services = {name: asyncio.Semaphore(limit) for name, limit in self.service_concurrency.items()}
+        self._stage_seconds = {stage: [] for stage in STAGES}
+
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=self.audio_workers) as audio_pool:
+            self._audio_pool = audio_pool
+            outcomes = await asyncio.gather(*(self._process(path) for path in recordings))
+        elapsed = time.perf_counter() - start
+        return self._report(outcomes, elapsed)
+
+    async def _process(self, source_path):
+        checkpoint = CallCheckpoint(self.state_dir, source_path)
+        if checkpoint.completed:
+            return "skipped", checkpoint
+        async with self._calls:
+            try:
+                await self._run_stages(checkpoint)
+            except Exception as error:
+                checkpoint.record_error(error)
+                logger.error("Failed %s: %s: %s", source_path, type(error).__name__, error)
+                return "failed", checkpoint
+        logger.info("Processed %s", source_path)
+        return "processed", checkpoint
+
+    async def _run_stages(self, checkpoint):
+        page = self.page
+        loop = asyncio.get_running_loop()
+
+        async def prepare():
+            path, seconds = await loop.run_in_executor(
+                self._audio_pool, prepare_audio, checkpoint.source_path, self.work_dir)
+            return {"path": path, "seconds": seconds}
+
+        await self._stage(checkpoint, "audio", None, prepare)
+        audio_path = checkpoint.result("audio")["path"]
+        if not os.path.exists(audio_path):
+            # The normalized copy was cleaned up since the checkpoint; make it again.
+            del checkpoint.state["stages"]["audio"]
+            await self._stage(checkpoint, "audio", None, prepare)
+            audio_path = checkpoint.result("audio")["path"]
+
+        await self._stage(checkpoint, "transcription", "speech",
+                          lambda: asyncio.to_thread(page.create_transcription_request, audio_path))
+        call_contents = checkpoint.result("transcription")
+
+        await asyncio.gather(
+            self._stage(checkpoint, "compliance", "openai", lambda: asyncio.to_thread(
+                page.is_call_in_compliance, call_contents, self.include_recording_message, self.is_relevant_to_topic)),
+            self._stage(checkpoint, "language_analysis", "language", lambda: asyncio.to_thread(
+                page.analyze_call_with_language_service, call_contents)),
+            self._stage(checkpoint, "openai_summary", "openai", lambda: asyncio.to_thread(
+                page.generate_query_based_summary, call_contents))
+        )
+
+        call_transcript = ' '.join(call_contents)
+        if not checkpoint.has("embedding"):
+            async with self._services["cosmos"]:
+                saved = await asyncio.to_thread(page.is_transcript_saved, call_transcript)
+            if saved:
+                # Saved by an earlier run or another machine; skip embedding and saving it again.
+                checkpoint.record("embedding", None, 0.0)
+                checkpoint.record("save", make_transcript_item(call_transcript, None)["id"], 0.0)
+                return
+        await self._stage(checkpoint, "embedding", "openai", lambda: asyncio.to_thread(
+            page.generate_embeddings_for_call_contents, call_transcript))
+
+        async def save():
+            transcript_item = make_transcript_item(call_transcript, checkpoint.result("embedding"))
+            abstractive_summary = checkpoint.result("language_analysis")["abstractive_summary"]
+            if abstractive_summary:
+                transcript_item["abstractive_summary"] = abstractive_summary["call-summary"]
+            # An upsert of a document with the same ID, so a save repeated after a
+            # run stopped before its checkpoint was written does not fail.
+            await asyncio.to_thread(page.save_transcript_to_cosmos_db, transcript_item)
+            return transcript_item["id"]
+
+        await self._stage(checkpoint, "save", "cosmos", save)
+
+    async def _stage(self, checkpoint, stage, service, run):
+        if checkpoint.has(stage):
+            return
+        start = time.perf_counter()
+        if service is None:
+            result = await run()
+        else:
+            async with self._services[service]:
+                result = await run()
+        seconds = time.perf_counter() - start
+        self._stage_seconds[stage].append(seconds)
+        checkpoint.record(stage, result, seconds)
+
+    def _report(self, outcomes, elapsed):
+        counts = {"processed": 0, "skipped": 0, "failed": 0}
+        audio_seconds = 0.0
+        for outcome, checkpoint in outcomes:
+            counts[outcome] += 1
+            if outcome == "processed":
+                audio_seconds += checkpoint.result("audio")["seconds"]
+        stages = {
+            stage: {
+                "count": len(seconds),
+                "mean_s": sum(seconds) / len(seconds) if seconds else 0.0,
+                "max_s": max(seconds, default=0.0)
+            }
+            for stage, seconds in self._stage_seconds.items()
+        }
+        return {
+            **counts,
+            "elapsed_s": elapsed,
+            "calls_per_hour": counts["processed"] * 3600 / elapsed if elapsed else 0.0,
+            "audio_hours_per_hour": audio_seconds / elapsed if elapsed else 0.0,
+            "stages": stages
+        }
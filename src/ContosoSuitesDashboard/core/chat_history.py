@@ -0,0 +1,135 @@
+"""Token-budgeted chat history with a rolling summary of older turns.
+
+Each message is counted with tiktoken once, when it is added, and the
+history keeps a running total, so building a prompt never recounts the
+conversation. A prompt holds the most recent messages that fit in the token
+budget, preceded by a summary of everything older.
+
+Messages that fall out of the window are folded into the summary on a
+background thread, so no turn waits for it. Until a fold finishes, the prompt
+uses the previous summary; the messages still being folded are left out."""
+
+import logging
+import threading
+
+import tiktoken
+
+# The GPT-4o tokenizer.
+ENCODING_NAME = "o200k_base"
+# Tokens a chat message costs on top of its content, and tokens that prime the reply.
+MESSAGE_OVERHEAD_TOKENS = 3
+REPLY_PRIMING_TOKENS = 3
+MAX_PROMPT_TOKENS = 4_000
+# The newest messages are always sent, even when they alone exceed the budget.
+MIN_RECENT_MESSAGES = 2
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+logger = logging.getLogger(__name__)
+
+
+class ChatHistory:
+    """The messages of a chat and the prompt to send for the next turn.
+
+    summarize is a callable taking the previous summary and a list of messages
+    and returning a new summary that covers both. It runs on executor. Without
+    them, messages outside the window are simply dropped."""
+
+    def __init__(self, messages=None, summarize=None, executor=None, max_prompt_tokens=MAX_PROMPT_TOKENS,
+                 min_recent_messages=MIN_RECENT_MESSAGES, encoding_name=ENCODING_NAME):
+        self.encoding = tiktoken.get_encoding(encoding_name)
+        self.summarize = summarize
+        self.executor = executor
+        self.max_prompt_tokens = max_prompt_tokens
+        self.min_recent_messages = min_recent_messages
+        self.messages = messages if messages is not None else []
+        self.total_tokens = 0
+        for message in self.messages:
+            message.setdefault("tokens", self.count_tokens(message["content"]))
+            self.total_tokens += message["tokens"]
+        self.summary = ""
+        self.summary_tokens = 0
+        # The first summarized_count messages are covered by the summary.
+        self.summarized_count = 0
+        self.turns = []
+        self._pending = None
+        self._lock = threading.Lock()
+
+    def count_tokens(self, content):
+        return len(self.encoding.encode(content)) + MESSAGE_OVERHEAD_TOKENS
+
+    def append(self, role, content):
+        """Add a message, counting its tokens once."""
+
+        tokens = self.count_tokens(content)
+        self.messages.append({"role": role, "content": content, "tokens": tokens})
+        self.total_tokens += tokens
+
+    def _collect_summary(self):
+        with self._lock:
+            if self._pending is None or not self._pending[1].done():
+                return
+            end, future = self._pending
+            self._pending = None
+        try:
+            summary = future.result()
+        except Exception as error:
+            # Keep the previous summary; the fold is retried on the next turn.
+            logger.warning("Chat history summary failed: %s: %s", type(error).__name__, error)
+            return
+        self.summary = summary
+        self.summary_tokens = self.count_tokens(SUMMARY_PREFIX + summary) if summary else 0
+        self.summarized_count = end
+
+    def _schedule_fold(self, end):
+        if self.summarize is None or self.executor is None:
+            return
+        with self._lock:
+            if self._pending is not None:
+                return
+            messages = [{"role": m["role"], "content": m["content"]} for m in self.messages[self.summarized_count:end]]
+            self._pending = (end, self.executor.submit(self.summarize, self.summary, messages))
+
+    def window_start(self):
+        """Index of the oldest message that fits in the budget after the summary."""
+
+        budget = self.max_prompt_tokens - self.summary_tokens - REPLY_PRIMING_TOKENS
+        start = len(self.messages)
+        used = 0
+        while start > self.summarized_count:
+            tokens = self.messages[start - 1]["tokens"]
+            if used + tokens > budget and len(self.messages) - start >= self.min_recent_messages:
+                break
+            used += tokens
+            start -= 1
+        return start
+
+    def prompt_messages(self):
+        """Return the messages to send for the next turn and record how many tokens they save."""
+
+        self._collect_summary()
+        start = self.window_start()
+        if start > self.summarized_count:
+            self._schedule_fold(start)
+
+        prompt = []
+        prompt_tokens = REPLY_PRIMING_TOKENS + sum(m["tokens"] for m in self.messages[start:])
+        if self.summary:
+            prompt.append({"role": "system", "content": SUMMARY_PREFIX + self.summary})
+            prompt_tokens += self.summary_tokens
+        prompt.extend({"role": m["role"], "content": m["content"]} for m in self.messages[start:])
+
+        full_history_tokens = self.total_tokens + REPLY_PRIMING_TOKENS
+        self.turns.append({
+            "prompt_tokens": prompt_tokens,
+            "full_history_tokens": full_history_tokens,
+            "tokens_saved": max(0, full_history_tokens - prompt_tokens),
+            "messages_sent": len(self.messages) - start,
+            "messages_summarized": self.summarized_count
+        })
+        return prompt
+
+    @property
+    def tokens_saved(self):
+        """Prompt tokens saved over all turns, compared with resending the whole history."""
+
+        return sum(turn["tokens_saved"] for turn in self.turns)
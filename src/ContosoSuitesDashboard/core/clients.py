@@ -0,0 +1,178 @@
+"""Process-wide registry of Azure service clients.
+
+Every dashboard page gets its Azure OpenAI, Cosmos DB, Language and Speech
+clients from here. Clients are built once per process with st.cache_resource,
+so reruns and sessions share the same credential, cached access tokens and
+pooled HTTPS connections instead of rebuilding them on every call."""
+
+import threading
+import time
+
+import httpx
+import streamlit as st
+from azure.core.credentials import AzureKeyCredential
+
+from core.lazy import lazy_module
+
+# Loaded when a client is first built; see core.lazy.
+openai = lazy_module("openai")
+speechsdk = lazy_module("azure.cognitiveservices.speech")
+textanalytics = lazy_module("azure.ai.textanalytics")
+cosmos = lazy_module("azure.cosmos")
+identity = lazy_module("azure.identity")
+
+COGNITIVE_SERVICES_SCOPE = "https://cognitiveservices.azure.com/.default"
+AOAI_API_VERSION = "2024-06-01"
+
+# Tokens are refreshed this many seconds before they expire,
+# so no request is ever sent with a token that is about to lapse.
+TOKEN_REFRESH_MARGIN_SECONDS = 300
+
+# Connection pool settings for the HTTP client behind Azure OpenAI.
+MAX_CONNECTIONS = 100
+MAX_KEEPALIVE_CONNECTIONS = 20
+KEEPALIVE_EXPIRY_SECONDS = 60
+REQUEST_TIMEOUT_SECONDS = 60
+CONNECT_TIMEOUT_SECONDS = 10
+
+
+class CachedTokenProvider:
+    """Bearer token provider that caches the access token and refreshes it
+    shortly before it expires. Drop-in replacement for get_bearer_token_provider()."""
+
+    def __init__(self, credential, scope=COGNITIVE_SERVICES_SCOPE, refresh_margin=TOKEN_REFRESH_MARGIN_SECONDS):
+        self._credential = credential
+        self._scope = scope
+        self._refresh_margin = refresh_margin
+        self._token = None
+        self._lock = threading.Lock()
+
+    def _needs_refresh(self, token):
+        return token is None or token.expires_on - self._refresh_margin <= time.time()
+
+    def __call__(self):
+        token = self._token
+        if self._needs_refresh(token):
+            # Only one thread refreshes; the others wait and reuse its token.
+            with self._lock:
+                token = self._token
+                if self._needs_refresh(token):
+                    token = self._credential.get_token(self._scope)
+                    self._token = token
+        return token.token
+
+
+def build_http_client(event_hooks=None):
+    """Create an HTTP client with a keep-alive connection pool."""
+
+    return httpx.Client(
+        event_hooks=event_hooks,
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY_SECONDS
+        ),
+        timeout=httpx.Timeout(REQUEST_TIMEOUT_SECONDS, connect=CONNECT_TIMEOUT_SECONDS)
+    )
+
+
+def build_openai_client(endpoint, token_provider, api_version=AOAI_API_VERSION, http_client=None):
+    """Create an Azure OpenAI client that authenticates with the given token provider."""
+
+    return openai.AzureOpenAI(
+        azure_ad_token_provider=token_provider,
+        api_version=api_version,
+        azure_endpoint=endpoint,
+        http_client=http_client or build_http_client()
+    )
+
+
+def build_cosmos_client(endpoint, credential, throttle_retries=None):
+    """Create a Cosmos DB client. With throttle_retries set, the SDK retries a 429
+    response at most that many times; 0 hands every 429 to the caller."""
+
+    if throttle_retries is None:
+        return cosmos.CosmosClient(url=endpoint, credential=credential)
+    connection_policy = cosmos.documents.ConnectionPolicy()
+    connection_policy.RetryOptions = cosmos.documents.RetryOptions(max_retry_attempt_count=throttle_retries)
+    return cosmos.CosmosClient(url=endpoint, credential=credential, connection_policy=connection_policy)
+
+
+@st.cache_resource
+def get_credential(managed_identity_client_id=None):
+    """Return the shared DefaultAzureCredential for the given managed identity."""
+
+    return identity.DefaultAzureCredential(managed_identity_client_id=managed_identity_client_id)
+
+
+@st.cache_resource
+def get_token_provider(scope=COGNITIVE_SERVICES_SCOPE):
+    """Return the shared caching bearer token provider for the given scope."""
+
+    return CachedTokenProvider(get_credential(), scope)
+
+
+@st.cache_resource
+def get_openai_client():
+    """Return the shared Azure OpenAI client. Key assumptions:
+    - The Azure OpenAI endpoint is stored in Streamlit secrets.
+    Its responses are reported to the deployment rate limiters of the service layer."""
+
+    # Imported here because core.services builds on this module's token provider.
+    from core.services import get_service_layer
+
+    http_client = build_http_client(event_hooks={"response": [get_service_layer().response_hook]})
+    return build_openai_client(st.secrets["aoai"]["endpoint"], get_token_provider(), http_client=http_client)
+
+
+@st.cache_resource
+def get_cosmos_client():
+    """Return the shared Cosmos DB client. Key assumptions:
+    - Cosmos DB endpoint and client_id stored in Streamlit secrets."""
+
+    cosmos_client_id = st.secrets["cosmos"]["client_id"]
+    cosmos_endpoint = st.secrets["cosmos"]["endpoint"]
+    return build_cosmos_client(cosmos_endpoint, get_credential(cosmos_client_id))
+
+
+@st.cache_resource
+def get_cosmos_container(container_name):
+    """Return the shared client for a container in the Contoso Suites database. Key assumptions:
+    - Cosmos DB database name stored in Streamlit secrets."""
+
+    cosmos_database_name = st.secrets["cosmos"]["database_name"]
+    database = get_cosmos_client().get_database_client(cosmos_database_name)
+    return database.get_container_client(container_name)
+
+
+@st.cache_resource
+def get_bulk_cosmos_container(container_name):
+    """Return a client for a container in the Contoso Suites database whose 429 responses
+    are not retried by the SDK, for bulk writers that throttle themselves."""
+
+    cosmos_settings = st.secrets["cosmos"]
+    client = build_cosmos_client(cosmos_settings["endpoint"], get_credential(cosmos_settings["client_id"]),
+                                 throttle_retries=0)
+    return client.get_database_client(cosmos_settings["database_name"]).get_container_client(container_name)
+
+
+@st.cache_resource
+def get_text_analytics_client():
+    """Return the shared Language service client. Key assumptions:
+    - Azure AI Services Language service endpoint and key stored in Streamlit secrets."""
+
+    language_endpoint = st.secrets["language"]["endpoint"]
+    language_key = st.secrets["language"]["key"]
+    return textanalytics.TextAnalyticsClient(language_endpoint, AzureKeyCredential(language_key))
+
+
+@st.cache_resource
+def get_speech_config(speech_recognition_language="en-US"):
+    """Return the shared speech config for a recognition language. Key assumptions:
+    - Speech key and region are stored in Streamlit secrets."""
+
+    speech_key = st.secrets["speech"]["key"]
+    speech_region = st.secrets["speech"]["region"]
+    speech_config = speechsdk.SpeechConfig(subscription=speech_key, region=speech_region)
+    speech_config.speech_recognition_language = speech_recognition_language
+    return speech_config
@@ -0,0 +1,161 @@
+"""Persistent, content-addressed cache of embedding vectors.
+
+Vectors are stored as compact float32 blobs in a SQLite file, keyed on a hash
+of the embedding deployment name and the normalized text. SQLite in WAL mode
+lets every process on the host (or every replica sharing the volume) read and
+write the same file. A small in-memory LRU sits in front of it, and
+warm_start() fills that LRU with the most recently used vectors after a restart."""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_MAX_ENTRIES = 100_000
+DEFAULT_MEMORY_ENTRIES = 2_048
+# Check the entry count and evict after this many writes, rather than on every write.
+EVICTION_CHECK_INTERVAL = 256
+
+
+def make_key(text, deployment_name):
+    """Return the cache key for normalized text embedded by a deployment."""
+
+    return hashlib.sha256(f"{deployment_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Size-bounded LRU cache of embeddings backed by a SQLite file."""
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES, memory_entries=DEFAULT_MEMORY_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._memory = OrderedDict()
+        self._writes_since_check = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " deployment TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_last_access ON embeddings (last_access)")
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, text, deployment_name):
+        """Return the cached vector as a float32 array, or None on a miss."""
+
+        key = make_key(text, deployment_name)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                self.memory_hits += 1
+                return vector
+            row = self._conn.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE embeddings SET last_access = ? WHERE key = ?", (time.time(), key))
+            vector = np.frombuffer(row[0], dtype=np.float32)
+            self._remember(key, vector)
+            self.hits += 1
+            return vector
+
+    def put(self, text, deployment_name, vector):
+        """Store a vector for normalized text embedded by a deployment."""
+
+        self.put_many([(text, vector)], deployment_name)
+
+    def put_many(self, items, deployment_name):
+        """Store several (text, vector) pairs in one transaction."""
+
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, vector in items:
+                key = make_key(text, deployment_name)
+                vector = np.asarray(vector, dtype=np.float32)
+                self._remember(key, vector)
+                rows.append((key, deployment_name, vector.tobytes(), now))
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                # Leave the shared connection usable for the next write.
+                self._conn.execute("ROLLBACK")
+                raise
+            self._writes_since_check += len(rows)
+            if self._writes_since_check >= EVICTION_CHECK_INTERVAL:
+                self._writes_since_check = 0
+                self._evict()
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_access LIMIT ?)", (excess,)
+            )
+            self.evictions += excess
+
+    def evict(self):
+        """Drop the least recently used entries above max_entries."""
+
+        with self._lock:
+            self._evict()
+
+    def warm_start(self, limit=None):
+        """Load the most recently used vectors into memory. Returns how many were loaded."""
+
+        limit = self.memory_entries if limit is None else min(limit, self.memory_entries)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, vector FROM embeddings ORDER BY last_access DESC LIMIT ?", (limit,)
+            ).fetchall()
+            # Insert oldest first so the most recent entries end up at the LRU head.
+            for key, blob in reversed(rows):
+                self._remember(key, np.frombuffer(blob, dtype=np.float32))
+        return len(rows)
+
+    def stats(self):
+        """Return hit/miss counters and the number of stored entries."""
+
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "memory_hits": self.memory_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "memory_entries": len(self._memory)
+        }
+
+    def close(self):
+        self._conn.close()
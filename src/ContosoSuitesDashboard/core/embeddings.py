@@ -0,0 +1,79 @@
+"""Embedding requests shared by the Call Center pages."""
+
+import streamlit as st
+
+from core.batch_embeddings import BatchEmbedder, MAX_BATCH_ITEMS, MAX_BATCH_TOKENS, MAX_IN_FLIGHT
+from core.embedding_cache import DEFAULT_MAX_ENTRIES, DEFAULT_MEMORY_ENTRIES, EmbeddingCache
+from core.rate_limit import estimate_embedding_tokens
+from core.services import call_service
+from core.telemetry import get_telemetry
+
+DEFAULT_CACHE_PATH = ".cache/embeddings.sqlite3"
+
+
+def make_azure_openai_embedding_request(text):
+    """Create and return a new embedding request. Key assumptions:
+    - Azure OpenAI endpoint, key, and deployment name stored in Streamlit secrets.
+    - text may be a single string or a list of strings."""
+
+    aoai_embedding_deployment_name = st.secrets["aoai"]["embedding_deployment_name"]
+
+    # The request runs on the shared service loop, under the Azure OpenAI concurrency limit and deadline,
+    # once the embedding deployment's quota admits it.
+    return call_service("openai", lambda client: client.embeddings.create(
+        model=aoai_embedding_deployment_name,
+        input=text
+    ), quota=aoai_embedding_deployment_name, tokens=estimate_embedding_tokens(text),
+        name="embeddings")
+
+
+def embed_batch(texts):
+    """Embed a list of strings in a single request and return the vectors in input order."""
+
+    response = make_azure_openai_embedding_request(texts)
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+@st.cache_resource
+def get_embedding_cache():
+    """Return the shared embedding cache, warmed with the most recently used vectors.
+    The optional [embedding_cache] secrets section may set path, max_entries and memory_entries."""
+
+    settings = st.secrets.get("embedding_cache", {})
+    cache = EmbeddingCache(
+        settings.get("path", DEFAULT_CACHE_PATH),
+        max_entries=int(settings.get("max_entries", DEFAULT_MAX_ENTRIES)),
+        memory_entries=int(settings.get("memory_entries", DEFAULT_MEMORY_ENTRIES))
+    )
+    cache.warm_start()
+    get_telemetry().track_cache("embeddings", cache.stats)
+    return cache
+
+
+@st.cache_resource
+def get_batch_embedder():
+    """Return the shared batch embedder. The optional [embeddings] secrets section
+    may set max_batch_items, max_batch_tokens and max_in_flight."""
+
+    settings = st.secrets.get("embeddings", {})
+    return BatchEmbedder(
+        embed_batch,
+        max_batch_items=int(settings.get("max_batch_items", MAX_BATCH_ITEMS)),
+        max_batch_tokens=int(settings.get("max_batch_tokens", MAX_BATCH_TOKENS)),
+        max_in_flight=int(settings.get("max_in_flight", MAX_IN_FLIGHT)),
+        cache=get_embedding_cache(),
+        deployment_name=st.secrets["aoai"]["embedding_deployment_name"]
+    )
+
+
+def get_embeddings(texts):
+    """Return the embedding of every text as a list of floats, in input order.
+    Texts are normalized, cached vectors are reused, and the rest are embedded in batches."""
+
+    return [vector.tolist() for vector in get_batch_embedder().embed(texts)]
+
+
+def get_embedding(text):
+    """Return the embedding of a single text as a list of floats."""
+
+    return get_embeddings([text])[0]
@@ -0,0 +1,89 @@
+"""Deferred imports of the heavy SDKs.
+
+Importing openai, the Azure SDKs, scikit-learn and SciPy takes a few seconds
+between them, and a page that imported them at the top paid for all of them
+before its first widget appeared, even when the user never reached the code
+that needs them. Modules that use these SDKs hold a lazy_module() instead,
+which imports the real module the first time one of its attributes is read.
+
+Once the main page has rendered, start_prewarm() imports them all on a
+background thread, so a user who goes on to another page usually finds them
+loaded. The import times are recorded under the "import" kind in telemetry.
+The optional [startup] secrets section may set prewarm = false to skip it.
+
+    python -m benchmarks.bench_startup
+
+reports the cold import time of each page and fails when a page imports one
+of these SDKs eagerly."""
+
+import importlib
+import threading
+import time
+
+import streamlit as st
+
+from core.telemetry import get_telemetry
+
+# The SDKs that are only imported through lazy_module(), in the order start_prewarm() loads them.
+DEFERRED_MODULES = (
+    "openai",
+    "azure.identity",
+    "azure.cosmos",
+    "azure.ai.textanalytics",
+    "azure.cognitiveservices.speech",
+    "sklearn.cluster",
+    "scipy.signal"
+)
+
+
+class LazyModule:
+    """Stands in for a module until one of its attributes is first read, and then imports it."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute):
+        module = self._module
+        if module is None:
+            # import_module() holds the module's import lock, so threads that
+            # get here together wait for one import instead of running two.
+            module = self._module = importlib.import_module(self._name)
+        return getattr(module, attribute)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_module(name):
+    """Return a stand-in for the module name that imports it on first use."""
+
+    return LazyModule(name)
+
+
+def prewarm(modules=DEFERRED_MODULES, telemetry=None):
+    """Import modules one after another, recording how long each took. A module
+    that fails to import is skipped; the code that needs it reports the error."""
+
+    for name in modules:
+        start = time.perf_counter()
+        error = False
+        try:
+            importlib.import_module(name)
+        except Exception:
+            error = True
+        if telemetry is not None:
+            telemetry.record("import", name, time.perf_counter() - start, error)
+
+
+@st.cache_resource
+def start_prewarm():
+    """Import the deferred SDKs on a background thread, once per process, unless
+    the optional [startup] secrets section sets prewarm = false."""
+
+    if not st.secrets.get("startup", {}).get("prewarm", True):
+        return None
+    thread = threading.Thread(target=prewarm, kwargs={"telemetry": get_telemetry()}, name="prewarm", daemon=True)
+    thread.start()
+    return thread
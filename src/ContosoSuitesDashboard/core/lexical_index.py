@@ -0,0 +1,194 @@
+"""BM25 keyword search over call transcripts, and its fusion with vector search.
+
+Embedding similarity finds transcripts that mean the same as the query, but
+it misses exact matches on room numbers, booking codes and names, which
+embeddings barely distinguish. BM25Index is an in-memory inverted index: for
+every term, the rows it occurs in and how often. A query only touches the
+postings of its own terms, so it takes well under a millisecond, and it
+needs no embedding.
+
+hybrid_search() combines the two. When the query has selective terms, ones
+that occur in at most max_candidates rows such as a booking code or a
+surname, only the rows containing them are scored against the query
+embedding instead of every vector in the index. A query made only of common
+words, such as a paraphrase of a complaint, is scored against the whole
+index, so purely semantic queries still work. The lexical and vector
+rankings are then fused with reciprocal-rank fusion: a result scores
+1 / (rrf_k + rank) for each ranking it appears in, so results ranked well by
+both come first and neither score scale dominates.
+
+Rows are numbered in the order they are added, the same as the rows of the
+VectorIndex the lexical index is kept next to."""
+
+import math
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+
+from core.vector_index import normalize_rows, top_k
+
+TOKEN = re.compile(r"\w+")
+# Words too common in call transcripts to tell them apart.
+STOPWORDS = frozenset("""
+    a an and are as at be but by can do for from have he her his i if in is it its me my no not of on or our
+    she so that the their them there they this to was we were what when which will with you your
+""".split())
+# BM25 term frequency saturation and document length normalization.
+K1 = 1.2
+B = 0.75
+# Terms in more than this fraction of the rows, like "room" or "booking", match nothing.
+MAX_DOCUMENT_FRACTION = 0.5
+# Lexical matches kept for fusion; terms in at most this many rows prefilter the vector scoring.
+DEFAULT_CANDIDATES = 200
+RRF_K = 60
+
+
+def tokenize(text):
+    """Lowercase word and number tokens of text, without stopwords."""
+
+    return [token for token in TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class LexicalHits:
+    """The rows matching a query, best first, with their BM25 scores, and the rows
+    containing one of its selective terms, which the vector scoring is limited to."""
+
+    def __init__(self, rows, scores, candidates):
+        self.rows = rows
+        self.scores = scores
+        self.candidates = candidates
+
+
+class BM25Index:
+    """In-memory BM25 inverted index over the text of numbered rows."""
+
+    def __init__(self, k1=K1, b=B):
+        self.k1 = k1
+        self.b = b
+        self._postings = {}
+        self._arrays = {}
+        self._lengths = []
+        self._total_length = 0
+        self._normalizers = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._lengths)
+
+    def _add(self, text):
+        row = len(self._lengths)
+        counts = Counter(tokenize(text or ""))
+        for term, count in counts.items():
+            rows, frequencies = self._postings.setdefault(term, ([], []))
+            rows.append(row)
+            frequencies.append(count)
+            self._arrays.pop(term, None)
+        length = sum(counts.values())
+        self._lengths.append(length)
+        self._total_length += length
+        self._normalizers = None
+
+    def add(self, texts):
+        """Index texts as the next rows."""
+
+        with self._lock:
+            for text in texts:
+                self._add(text)
+
+    def extend(self, count, text_of_row):
+        """Index rows len(self) up to count, reading each one's text with text_of_row(row).
+        Rows already indexed are skipped, so callers that race index each row once."""
+
+        with self._lock:
+            for row in range(len(self._lengths), count):
+                self._add(text_of_row(row))
+
+    def _term_arrays(self, term):
+        arrays = self._arrays.get(term)
+        if arrays is None and term in self._postings:
+            rows, frequencies = self._postings[term]
+            arrays = self._arrays[term] = (np.array(rows, dtype=np.int64), np.array(frequencies, dtype=np.float32))
+        return arrays
+
+    def _length_normalizers(self):
+        if self._normalizers is None:
+            lengths = np.array(self._lengths, dtype=np.float32)
+            average = self._total_length / len(lengths) or 1.0
+            self._normalizers = self.k1 * (1 - self.b + self.b * lengths / average)
+        return self._normalizers
+
+    def search(self, query, max_candidates=DEFAULT_CANDIDATES):
+        """Return the LexicalHits of query: at most max_candidates rows matching any of its
+        terms, and the rows of the terms that occur in at most max_candidates rows."""
+
+        terms = set(tokenize(query))
+        empty = np.empty(0, dtype=np.int64)
+        with self._lock:
+            count = len(self._lengths)
+            if not count or not terms:
+                return LexicalHits(empty, np.empty(0, dtype=np.float32), empty)
+            normalizers = self._length_normalizers()
+            scores = np.zeros(count, dtype=np.float32)
+            selective = [empty]
+            for term in terms:
+                arrays = self._term_arrays(term)
+                if arrays is None:
+                    continue
+                rows, frequencies = arrays
+                if len(rows) > MAX_DOCUMENT_FRACTION * count:
+                    continue
+                idf = math.log(1 + (count - len(rows) + 0.5) / (len(rows) + 0.5))
+                scores[rows] += idf * frequencies * (self.k1 + 1) / (frequencies + normalizers[rows])
+                if len(rows) <= max_candidates:
+                    selective.append(rows)
+        matched = np.flatnonzero(scores)
+        ranked = matched[top_k(scores[matched], max_candidates)]
+        return LexicalHits(ranked, scores[ranked], np.unique(np.concatenate(selective)))
+
+
+def reciprocal_rank_fusion(rankings, rrf_k=RRF_K):
+    """Fuse rankings, each a sequence of rows best first, into a score per row."""
+
+    scores = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, start=1):
+            scores[row] = scores.get(row, 0.0) + 1.0 / (rrf_k + rank)
+    return scores
+
+
+def hybrid_search(vector_index, lexical_hits, query_embedding, max_results=5, minimum_similarity_score=0.5,
+                  rrf_k=RRF_K):
+    """Fuse the LexicalHits of a query, from BM25Index.search(), with vector similarity in
+    vector_index, whose rows they refer to. Returns up to max_results items best first,
+    shaped like VectorIndex.search() results with LexicalScore and HybridScore added.
+    Results below minimum_similarity_score are dropped unless they matched lexically."""
+
+    vectors = vector_index.vectors()
+    if not len(vectors):
+        return []
+    rows, lexical_scores = lexical_hits.rows, lexical_hits.scores
+    query = normalize_rows(query_embedding)[0]
+    if len(lexical_hits.candidates):
+        # Only the rows with a selective term, and the other lexical matches, are scored, not the whole index.
+        candidates = np.union1d(lexical_hits.candidates, rows)
+        similarities = vectors[candidates] @ query
+    else:
+        candidates = np.arange(len(vectors))
+        similarities = vectors @ query
+    best = top_k(similarities, max(len(rows), max_results))
+    vector_ranking = candidates[best[similarities[best] >= minimum_similarity_score]].tolist()
+
+    lexical_ranking = rows.tolist()
+    lexical_score_of = dict(zip(lexical_ranking, lexical_scores.tolist()))
+    fused = reciprocal_rank_fusion([lexical_ranking, vector_ranking], rrf_k)
+    results = []
+    for row in sorted(fused, key=fused.get, reverse=True)[:max_results]:
+        results.append({
+            **vector_index.item(row),
+            "SimilarityScore": float(vectors[row] @ query),
+            "LexicalScore": lexical_score_of.get(row, 0.0),
+            "HybridScore": fused[row]
+        })
+    return results
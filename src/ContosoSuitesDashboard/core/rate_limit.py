@@ -0,0 +1,251 @@
+"""Client-side admission against an Azure OpenAI deployment's quota.
+
+Azure OpenAI enforces a tokens-per-minute and a requests-per-minute quota per
+deployment, evaluated over short windows, and answers 429 once either runs
+out. Without coordination every session keeps sending until the storm of
+429s starts, and then all of them retry at the same moment.
+
+RateLimiter admits requests against two token buckets, one for tokens and one
+for requests, that refill at the configured per-minute rates and hold at most
+BURST_SECONDS worth of quota. Each request's cost is estimated up front with
+tiktoken the way the service counts it when the request arrives: the prompt
+plus the most tokens the reply may use. Requests that do not fit wait in a
+queue where interactive work always goes before background work, and are
+released one at a time as the buckets refill, so callers do not wake up
+together.
+
+The limiter also learns from responses: x-ratelimit-remaining-tokens and
+x-ratelimit-remaining-requests lower the buckets when other clients share the
+deployment, and a 429 pauses the whole queue for the retry-after the service
+asked for, plus a little jitter so that replicas do not resume in lockstep.
+
+A RateLimiter belongs to one asyncio event loop; in the dashboard that is the
+service loop in core.services."""
+
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from collections import deque
+
+import tiktoken
+
+# The GPT-4o tokenizer; text-embedding-ada-002 uses cl100k_base, which counts about the same.
+ENCODING_NAME = "o200k_base"
+MESSAGE_OVERHEAD_TOKENS = 3
+REPLY_PRIMING_TOKENS = 3
+# Reply tokens assumed when a request does not set max_tokens.
+DEFAULT_COMPLETION_TOKENS = 800
+# Azure OpenAI evaluates quota over short windows, so a full minute's quota is never available at once.
+BURST_SECONDS = 10
+MAX_PAUSE_JITTER = 0.1
+WAIT_SAMPLES = 1000
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+
+def estimate_chat_tokens(messages, max_tokens=None, encoding_name=ENCODING_NAME):
+    """Estimate the quota a chat completion request consumes: its prompt plus the most it may reply."""
+
+    encoding = tiktoken.get_encoding(encoding_name)
+    prompt_tokens = sum(len(encoding.encode(message["content"] or "")) + MESSAGE_OVERHEAD_TOKENS
+                        for message in messages)
+    return prompt_tokens + REPLY_PRIMING_TOKENS + (max_tokens or DEFAULT_COMPLETION_TOKENS)
+
+
+def estimate_embedding_tokens(text, encoding_name=ENCODING_NAME):
+    """Estimate the tokens of an embedding request; text may be a string or a list of strings."""
+
+    encoding = tiktoken.get_encoding(encoding_name)
+    texts = [text] if isinstance(text, str) else text
+    return sum(len(tokens) for tokens in encoding.encode_batch(texts))
+
+
+def retry_after_seconds(headers):
+    """Seconds a 429 response asked the client to wait, or None."""
+
+    for header, scale in (("retry-after-ms", 0.001), ("x-ms-retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(header)
+        if value:
+            try:
+                return float(value) * scale
+            except ValueError:
+                continue
+    return None
+
+
+class TokenBucket:
+    """Quota that refills continuously at rate_per_minute, holding at most burst_seconds of it.
+    A bucket without a rate never runs out."""
+
+    def __init__(self, rate_per_minute=None, burst_seconds=BURST_SECONDS, clock=time.monotonic):
+        self.rate_per_second = rate_per_minute / 60 if rate_per_minute else None
+        self.capacity = self.rate_per_second * burst_seconds if self.rate_per_second else None
+        self.level = self.capacity
+        self.clock = clock
+        self.updated = clock()
+
+    @property
+    def unlimited(self):
+        return self.rate_per_second is None
+
+    def refill(self):
+        now = self.clock()
+        if not self.unlimited:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate_per_second)
+        self.updated = now
+
+    def clamp(self, amount):
+        """A request larger than the bucket could never be admitted, so it costs a full bucket instead."""
+
+        return amount if self.unlimited else min(amount, self.capacity)
+
+    def wait_seconds(self, amount):
+        """Seconds until amount is available, after refill()."""
+
+        if self.unlimited or self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate_per_second
+
+    def take(self, amount):
+        if not self.unlimited:
+            self.level -= amount
+
+    def give(self, amount):
+        if not self.unlimited:
+            self.level = min(self.capacity, self.level + amount)
+
+    def lower_to(self, remaining):
+        """Apply the remaining quota the service reported, which also counts other clients."""
+
+        if not self.unlimited and remaining < self.level:
+            self.level = remaining
+
+
+class Grant:
+    """The quota one admitted request holds."""
+
+    def __init__(self, tokens, waited_seconds):
+        self.tokens = tokens
+        self.waited_seconds = waited_seconds
+
+
+class RateLimiter:
+    """Admits requests to one deployment against its tokens-per-minute and requests-per-minute quota."""
+
+    def __init__(self, tokens_per_minute=None, requests_per_minute=None, burst_seconds=BURST_SECONDS,
+                 clock=time.monotonic):
+        self.tokens = TokenBucket(tokens_per_minute, burst_seconds, clock)
+        self.requests = TokenBucket(requests_per_minute, burst_seconds, clock)
+        self.tokens_per_minute = tokens_per_minute
+        self.requests_per_minute = requests_per_minute
+        self.clock = clock
+        self.paused_until = 0.0
+        self.admitted = 0
+        self.throttled = 0
+        self._queue = []
+        self._sequence = itertools.count()
+        self._timer = None
+        self._waits = {priority: deque(maxlen=WAIT_SAMPLES) for priority in PRIORITY_NAMES}
+
+    async def acquire(self, tokens, priority=INTERACTIVE):
+        """Wait until the request can be sent and return its Grant."""
+
+        tokens = self.tokens.clamp(tokens)
+        enqueued = self.clock()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._sequence), tokens, future))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # A caller that gave up after being admitted hands its quota back.
+            if future.done() and not future.cancelled():
+                self.release(tokens)
+            else:
+                future.cancel()
+                self._dispatch()
+            raise
+        waited = self.clock() - enqueued
+        self._waits[priority].append(waited)
+        return Grant(tokens, waited)
+
+    def release(self, tokens):
+        """Return the quota of a request that was never sent."""
+
+        self.tokens.refill()
+        self.requests.refill()
+        self.tokens.give(tokens)
+        self.requests.give(1)
+        self._dispatch()
+
+    def observe(self, status_code, headers):
+        """Learn from a response's rate limit headers."""
+
+        self.tokens.refill()
+        self.requests.refill()
+        for bucket, header in ((self.tokens, "x-ratelimit-remaining-tokens"),
+                               (self.requests, "x-ratelimit-remaining-requests")):
+            value = headers.get(header)
+            if value:
+                try:
+                    bucket.lower_to(float(value))
+                except ValueError:
+                    pass
+        if status_code == 429:
+            self.throttled += 1
+            seconds = retry_after_seconds(headers)
+            if seconds is None:
+                seconds = BURST_SECONDS / 10
+            seconds *= 1 + random.uniform(0, MAX_PAUSE_JITTER)
+            self.paused_until = max(self.paused_until, self.clock() + seconds)
+        self._dispatch()
+
+    def _dispatch(self):
+        """Admit queued requests, highest priority first, for as long as the quota allows."""
+
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self.tokens.refill()
+        self.requests.refill()
+        while self._queue:
+            _, _, tokens, future = self._queue[0]
+            if future.done():
+                heapq.heappop(self._queue)
+                continue
+            delay = max(self.paused_until - self.clock(), self.tokens.wait_seconds(tokens),
+                        self.requests.wait_seconds(1))
+            if delay > 0:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            heapq.heappop(self._queue)
+            self.tokens.take(tokens)
+            self.requests.take(1)
+            self.admitted += 1
+            future.set_result(None)
+
+    def stats(self):
+        """Queue depth, wait times and remaining quota, for display."""
+
+        queued = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, _, future in self._queue:
+            if not future.done():
+                queued[PRIORITY_NAMES[priority]] += 1
+        stats = {
+            "tokens_per_minute": self.tokens_per_minute,
+            "requests_per_minute": self.requests_per_minute,
+            "tokens_available": None if self.tokens.unlimited else max(0.0, self.tokens.level),
+            "queued": queued,
+            "admitted": self.admitted,
+            "throttled": self.throttled,
+            "paused_s": max(0.0, self.paused_until - self.clock())
+        }
+        for priority, name in PRIORITY_NAMES.items():
+            waits = sorted(self._waits[priority])
+            stats[f"{name}_wait_p50_s"] = waits[len(waits) // 2] if waits else 0.0
+            stats[f"{name}_wait_p95_s"] = waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0
+        return stats
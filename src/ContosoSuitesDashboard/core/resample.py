@@ -0,0 +1,165 @@
+"""Block-by-block conversion of any PCM WAV audio to 16 kHz 16-bit mono.
+
+Each block is decoded straight from the audio buffer with np.frombuffer,
+downmixed by averaging channels, resampled with SciPy's polyphase filter
+(which applies an anti-aliasing low-pass filter) and converted to int16.
+
+To keep block edges seamless, every block is resampled together with a
+little context from its neighbours, and the output for that context is
+trimmed off again. Blocks start on multiples of the decimation factor, so
+the result is the same as resampling the whole signal in one go, while only
+one block plus its context is ever decoded into memory."""
+
+import struct
+from contextlib import closing
+from math import ceil, gcd
+
+import numpy as np
+
+from core.audio import (
+    SPEECH_BITS_PER_SAMPLE,
+    SPEECH_CHANNELS,
+    SPEECH_SAMPLE_RATE,
+    WAVE_FORMAT_IEEE_FLOAT,
+    WAVE_FORMAT_PCM,
+    iter_frames,
+    open_audio_buffer,
+    read_wav
+)
+from core.lazy import lazy_module
+
+scipy_signal = lazy_module("scipy.signal")
+
+# Seconds of input decoded per block.
+BLOCK_SECONDS = 1.0
+# Input samples of context kept on each side of a block. resample_poly's
+# default filter spans about ten input samples either side of each output.
+CONTEXT_SAMPLES = 64
+
+
+def decode_samples(frame, wav):
+    """Decode a frame of interleaved samples to a float32 array of shape (samples, channels) in [-1, 1]."""
+
+    if wav.format_tag == WAVE_FORMAT_IEEE_FLOAT:
+        dtype = np.float32 if wav.bits_per_sample == 32 else np.float64
+        samples = np.frombuffer(frame, dtype=dtype).astype(np.float32)
+    elif wav.format_tag == WAVE_FORMAT_PCM and wav.bits_per_sample == 8:
+        samples = (np.frombuffer(frame, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif wav.format_tag == WAVE_FORMAT_PCM and wav.bits_per_sample == 16:
+        samples = np.frombuffer(frame, dtype="<i2").astype(np.float32) / 32768
+    elif wav.format_tag == WAVE_FORMAT_PCM and wav.bits_per_sample == 24:
+        raw = np.frombuffer(frame, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        # Assemble little-endian 24-bit values, then sign-extend through the top byte.
+        values = (raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)) << 8 >> 8
+        samples = values.astype(np.float32) / 2**23
+    elif wav.format_tag == WAVE_FORMAT_PCM and wav.bits_per_sample == 32:
+        samples = np.frombuffer(frame, dtype="<i4").astype(np.float32) / 2**31
+    else:
+        raise ValueError(f"Unsupported WAV format {wav.format_tag} with {wav.bits_per_sample} bits per sample.")
+    return samples.reshape(-1, wav.channels)
+
+
+def downmix(samples):
+    """Average all channels into one."""
+
+    return samples[:, 0] if samples.shape[1] == 1 else samples.mean(axis=1, dtype=np.float32)
+
+
+def to_int16(samples):
+    """Convert float samples in [-1, 1] to int16, clipping anything out of range."""
+
+    return np.clip(np.rint(samples * 32767), -32768, 32767).astype(np.int16)
+
+
+class StreamingResampler:
+    """Resample a signal that arrives in blocks, matching resample_poly() on the whole signal."""
+
+    def __init__(self, rate_in, rate_out=SPEECH_SAMPLE_RATE, context_samples=CONTEXT_SAMPLES):
+        divisor = gcd(rate_in, rate_out)
+        self.up = rate_out // divisor
+        self.down = rate_in // divisor
+        # Context is a whole number of decimation periods so block starts stay phase-aligned.
+        self.context = self.down * ceil(context_samples / self.down)
+        # Left context (zeros before the signal starts, as resample_poly assumes) followed by pending input.
+        self._buffer = np.zeros(self.context, dtype=np.float32)
+        self._samples_in = 0
+        self._samples_out = 0
+
+    def _emit(self, count):
+        segment = self._buffer[:count + 2 * self.context]
+        resampled = scipy_signal.resample_poly(segment, self.up, self.down)
+        start = self.context * self.up // self.down
+        output = resampled[start:start + count * self.up // self.down]
+        self._buffer = self._buffer[count:]
+        self._samples_out += len(output)
+        return output.astype(np.float32, copy=False)
+
+    def process(self, samples):
+        """Add mono float samples and return all output that can be produced so far."""
+
+        self._samples_in += len(samples)
+        self._buffer = np.concatenate([self._buffer, samples])
+        ready = (len(self._buffer) - 2 * self.context) // self.down * self.down
+        if ready <= 0:
+            return np.empty(0, dtype=np.float32)
+        return self._emit(ready)
+
+    def flush(self):
+        """Return the remaining output once the input has ended."""
+
+        pending = len(self._buffer) - self.context
+        padded = ceil(pending / self.down) * self.down
+        self._buffer = np.concatenate([self._buffer, np.zeros(padded - pending + self.context, dtype=np.float32)])
+        output = self._emit(padded) if padded > 0 else np.empty(0, dtype=np.float32)
+        expected = ceil(self._samples_in * self.up / self.down)
+        return output[:max(0, expected - (self._samples_out - len(output)))]
+
+
+def iter_speech_frames(buffer, wav, block_seconds=BLOCK_SECONDS):
+    """Yield 16 kHz 16-bit mono PCM bytes for the audio in buffer, one block at a time."""
+
+    block_bytes = max(1, int(wav.sample_rate * block_seconds)) * wav.block_align
+    resampler = None
+    if wav.sample_rate != SPEECH_SAMPLE_RATE:
+        resampler = StreamingResampler(wav.sample_rate)
+    for frame in iter_frames(buffer, wav, block_bytes):
+        mono = downmix(decode_samples(frame, wav))
+        if resampler is not None:
+            mono = resampler.process(mono)
+        if len(mono):
+            yield to_int16(mono).tobytes()
+    if resampler is not None:
+        tail = resampler.flush()
+        if len(tail):
+            yield to_int16(tail).tobytes()
+
+
+def speech_wav_header(data_size):
+    """Return a 44-byte header for 16 kHz 16-bit mono PCM data of the given size."""
+
+    block_align = SPEECH_CHANNELS * SPEECH_BITS_PER_SAMPLE // 8
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_size, b"WAVE",
+        b"fmt ", 16, WAVE_FORMAT_PCM, SPEECH_CHANNELS, SPEECH_SAMPLE_RATE,
+        SPEECH_SAMPLE_RATE * block_align, block_align, SPEECH_BITS_PER_SAMPLE,
+        b"data", data_size
+    )
+
+
+def convert_to_speech_wav(source_path, destination_path):
+    """Write a 16 kHz 16-bit mono copy of a WAV file, converting it block by block.
+    Returns the duration of the audio in seconds."""
+
+    data_size = 0
+    with open_audio_buffer(source_path) as buffer, open(destination_path, "wb") as output:
+        wav = read_wav(buffer)
+        output.write(speech_wav_header(0))
+        with closing(iter_speech_frames(buffer, wav)) as frames:
+            for frame in frames:
+                output.write(frame)
+                data_size += len(frame)
+        # Now that the length is known, fill in the real header.
+        output.seek(0)
+        output.write(speech_wav_header(data_size))
+    return data_size / (SPEECH_SAMPLE_RATE * SPEECH_BITS_PER_SAMPLE // 8)
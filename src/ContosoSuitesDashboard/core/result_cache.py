@@ -0,0 +1,272 @@
+"""Result cache shared by every replica of the dashboard.
+
+st.cache_data lives in one process, so behind a load balancer each replica
+would transcribe and summarize the same call again. ResultCache stores
+results in a backend that all replicas can reach, keyed on a hash of the
+inputs: for audio, a streaming SHA-256 of the file's bytes, plus the
+function's parameters such as the recognition language.
+
+Results are stored as zlib-compressed JSON. The backend evicts the least
+recently used results once the stored bytes exceed a limit.
+
+Work is single-flight: the first caller to miss takes a lease on the key and
+computes the result, and concurrent callers for the same key, in this process
+or another replica, wait for it instead of repeating the work. A lease
+expires, so a replica that dies mid-computation does not block the rest.
+
+SQLiteResultBackend is the local stand-in: a SQLite file on a volume every
+replica mounts. Another backend, such as Redis or Blob Storage, only needs
+the methods of ResultCacheBackend."""
+
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from abc import ABC, abstractmethod
+
+import streamlit as st
+
+from core.audio import open_audio_buffer
+from core.telemetry import get_telemetry
+
+DEFAULT_CACHE_PATH = ".cache/results.sqlite3"
+DEFAULT_MAX_BYTES = 256 * 2**20
+# Long enough for a transcription to finish; a waiter takes over once it lapses.
+DEFAULT_LEASE_SECONDS = 1800
+DEFAULT_POLL_SECONDS = 0.5
+HASH_BLOCK_BYTES = 2**20
+
+
+def audio_content_hash(source):
+    """SHA-256 of an audio file's bytes, hashed a block at a time without copying the file."""
+
+    digest = hashlib.sha256()
+    with open_audio_buffer(source) as buffer:
+        for start in range(0, len(buffer), HASH_BLOCK_BYTES):
+            with buffer[start:start + HASH_BLOCK_BYTES] as block:
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def make_key(namespace, *parts):
+    """Return the cache key for a namespace and JSON-serializable parameters."""
+
+    payload = json.dumps([namespace, *parts], sort_keys=True, separators=(",", ":"), default=str)
+    return f"{namespace}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+
+def serialize(value):
+    return zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8"))
+
+
+def deserialize(data):
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+
+class ResultCacheBackend(ABC):
+    """Storage and leases for ResultCache. Every method must be safe to call
+    from several threads and from several processes at once."""
+
+    @abstractmethod
+    def get(self, key):
+        """Return the stored bytes for key, or None."""
+
+    @abstractmethod
+    def put(self, key, data):
+        """Store bytes for key, evicting old entries if the size limit is exceeded."""
+
+    @abstractmethod
+    def acquire_lease(self, key, owner, seconds):
+        """Take the lease on key for owner unless someone else holds an unexpired one. Returns True if taken."""
+
+    @abstractmethod
+    def release_lease(self, key, owner):
+        """Give up the lease on key if owner holds it."""
+
+    def stats(self):
+        return {}
+
+
+class SQLiteResultBackend(ResultCacheBackend):
+    """Results and leases in a SQLite file. Use journal_mode="DELETE" when the
+    file is on a network share, where SQLite's WAL mode is not supported."""
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, journal_mode="WAL"):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY,"
+            " value BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_results_last_access ON results (last_access)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS leases ("
+            " key TEXT PRIMARY KEY,"
+            " owner TEXT NOT NULL,"
+            " expires REAL NOT NULL)"
+        )
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, key, data):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                                   (key, data, len(data), time.time()))
+                self._evict()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _evict(self):
+        excess = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0] - self.max_bytes
+        if excess <= 0:
+            return
+        evicted = []
+        for key, size in self._conn.execute("SELECT key, size FROM results ORDER BY last_access"):
+            if excess <= 0:
+                break
+            evicted.append((key,))
+            excess -= size
+        self._conn.executemany("DELETE FROM results WHERE key = ?", evicted)
+        self.evictions += len(evicted)
+
+    def acquire_lease(self, key, owner, seconds):
+        now = time.time()
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock, so check-and-set is atomic across processes.
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT owner, expires FROM leases WHERE key = ?", (key,)).fetchone()
+                acquired = row is None or row[0] == owner or row[1] <= now
+                if acquired:
+                    self._conn.execute("INSERT OR REPLACE INTO leases VALUES (?, ?, ?)", (key, owner, now + seconds))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            return acquired
+
+    def release_lease(self, key, owner):
+        with self._lock:
+            self._conn.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, owner))
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        return {"entries": entries, "bytes": size, "max_bytes": self.max_bytes, "evictions": self.evictions}
+
+    def close(self):
+        self._conn.close()
+
+
+class ResultCache:
+    """Single-flight cache of JSON-serializable results on a shared backend."""
+
+    def __init__(self, backend, lease_seconds=DEFAULT_LEASE_SECONDS, poll_seconds=DEFAULT_POLL_SECONDS):
+        self.backend = backend
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+
+    def get(self, key):
+        data = self.backend.get(key)
+        return None if data is None else deserialize(data)
+
+    def get_or_compute(self, key, compute):
+        """Return the stored result for key. On a miss, either compute and store it,
+        or wait for the caller that is already computing it. Empty results are not
+        stored, so a failed attempt is retried by the next caller."""
+
+        owner = uuid.uuid4().hex
+        waited = False
+        while True:
+            value = self.get(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            if self.backend.acquire_lease(key, owner, self.lease_seconds):
+                break
+            if not waited:
+                self.waits += 1
+                waited = True
+            time.sleep(self.poll_seconds)
+
+        try:
+            # Another caller may have finished between our last check and taking the lease.
+            value = self.get(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            self.misses += 1
+            value = compute()
+            if value:
+                self.backend.put(key, serialize(value))
+            return value
+        finally:
+            self.backend.release_lease(key, owner)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "waits": self.waits,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            **self.backend.stats()
+        }
+
+
+@st.cache_resource
+def get_result_cache():
+    """Return the shared result cache. The optional [result_cache] secrets section
+    may set path, max_bytes, journal_mode and lease_seconds. Point path at a volume
+    every replica mounts to share results between them."""
+
+    settings = st.secrets.get("result_cache", {})
+    backend = SQLiteResultBackend(
+        settings.get("path", DEFAULT_CACHE_PATH),
+        max_bytes=int(settings.get("max_bytes", DEFAULT_MAX_BYTES)),
+        journal_mode=settings.get("journal_mode", "WAL")
+    )
+    cache = ResultCache(backend, lease_seconds=float(settings.get("lease_seconds", DEFAULT_LEASE_SECONDS)))
+    get_telemetry().track_cache("shared_results", cache.stats)
+    return cache
+
+
+def shared_result(namespace):
+    """Decorator that caches a function's result in the shared result cache,
+    keyed on namespace and the function's arguments."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = make_key(namespace, args, kwargs)
+            return get_result_cache().get_or_compute(key, lambda: func(*args, **kwargs))
+        return wrapper
+    return decorator
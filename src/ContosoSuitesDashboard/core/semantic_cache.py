@@ -0,0 +1,218 @@
+"""Cache of answers to questions that mean the same thing.
+
+Incoming questions are embedded and compared with the questions already
+answered in the same scope. If the closest one is at least threshold similar,
+its stored answer is returned and the slow call behind it is skipped. An
+exact repeat of a question is found without embedding it at all.
+
+Embeddings barely tell "bookings for hotel 3" from "bookings for hotel 4",
+so a question is only compared with questions that mention the same numbers
+and IDs, the tokens of it that contain a digit.
+
+Entries expire after ttl_seconds and the least recently used are evicted
+beyond max_entries. Entries can carry tags; invalidate() drops every entry
+with a tag, and observe() does so when a fingerprint of the data behind the
+tag changes, for example when the bookings returned by the Web API change.
+
+One cache is shared by every session in the process, see get_semantic_cache()."""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import streamlit as st
+
+from core.embeddings import get_embedding
+from core.telemetry import get_telemetry
+from core.text import normalize_text
+
+DEFAULT_THRESHOLD = 0.95
+DEFAULT_TTL_SECONDS = 3600
+DEFAULT_MAX_ENTRIES = 1_000
+# Words containing a digit: numbers, dates, room numbers and IDs such as "BK-4821" or "hotel7".
+LITERAL_TOKEN = re.compile(r"\w*\d\w*")
+
+
+def literal_tokens(question):
+    """The numbers and IDs in question, which a similar question must repeat exactly."""
+
+    return tuple(sorted(set(LITERAL_TOKEN.findall(question.lower()))))
+
+
+class SemanticCache:
+    """Thread-safe TTL/LRU cache of answers, looked up by question similarity.
+    embed is a callable that returns the embedding vector of a string."""
+
+    def __init__(self, embed, threshold=DEFAULT_THRESHOLD, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 max_entries=DEFAULT_MAX_ENTRIES, clock=time.time):
+        self.embed = embed
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.clock = clock
+        # (scope, normalized question) -> entry dict, least recently used first.
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.latency_saved_seconds = 0.0
+        self.lookup_seconds = 0.0
+
+    @staticmethod
+    def _normalize(question):
+        return normalize_text(question).lower()
+
+    def _expire(self, now):
+        expired = [key for key, entry in self._entries.items() if now - entry["created"] > self.ttl_seconds]
+        for key in expired:
+            del self._entries[key]
+        self.evictions += len(expired)
+
+    def lookup(self, question, scope=""):
+        """Return the stored answer for question, or a similar one, in scope; None on a miss."""
+
+        start = time.perf_counter()
+        key = (scope, self._normalize(question))
+        with self._lock:
+            self.lookups += 1
+            self._expire(self.clock())
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.exact_hits += 1
+                return self._hit(key, entry, start)
+            literals = literal_tokens(question)
+            candidates = [(k, e) for k, e in self._entries.items()
+                          if k[0] == scope and e["literals"] == literals]
+        if not candidates:
+            self.lookup_seconds += time.perf_counter() - start
+            return None
+
+        query = self._unit_vector(question)
+        matrix = np.stack([entry["vector"] for _, entry in candidates])
+        scores = matrix @ query
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            self.lookup_seconds += time.perf_counter() - start
+            return None
+        with self._lock:
+            key, entry = candidates[best]
+            if key not in self._entries:
+                # Evicted or invalidated while we were comparing.
+                return None
+            self.similar_hits += 1
+            return self._hit(key, entry, start)
+
+    def _hit(self, key, entry, start):
+        self._entries.move_to_end(key)
+        elapsed = time.perf_counter() - start
+        self.lookup_seconds += elapsed
+        self.latency_saved_seconds += max(0.0, entry["latency"] - elapsed)
+        return entry["answer"]
+
+    def _unit_vector(self, question):
+        vector = np.asarray(self.embed(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def store(self, question, answer, scope="", tags=(), latency=0.0):
+        """Remember answer for question in scope. latency is how long the answer took to produce."""
+
+        vector = self._unit_vector(question)
+        key = (scope, self._normalize(question))
+        with self._lock:
+            self._entries[key] = {
+                "answer": answer,
+                "vector": vector,
+                "literals": literal_tokens(question),
+                "tags": frozenset(tags),
+                "latency": latency,
+                "created": self.clock()
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, question, compute, scope="", tags=()):
+        """Return the cached answer for question, or call compute() and cache its result."""
+
+        answer = self.lookup(question, scope)
+        if answer is not None:
+            return answer
+        start = time.perf_counter()
+        answer = compute()
+        self.store(question, answer, scope, tags, time.perf_counter() - start)
+        return answer
+
+    def invalidate(self, tag=None, scope=None):
+        """Drop the entries with tag and/or in scope; with neither, drop everything.
+        Returns the number of entries dropped."""
+
+        with self._lock:
+            keys = [
+                key for key, entry in self._entries.items()
+                if (tag is None or tag in entry["tags"]) and (scope is None or key[0] == scope)
+            ]
+            for key in keys:
+                del self._entries[key]
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def observe(self, tag, fingerprint, source=None):
+        """Invalidation hook: drop the entries with tag when the fingerprint of their data changes.
+        Data fetched in several ways, such as all bookings and one hotel's, passes a
+        source for each, and a fingerprint is compared with the last one from the same source.
+        Returns True if entries were invalidated."""
+
+        with self._lock:
+            previous = self._versions.get((tag, source))
+            self._versions[(tag, source)] = fingerprint
+        if previous is not None and previous != fingerprint:
+            self.invalidate(tag=tag)
+            return True
+        return False
+
+    def stats(self):
+        hits = self.exact_hits + self.similar_hits
+        return {
+            "entries": len(self._entries),
+            "lookups": self.lookups,
+            "hits": hits,
+            "similar_hits": self.similar_hits,
+            "hit_rate": hits / self.lookups if self.lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "latency_saved_seconds": self.latency_saved_seconds,
+            "mean_lookup_ms": self.lookup_seconds / self.lookups * 1000 if self.lookups else 0.0
+        }
+
+
+@st.cache_resource
+def get_semantic_cache():
+    """Return the semantic answer cache shared by every session in this process.
+    The optional [semantic_cache] secrets section may set threshold, ttl_seconds and max_entries."""
+
+    settings = st.secrets.get("semantic_cache", {})
+    cache = SemanticCache(
+        get_embedding,
+        threshold=float(settings.get("threshold", DEFAULT_THRESHOLD)),
+        ttl_seconds=float(settings.get("ttl_seconds", DEFAULT_TTL_SECONDS)),
+        max_entries=int(settings.get("max_entries", DEFAULT_MAX_ENTRIES))
+    )
+    get_telemetry().track_cache("semantic_answers", cache.stats)
+    return cache
+
+
+def show_cache_stats(cache):
+    """Show the cache's hit rate and the time it has saved in the sidebar."""
+
+    stats = cache.stats()
+    st.sidebar.metric("Answer cache hit rate", f'{stats["hit_rate"]:.0%}',
+        help=f'{stats["hits"]} of {stats["lookups"]} questions, {stats["similar_hits"]} by similarity')
+    st.sidebar.metric("Time saved by cached answers", f'{stats["latency_saved_seconds"]:.1f} s')
@@ -0,0 +1,417 @@
+"""Asyncio layer for the external calls the dashboard makes.
+
+One event loop runs on a background thread per process. Azure OpenAI, the
+Web API, Cosmos DB and the Language service are called through their async
+clients on that loop: openai.AsyncAzureOpenAI, httpx.AsyncClient,
+azure.cosmos.aio and azure.ai.textanalytics.aio. The Speech SDK has no
+asyncio API, so its calls run on a worker thread.
+
+Every dependency has a semaphore that bounds its concurrent calls across all
+sessions in the process, and a deadline that covers waiting for the
+semaphore and every retry. Calls that fail with a 429 or 5xx response or a
+connection error are retried with jittered exponential backoff, honoring the
+service's retry-after.
+
+The Web API client in core.webapi owns its async client and sends through
+this layer's "webapi" limit. Page functions stay synchronous: call_service()
+submits a call to the loop and waits for its result, submit_service() starts
+one and returns a future, and gather_calls() runs several at once, so a slow dependency only holds up the calls that need it.
+
+Azure OpenAI calls name the deployment whose quota they use and their
+estimated tokens, and are admitted by that deployment's RateLimiter from
+core.rate_limit before they are sent. Both Azure OpenAI clients report every
+response to the limiters through an httpx response hook.
+
+The optional [services] secrets section may set <dependency>_concurrency,
+<dependency>_deadline_seconds and max_attempts, and the [aoai] section the
+quota of each deployment."""
+
+import asyncio
+import re
+import threading
+import time
+
+import httpx
+import streamlit as st
+from azure.core.credentials import AzureKeyCredential
+from azure.core.exceptions import ServiceRequestError, ServiceResponseError
+
+from core.clients import AOAI_API_VERSION, get_token_provider
+from core.lazy import lazy_module
+from core.rate_limit import INTERACTIVE, RateLimiter
+from core.telemetry import get_telemetry
+from core.webapi import RETRYABLE_STATUS_CODES, RetryPolicy
+
+DEFAULT_CONCURRENCY = {"openai": 16, "webapi": 16, "cosmos": 32, "language": 8, "speech": 4}
+DEFAULT_DEADLINE_SECONDS = {"openai": 120, "webapi": 30, "cosmos": 30, "language": 300, "speech": 1800}
+DEFAULT_MAX_ATTEMPTS = 4
+# Retry hints, in the order they are checked. The Azure services send the millisecond ones.
+RETRY_AFTER_HEADERS = ("x-ms-retry-after-ms", "retry-after-ms", "Retry-After")
+DEPLOYMENT_PATH = re.compile(r"/openai/deployments/([^/]+)/")
+
+openai = lazy_module("openai")
+
+
+class DeadlineExceeded(TimeoutError):
+    """A dependency call did not finish, retries included, within its deadline."""
+
+
+def error_status_code(error):
+    """HTTP status code carried by an exception from any of the SDKs, or None."""
+
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code
+    status_code = getattr(error, "status_code", None)
+    return status_code if isinstance(status_code, int) else None
+
+
+def is_retryable(error):
+    if isinstance(error, (httpx.TransportError, openai.APIConnectionError, ServiceRequestError, ServiceResponseError)):
+        return True
+    return error_status_code(error) in RETRYABLE_STATUS_CODES
+
+
+def response_size(result):
+    """Body size of a Web API response, or None for results that are not HTTP responses."""
+
+    return len(result.content) if isinstance(result, httpx.Response) else None
+
+
+def usage_tokens(result):
+    """Tokens an Azure OpenAI response reports it used, or None."""
+
+    return getattr(getattr(result, "usage", None), "total_tokens", None)
+
+
+def retry_after_seconds(error=None, response=None):
+    """Seconds the service asked us to wait before retrying, or None."""
+
+    headers = getattr(error, "headers", None)
+    if not headers:
+        response = response if response is not None else getattr(error, "response", None)
+        headers = getattr(response, "headers", None) or {}
+    for header in RETRY_AFTER_HEADERS:
+        value = headers.get(header)
+        if value:
+            try:
+                seconds = float(value)
+            except ValueError:
+                continue
+            return seconds / 1000 if header.endswith("-ms") else seconds
+    return None
+
+
+class ServiceLayer:
+    """Runs dependency calls on a background event loop with per-dependency
+    concurrency limits, deadlines and retries. factories maps a dependency to a
+    callable that builds its async client; it is called on the loop the first
+    time the dependency is used. rate_limits maps a quota name, such as an Azure
+    OpenAI deployment, to its (tokens_per_minute, requests_per_minute); quotas
+    without an entry are not limited up front but still pause after a 429.
+    Calls that do not give a priority get default_priority. With a telemetry
+    registry from core.telemetry, every call is recorded under its dependency."""
+
+    def __init__(self, factories=None, concurrency=None, deadline_seconds=None, retry=None, rate_limits=None,
+                 default_priority=INTERACTIVE, telemetry=None):
+        self.factories = factories or {}
+        self.telemetry = telemetry
+        self.concurrency = {**DEFAULT_CONCURRENCY, **(concurrency or {})}
+        self.deadline_seconds = {**DEFAULT_DEADLINE_SECONDS, **(deadline_seconds or {})}
+        self.retry = retry or RetryPolicy(max_attempts=DEFAULT_MAX_ATTEMPTS)
+        self.rate_limits = rate_limits or {}
+        self.default_priority = default_priority
+        self.stats = {name: {"calls": 0, "errors": 0, "retries": 0, "timeouts": 0, "waiting": 0, "in_flight": 0}
+                      for name in self.concurrency}
+        # Clients, semaphores and rate limiters belong to the loop, so they are only touched from its thread.
+        self._clients = {}
+        self._semaphores = {}
+        self._limiters = {}
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="service-loop", daemon=True)
+        self._thread.start()
+
+    async def client(self, dependency):
+        """Return the dependency's async client, building it on first use."""
+
+        if dependency not in self._clients and dependency in self.factories:
+            client = self.factories[dependency]()
+            if asyncio.iscoroutine(client):
+                client = await client
+            self._clients.setdefault(dependency, client)
+        return self._clients.get(dependency)
+
+    def _semaphore(self, dependency):
+        if dependency not in self._semaphores:
+            self._semaphores[dependency] = asyncio.Semaphore(self.concurrency[dependency])
+        return self._semaphores[dependency]
+
+    def limiter(self, quota):
+        if quota not in self._limiters:
+            self._limiters[quota] = RateLimiter(*self.rate_limits.get(quota, (None, None)))
+        return self._limiters[quota]
+
+    async def call(self, dependency, operation, deadline=None, retry=None, blocking=False, quota=None, tokens=0,
+                   priority=None, name=None):
+        """Call operation(client) with the dependency's client, under its concurrency limit,
+        deadline and retry policy. operation returns an awaitable, or with blocking=True
+        runs on a worker thread. An httpx response with a retryable status is retried too.
+        With a quota, every attempt is first admitted by its rate limiter at a cost of tokens.
+        name labels the call in telemetry."""
+
+        deadline = self.deadline_seconds[dependency] if deadline is None else deadline
+        admission = (quota, tokens, self.default_priority if priority is None else priority) if quota else None
+        start = time.perf_counter()
+        result = None
+        failed = True
+        try:
+            async with asyncio.timeout(deadline) as scope:
+                result = await self._call_with_retries(dependency, operation, retry or self.retry, blocking, admission)
+            failed = False
+            return result
+        except TimeoutError as error:
+            if not scope.expired():
+                raise
+            self.stats[dependency]["timeouts"] += 1
+            raise DeadlineExceeded(f"The {dependency} call did not finish within {deadline:g} seconds.") from error
+        finally:
+            if self.telemetry is not None:
+                self.telemetry.record(dependency, name or "call", time.perf_counter() - start, failed,
+                                      response_size(result), usage_tokens(result))
+
+    async def _call_with_retries(self, dependency, operation, retry, blocking, admission):
+        stats = self.stats[dependency]
+        client = await self.client(dependency)
+        attempt = 0
+        while True:
+            attempt += 1
+            error = None
+            result = None
+            if admission is not None:
+                quota, tokens, priority = admission
+                await self.limiter(quota).acquire(tokens, priority)
+            stats["waiting"] += 1
+            async with self._semaphore(dependency):
+                stats["waiting"] -= 1
+                stats["in_flight"] += 1
+                try:
+                    result = await (asyncio.to_thread(operation, client) if blocking else operation(client))
+                except Exception as caught:
+                    error = caught
+                finally:
+                    stats["in_flight"] -= 1
+
+            if error is None:
+                retryable_response = (isinstance(result, httpx.Response)
+                                      and result.status_code in retry.retry_on_status)
+                if not retryable_response or attempt >= retry.max_attempts:
+                    stats["calls"] += 1
+                    return result
+                await result.aclose()
+            elif not is_retryable(error) or attempt >= retry.max_attempts:
+                stats["errors"] += 1
+                raise error
+
+            stats["retries"] += 1
+            delay = retry_after_seconds(error, result if error is None else None)
+            if delay is None:
+                delay = retry.delay(attempt)
+            await asyncio.sleep(min(delay, retry.max_backoff_seconds))
+
+    def run(self, coroutine, timeout=None):
+        """Run a coroutine on the service loop from synchronous code and return its result."""
+
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("Synchronous service calls cannot be made from the service loop itself.")
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result(timeout)
+
+    def call_sync(self, dependency, operation, **kwargs):
+        """Synchronous adapter for call()."""
+
+        return self.run(self.call(dependency, operation, **kwargs))
+
+    def submit(self, dependency, operation, **kwargs):
+        """Start call() from synchronous code and return a concurrent.futures.Future of its result,
+        so the caller can do other work, such as showing partial results, while it runs."""
+
+        return asyncio.run_coroutine_threadsafe(self.call(dependency, operation, **kwargs), self._loop)
+
+    def admit(self, quota, tokens, priority=None):
+        """Wait, from synchronous code, until the quota admits a request the caller sends itself,
+        such as a streamed chat completion."""
+
+        async def acquire():
+            return await self.limiter(quota).acquire(tokens, self.default_priority if priority is None else priority)
+        return self.run(acquire())
+
+    def response_hook(self, response):
+        """httpx response hook that lets the deployment's rate limiter learn from every Azure OpenAI response.
+        Safe to call from any thread."""
+
+        match = DEPLOYMENT_PATH.search(response.request.url.path)
+        if match:
+            headers = {name.lower(): value for name, value in response.headers.items()}
+            self._loop.call_soon_threadsafe(
+                lambda: self.limiter(match.group(1)).observe(response.status_code, headers))
+
+    async def async_response_hook(self, response):
+        self.response_hook(response)
+
+    def rate_limit_stats(self):
+        """Queue depth, wait times and throttling of every quota used so far."""
+
+        async def stats():
+            return {quota: limiter.stats() for quota, limiter in self._limiters.items()}
+        return self.run(stats())
+
+    def gather_sync(self, calls, return_exceptions=False):
+        """Run (dependency, operation) pairs concurrently and return their results in order."""
+
+        async def gather():
+            return await asyncio.gather(*(self.call(dependency, operation) for dependency, operation in calls),
+                                        return_exceptions=return_exceptions)
+        return self.run(gather())
+
+    def close(self):
+        """Close every client that was built and stop the loop."""
+
+        async def close_clients():
+            for client in self._clients.values():
+                close = getattr(client, "aclose", None) or getattr(client, "close", None)
+                if close is not None:
+                    result = close()
+                    if asyncio.iscoroutine(result):
+                        await result
+            self._clients.clear()
+
+        self.run(close_clients())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+def make_openai_client(services):
+    """Build the async Azure OpenAI client, sharing the cached token provider.
+    Its responses are reported to the service layer's rate limiters."""
+
+    token_provider = get_token_provider()
+
+    async def azure_ad_token_provider():
+        # The provider only blocks when it refreshes the token, which it does off the loop.
+        return await asyncio.to_thread(token_provider)
+
+    return openai.AsyncAzureOpenAI(
+        azure_ad_token_provider=azure_ad_token_provider,
+        api_version=AOAI_API_VERSION,
+        azure_endpoint=st.secrets["aoai"]["endpoint"],
+        # Retries are the service layer's, so they stay inside the deadline.
+        max_retries=0,
+        http_client=httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=DEFAULT_CONCURRENCY["openai"] * 2),
+            timeout=httpx.Timeout(60, connect=10),
+            event_hooks={"response": [services.async_response_hook]}
+        )
+    )
+
+
+def make_cosmos_client():
+    """Build the async Cosmos DB client. The async Azure SDKs need aiohttp."""
+
+    from azure.cosmos.aio import CosmosClient
+    from azure.identity.aio import DefaultAzureCredential
+
+    cosmos = st.secrets["cosmos"]
+    return CosmosClient(cosmos["endpoint"], credential=DefaultAzureCredential(managed_identity_client_id=cosmos["client_id"]))
+
+
+def make_language_client():
+    from azure.ai.textanalytics.aio import TextAnalyticsClient
+
+    language = st.secrets["language"]
+    return TextAnalyticsClient(language["endpoint"], AzureKeyCredential(language["key"]))
+
+
+@st.cache_resource
+def get_service_layer():
+    """Return the process-wide service layer. Clients are built the first time each dependency is called."""
+
+    settings = st.secrets.get("services", {})
+    services = ServiceLayer(
+        factories={
+            "cosmos": make_cosmos_client,
+            "language": make_language_client
+        },
+        rate_limits=get_rate_limits(),
+        telemetry=get_telemetry(),
+        concurrency={name: int(settings[f"{name}_concurrency"])
+                     for name in DEFAULT_CONCURRENCY if f"{name}_concurrency" in settings},
+        deadline_seconds={name: float(settings[f"{name}_deadline_seconds"])
+                          for name in DEFAULT_DEADLINE_SECONDS if f"{name}_deadline_seconds" in settings},
+        retry=RetryPolicy(max_attempts=int(settings.get("max_attempts", DEFAULT_MAX_ATTEMPTS)))
+    )
+    services.factories["openai"] = lambda: make_openai_client(services)
+    return services
+
+
+def get_rate_limits():
+    """Quota of the chat and embedding deployments from the optional tokens_per_minute,
+    requests_per_minute, embedding_tokens_per_minute and embedding_requests_per_minute
+    settings in the [aoai] secrets section."""
+
+    aoai = st.secrets.get("aoai", {})
+    rate_limits = {}
+    for deployment, prefix in (("deployment_name", ""), ("embedding_deployment_name", "embedding_")):
+        tokens_per_minute = aoai.get(f"{prefix}tokens_per_minute")
+        requests_per_minute = aoai.get(f"{prefix}requests_per_minute")
+        if deployment in aoai and (tokens_per_minute or requests_per_minute):
+            rate_limits[aoai[deployment]] = (tokens_per_minute, requests_per_minute)
+    return rate_limits
+
+
+def show_rate_limit_stats():
+    """Show how long Azure OpenAI requests wait for quota, and how many are queued, in the sidebar."""
+
+    for deployment, stats in get_service_layer().rate_limit_stats().items():
+        queued = stats["queued"]
+        st.sidebar.metric(f"{deployment} quota wait, p95", f'{stats["interactive_wait_p95_s"]:.1f} s',
+            help=f'Background work waits {stats["background_wait_p95_s"]:.1f} s at the 95th percentile')
+        st.sidebar.caption(f'{queued["interactive"]} interactive and {queued["background"]} background requests '
+                           f'queued; {stats["admitted"]} admitted, {stats["throttled"]} throttled by the service')
+
+
+def call_service(dependency, operation, **kwargs):
+    """Call a dependency from synchronous page code through the shared service layer.
+    operation receives the dependency's async client and returns an awaitable."""
+
+    return get_service_layer().call_sync(dependency, operation, **kwargs)
+
+
+def submit_service(dependency, operation, **kwargs):
+    """Start a call through the shared service layer without waiting for it; returns a Future."""
+
+    return get_service_layer().submit(dependency, operation, **kwargs)
+
+
+def gather_calls(*calls, return_exceptions=False):
+    """Run (dependency, operation) pairs at the same time and return their results in order."""
+
+    return get_service_layer().gather_sync(calls, return_exceptions=return_exceptions)
+
+
+async def collect(items):
+    """Collect an async iterable, such as the pages of a Cosmos DB query, into a list."""
+
+    return [item async for item in items]
+
+
+async def analyze_actions(client, documents, actions):
+    """Run a Language service job and return the action results of each document, in order."""
+
+    poller = await client.begin_analyze_actions(documents, actions=actions)
+    return await collect(await poller.result())
+
+
+async def query_items(client, container_name, query, parameters=None):
+    """Run a Cosmos DB query against a container in the Contoso Suites database and return every item."""
+
+    database = client.get_database_client(st.secrets["cosmos"]["database_name"])
+    container = database.get_container_client(container_name)
+    return await collect(container.query_items(query=query, parameters=parameters))
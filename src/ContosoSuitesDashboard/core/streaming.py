@@ -0,0 +1,179 @@
+"""Incremental rendering of streamed chat responses.
+
+Re-rendering the whole growing response on every delta sends the full text
+over the websocket each time. For a long answer that adds up to quadratic
+traffic and rendering work. StreamRenderer buffers deltas and only
+re-renders when enough time has passed or enough text has arrived. Finished
+paragraphs are moved into an element of their own, so they are sent once
+and only the paragraph being written is re-rendered.
+
+The module also decodes a Web API response body as it arrives, whether it is
+plain text or a single JSON string."""
+
+import json
+import time
+
+# Re-render at most this often, unless a lot of text is waiting.
+MIN_RENDER_INTERVAL_SECONDS = 0.1
+MAX_PENDING_CHARACTERS = 400
+CURSOR = "▌"
+PARAGRAPH_BREAK = "\n\n"
+CODE_FENCE = "```"
+
+
+def last_paragraph_break(text):
+    """Index just past the last blank line in text that is not inside a code block, or 0."""
+
+    end = text.rfind(PARAGRAPH_BREAK)
+    while end > 0:
+        if text.count(CODE_FENCE, 0, end) % 2 == 0:
+            return end + len(PARAGRAPH_BREAK)
+        end = text.rfind(PARAGRAPH_BREAK, 0, end)
+    return 0
+
+
+class StreamRenderer:
+    """Render a streamed response into a Streamlit container with throttled updates.
+    container is anything with an empty() method, such as st or st.chat_message()."""
+
+    def __init__(self, container, min_interval=MIN_RENDER_INTERVAL_SECONDS,
+                 max_pending_characters=MAX_PENDING_CHARACTERS, split_paragraphs=True,
+                 cursor=CURSOR, clock=time.monotonic):
+        self.container = container
+        self.min_interval = min_interval
+        self.max_pending_characters = max_pending_characters
+        self.split_paragraphs = split_paragraphs
+        self.cursor = cursor
+        self.clock = clock
+        self._element = container.empty()
+        self._finished = []
+        self._block = ""
+        self._pending = 0
+        self._last_render = None
+        self.render_calls = 0
+        self.bytes_sent = 0
+
+    @property
+    def text(self):
+        """Everything written so far."""
+
+        return "".join(self._finished) + self._block
+
+    def write(self, delta):
+        """Add a delta, re-rendering only if the time or size threshold is reached."""
+
+        if not delta:
+            return
+        self._block += delta
+        self._pending += len(delta)
+        now = self.clock()
+        if (self._pending >= self.max_pending_characters or self._last_render is None
+                or now - self._last_render >= self.min_interval):
+            self._flush(now)
+
+    def _render(self, element, text):
+        element.markdown(text)
+        self.render_calls += 1
+        self.bytes_sent += len(text.encode("utf-8"))
+
+    def _flush(self, now, final=False):
+        if self.split_paragraphs:
+            split = last_paragraph_break(self._block)
+            if split:
+                # Freeze the finished paragraphs in the current element and continue in a new one.
+                finished, self._block = self._block[:split], self._block[split:]
+                self._render(self._element, finished)
+                self._finished.append(finished)
+                self._element = self.container.empty()
+        if self._block or final:
+            self._render(self._element, self._block if final else self._block + self.cursor)
+        self._pending = 0
+        self._last_render = now
+
+    def close(self):
+        """Render the final text without the cursor and return the whole response."""
+
+        self._flush(self.clock(), final=True)
+        return self.text
+
+
+def render_stream(container, deltas, **kwargs):
+    """Render an iterable of text deltas into container and return the whole response."""
+
+    renderer = StreamRenderer(container, **kwargs)
+    for delta in deltas:
+        renderer.write(delta)
+    return renderer.close()
+
+
+class JsonStringDecoder:
+    """Incrementally decode a JSON string literal that arrives in pieces."""
+
+    ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+    def __init__(self):
+        self._pending = ""
+        self._started = False
+        self._finished = False
+
+    def decode(self, piece):
+        """Return the text decoded from piece and anything held back before it."""
+
+        text = self._pending + piece
+        self._pending = ""
+        output = []
+        index = 0
+        if not self._started:
+            text = text.lstrip()
+            if not text:
+                return ""
+            if text[0] != '"':
+                raise ValueError("The response is not a JSON string.")
+            self._started = True
+            index = 1
+        while index < len(text) and not self._finished:
+            char = text[index]
+            if char == '"':
+                self._finished = True
+            elif char != "\\":
+                output.append(char)
+            elif index + 1 >= len(text):
+                # The escape continues in the next piece.
+                self._pending = text[index:]
+                break
+            elif text[index + 1] == "u":
+                if index + 6 > len(text):
+                    self._pending = text[index:]
+                    break
+                code = int(text[index + 2:index + 6], 16)
+                if 0xD800 <= code < 0xDC00:
+                    # A surrogate pair takes two escapes; let json combine them.
+                    if index + 12 > len(text):
+                        self._pending = text[index:]
+                        break
+                    output.append(json.loads(f'"{text[index:index + 12]}"'))
+                    index += 12
+                    continue
+                output.append(chr(code))
+                index += 6
+                continue
+            else:
+                output.append(self.ESCAPES[text[index + 1]])
+                index += 2
+                continue
+            index += 1
+        return "".join(output)
+
+
+def iter_response_text(response):
+    """Yield the text of a streamed httpx response as it arrives.
+    A JSON response holding a single string is decoded on the fly."""
+
+    if response.headers.get("content-type", "").startswith("application/json"):
+        decoder = JsonStringDecoder()
+        for piece in response.iter_text():
+            text = decoder.decode(piece)
+            if text:
+                yield text
+    else:
+        yield from response.iter_text()
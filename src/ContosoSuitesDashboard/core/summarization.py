@@ -0,0 +1,185 @@
+"""Map-reduce summarization of transcripts longer than one request can take.
+
+A transcript is a list of segments, one per speaker turn. Segments are packed
+in order into chunks under a token budget (counted with tiktoken) and a
+character budget (for the Language service's document limits). A segment too
+long for one chunk is split between sentences, and a sentence too long for
+one chunk is split between tokens.
+
+Each chunk is summarized on its own, in parallel. If the partial summaries
+together still exceed the budget, they are packed and summarized again, until
+what is left fits in a single final request.
+
+Packing is greedy from the start of the transcript, so when a transcript is
+extended every chunk but the last one stays the same. Chunk summaries are
+cached by the text of the chunk, so summarizing the extended transcript again
+only sends the new chunks. A batch that raises is not cached, and the error
+reaches the caller of summarize()."""
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import tiktoken
+
+# The GPT-4o tokenizer.
+ENCODING_NAME = "o200k_base"
+MAX_CHUNK_TOKENS = 3_000
+# Well under the Language service's 125,000 character limit for summarization,
+# so a long call is spread over several documents that are processed in parallel.
+MAX_CHUNK_CHARACTERS = 12_000
+MAX_IN_FLIGHT = 4
+CACHE_ENTRIES = 4_096
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+
+
+class TranscriptChunker:
+    """Pack transcript segments into chunks under a token and a character budget."""
+
+    def __init__(self, encoding_name=ENCODING_NAME, max_chunk_tokens=MAX_CHUNK_TOKENS,
+                 max_chunk_characters=MAX_CHUNK_CHARACTERS):
+        self.encoding = tiktoken.get_encoding(encoding_name)
+        self.max_chunk_tokens = max_chunk_tokens
+        self.max_chunk_characters = max_chunk_characters
+
+    def count_tokens(self, text):
+        return len(self.encoding.encode(text))
+
+    def fits(self, text):
+        return len(text) <= self.max_chunk_characters and self.count_tokens(text) <= self.max_chunk_tokens
+
+    def _pieces(self, segment):
+        """Split a segment into pieces that each fit in a chunk, preferring sentence boundaries.
+        Returns a list of (text, token_count) pairs."""
+
+        token_count = self.count_tokens(segment)
+        if token_count <= self.max_chunk_tokens and len(segment) <= self.max_chunk_characters:
+            return [(segment, token_count)]
+        sentences = SENTENCE_BOUNDARY.split(segment)
+        if len(sentences) > 1:
+            return [piece for sentence in sentences for piece in self._pieces(sentence)]
+        # A single sentence over budget: fall back to splitting between tokens.
+        tokens = self.encoding.encode(segment)
+        step = self.max_chunk_tokens
+        while True:
+            pieces = [(self.encoding.decode(tokens[i:i + step]), len(tokens[i:i + step]))
+                      for i in range(0, len(tokens), step)]
+            # Halve the pieces until the character budget holds as well.
+            if step == 1 or all(len(text) <= self.max_chunk_characters for text, _ in pieces):
+                return pieces
+            step = max(1, step // 2)
+
+    def split(self, segments):
+        """Return the segments joined into as few chunks as the budgets allow, in order."""
+
+        chunks = []
+        current = []
+        current_tokens = 0
+        current_characters = 0
+        for segment in segments:
+            for text, token_count in self._pieces(segment):
+                # The joining space can add a token, so count one per piece.
+                if current and (current_tokens + token_count + 1 > self.max_chunk_tokens
+                                or current_characters + len(text) + 1 > self.max_chunk_characters):
+                    chunks.append(' '.join(current))
+                    current = []
+                    current_tokens = 0
+                    current_characters = 0
+                current.append(text)
+                current_tokens += token_count + 1
+                current_characters += len(text) + 1
+        if current:
+            chunks.append(' '.join(current))
+        return chunks
+
+
+class MapReduceSummarizer:
+    """Summarize transcripts of any length.
+
+    summarize_batch takes a list of texts and returns a summary string for each;
+    it is used for chunks and for intermediate reductions. finalize takes the
+    whole transcript, or the partial summaries joined, once it fits in one
+    request and returns the final result. It defaults to summarize_batch on that
+    one text. batch_size is the number of texts passed to one summarize_batch call."""
+
+    def __init__(self, summarize_batch, finalize=None, chunker=None, batch_size=1,
+                 max_in_flight=MAX_IN_FLIGHT, cache_entries=CACHE_ENTRIES):
+        self.summarize_batch = summarize_batch
+        self.finalize = finalize or (lambda text: summarize_batch([text])[0])
+        self.chunker = chunker or TranscriptChunker()
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.cache_entries = cache_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.chunks_summarized = 0
+        self.chunks_from_cache = 0
+
+    @staticmethod
+    def _key(text):
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _cached(self, key):
+        with self._lock:
+            summary = self._cache.get(key)
+            if summary is not None:
+                self._cache.move_to_end(key)
+            return summary
+
+    def _store(self, key, summary):
+        with self._lock:
+            self._cache[key] = summary
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+
+    def summarize_chunks(self, chunks, initializer=None, initargs=()):
+        """Return a summary for every chunk, in order, sending only chunks not summarized before.
+        initializer and initargs are passed to the ThreadPoolExecutor that runs the batches."""
+
+        keys = [self._key(chunk) for chunk in chunks]
+        summaries = [self._cached(key) for key in keys]
+        missing = {}
+        for chunk, key, summary in zip(chunks, keys, summaries):
+            if summary is None:
+                missing.setdefault(key, chunk)
+        self.chunks_from_cache += len(chunks) - len(missing)
+
+        if missing:
+            pending = list(missing.items())
+            batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+
+            def run(batch):
+                batch_summaries = self.summarize_batch([chunk for _, chunk in batch])
+                for (key, _), summary in zip(batch, batch_summaries):
+                    self._store(key, summary)
+                return [key for key, _ in batch], batch_summaries
+
+            with ThreadPoolExecutor(max_workers=min(self.max_in_flight, len(batches)),
+                                    initializer=initializer, initargs=initargs) as executor:
+                for batch_keys, batch_summaries in executor.map(run, batches):
+                    missing.update(zip(batch_keys, batch_summaries))
+                    self.chunks_summarized += len(batch_keys)
+            summaries = [summary if summary is not None else missing[key]
+                         for key, summary in zip(keys, summaries)]
+        return summaries
+
+    def summarize(self, segments, initializer=None, initargs=()):
+        """Summarize a transcript given as a list of segments. initializer and
+        initargs set up the threads that summarize chunks, as for ThreadPoolExecutor."""
+
+        chunks = self.chunker.split(segments)
+        if len(chunks) <= 1:
+            return self.finalize(chunks[0] if chunks else '')
+        partials = self.summarize_chunks(chunks, initializer, initargs)
+        # Reduce level by level until the partial summaries fit in one request.
+        while not self.chunker.fits(' '.join(partials)):
+            previous_length = len(' '.join(partials))
+            partials = self.summarize_chunks(self.chunker.split(partials), initializer, initargs)
+            if len(' '.join(partials)) >= previous_length:
+                # The summaries are not getting any shorter, so another level would not help.
+                break
+        return self.finalize(' '.join(partials))
@@ -0,0 +1,284 @@
+"""Latency, payload, token and cache metrics for every dependency and page phase.
+
+Outbound calls that go through the service layer are measured there. Other
+work is wrapped with measure() as a context manager, or instrumented() as a
+decorator, under a kind and a name: ("openai", "chat"), ("cosmos",
+"save_transcripts") or ("phase", "transcription"). Each metric keeps a
+log-linear histogram in the style of HdrHistogram: every power of two of
+microseconds is split into 32 equal buckets, so any percentile is within
+about 3% of the true value, and recording is a few integer operations under
+a lock. Cache hit rates are read from the caches' own stats().
+
+Every measurement is also handed to the configured exporters: a JSON-lines
+file written in batches by a background thread, and OpenTelemetry when the
+opentelemetry-api package is installed and an SDK is configured. The
+optional [telemetry] secrets section may set jsonl_path and
+opentelemetry = true."""
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+import streamlit as st
+
+SUB_BUCKET_BITS = 5
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+JSONL_FLUSH_SECONDS = 1.0
+METER_NAME = "contoso-suites-dashboard"
+
+
+def bucket_index(microseconds):
+    """Histogram bucket of a value: exact below 64, then 32 buckets per power of two."""
+
+    shift = max(0, microseconds.bit_length() - SUB_BUCKET_BITS - 1)
+    return (shift << SUB_BUCKET_BITS) + (microseconds >> shift)
+
+
+def bucket_value(index):
+    """Middle of the range of values a bucket holds, in microseconds."""
+
+    if index < 2 * SUB_BUCKET_COUNT:
+        return index
+    shift = (index >> SUB_BUCKET_BITS) - 1
+    low = (index - (shift << SUB_BUCKET_BITS)) << shift
+    return low + (1 << shift) // 2
+
+
+class LatencyHistogram:
+    """Log-linear histogram of durations, recorded in microseconds."""
+
+    def __init__(self):
+        self.counts = []
+        self.count = 0
+        self.total_us = 0
+        self.max_us = 0
+
+    def record(self, seconds):
+        microseconds = max(0, int(seconds * 1_000_000))
+        index = bucket_index(microseconds)
+        if index >= len(self.counts):
+            self.counts.extend([0] * (index + 1 - len(self.counts)))
+        self.counts[index] += 1
+        self.count += 1
+        self.total_us += microseconds
+        self.max_us = max(self.max_us, microseconds)
+
+    def percentile(self, pct):
+        """Value at the pct-th percentile, in seconds."""
+
+        if not self.count:
+            return 0.0
+        rank = max(1, round(pct / 100 * self.count))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bucket_value(index), self.max_us) / 1_000_000
+        return self.max_us / 1_000_000
+
+    def mean(self):
+        return self.total_us / self.count / 1_000_000 if self.count else 0.0
+
+
+class Metric:
+    """Everything recorded for one kind and name."""
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.errors = 0
+        self.payload_bytes = 0
+        self.tokens = 0
+
+    def summary(self):
+        return {
+            "count": self.latency.count,
+            "errors": self.errors,
+            "p50_s": self.latency.percentile(50),
+            "p95_s": self.latency.percentile(95),
+            "p99_s": self.latency.percentile(99),
+            "max_s": self.latency.max_us / 1_000_000,
+            "mean_s": self.latency.mean(),
+            "payload_bytes": self.payload_bytes,
+            "tokens": self.tokens
+        }
+
+
+class Measurement:
+    """A timing in progress. Set payload_bytes or tokens on it before it ends to record them too."""
+
+    def __init__(self, kind, name):
+        self.kind = kind
+        self.name = name
+        self.payload_bytes = None
+        self.tokens = None
+        self.start = time.perf_counter()
+
+
+class Telemetry:
+    """Thread-safe registry of metrics, keyed by kind and name."""
+
+    def __init__(self, exporters=()):
+        self.exporters = list(exporters)
+        self.started = time.time()
+        self._metrics = {}
+        self._caches = {}
+        self._lock = threading.Lock()
+
+    def record(self, kind, name, seconds, error=False, payload_bytes=None, tokens=None):
+        with self._lock:
+            metric = self._metrics.get((kind, name))
+            if metric is None:
+                metric = self._metrics[(kind, name)] = Metric()
+            metric.latency.record(seconds)
+            metric.errors += error
+            metric.payload_bytes += payload_bytes or 0
+            metric.tokens += tokens or 0
+        for exporter in self.exporters:
+            exporter.export(kind, name, seconds, error, payload_bytes, tokens)
+
+    @contextmanager
+    def measure(self, kind, name):
+        """Time the block; an exception raised in it counts as an error and propagates."""
+
+        measurement = Measurement(kind, name)
+        error = False
+        try:
+            yield measurement
+        except Exception:
+            error = True
+            raise
+        finally:
+            self.record(kind, name, time.perf_counter() - measurement.start, error,
+                        measurement.payload_bytes, measurement.tokens)
+
+    def track_cache(self, name, stats):
+        """Report a cache's hit rate, read from stats(), a callable returning hits, misses and hit_rate."""
+
+        self._caches[name] = stats
+
+    def cache_stats(self):
+        return {name: stats() for name, stats in self._caches.items()}
+
+    def snapshot(self):
+        """Summary of every metric, sorted by kind and name."""
+
+        with self._lock:
+            return [{"kind": kind, "name": name, **metric.summary()}
+                    for (kind, name), metric in sorted(self._metrics.items())]
+
+    def reset(self):
+        with self._lock:
+            self._metrics.clear()
+            self.started = time.time()
+
+    def close(self):
+        for exporter in self.exporters:
+            close = getattr(exporter, "close", None)
+            if close is not None:
+                close()
+
+
+class JsonLinesExporter:
+    """Appends one JSON object per measurement to a file, written in batches by a background thread."""
+
+    def __init__(self, path, flush_seconds=JSONL_FLUSH_SECONDS):
+        self.path = path
+        self.flush_seconds = flush_seconds
+        self._pending = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="telemetry-jsonl", daemon=True)
+        self._thread.start()
+
+    def export(self, kind, name, seconds, error, payload_bytes, tokens):
+        event = {"ts": time.time(), "kind": kind, "name": name, "seconds": seconds, "error": error}
+        if payload_bytes is not None:
+            event["payload_bytes"] = payload_bytes
+        if tokens is not None:
+            event["tokens"] = tokens
+        with self._lock:
+            self._pending.append(event)
+
+    def flush(self):
+        with self._lock:
+            events, self._pending = self._pending, []
+        if events:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(event) + "\n" for event in events))
+
+    def close(self):
+        """Stop the background thread and write what is left."""
+
+        self._stopped.set()
+        self._thread.join()
+        self.flush()
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_seconds):
+            self.flush()
+
+
+class OpenTelemetryExporter:
+    """Records every measurement as OpenTelemetry histograms and counters, through the
+    globally configured meter provider. Needs the opentelemetry-api package."""
+
+    def __init__(self, telemetry=None):
+        from opentelemetry import metrics
+
+        meter = metrics.get_meter(METER_NAME)
+        self.duration = meter.create_histogram("dashboard.operation.duration", unit="s",
+                                               description="Duration of dependency calls and page phases.")
+        self.payload = meter.create_counter("dashboard.operation.payload", unit="By")
+        self.tokens = meter.create_counter("dashboard.operation.tokens", unit="{token}")
+        if telemetry is not None:
+            meter.create_observable_gauge("dashboard.cache.hit_rate", callbacks=[self._cache_callback(telemetry)])
+
+    def export(self, kind, name, seconds, error, payload_bytes, tokens):
+        attributes = {"kind": kind, "name": name, "error": error}
+        self.duration.record(seconds, attributes)
+        if payload_bytes:
+            self.payload.add(payload_bytes, attributes)
+        if tokens:
+            self.tokens.add(tokens, attributes)
+
+    @staticmethod
+    def _cache_callback(telemetry):
+        from opentelemetry.metrics import Observation
+
+        def observe(options):
+            return [Observation(stats["hit_rate"], {"cache": name})
+                    for name, stats in telemetry.cache_stats().items()]
+        return observe
+
+
+@st.cache_resource
+def get_telemetry():
+    """Return the process-wide telemetry registry."""
+
+    settings = st.secrets.get("telemetry", {})
+    telemetry = Telemetry()
+    if settings.get("jsonl_path"):
+        telemetry.exporters.append(JsonLinesExporter(settings["jsonl_path"]))
+    if settings.get("opentelemetry"):
+        telemetry.exporters.append(OpenTelemetryExporter(telemetry))
+    return telemetry
+
+
+def measure(kind, name):
+    """Context manager timing a block under the shared telemetry registry."""
+
+    return get_telemetry().measure(kind, name)
+
+
+def instrumented(kind, name):
+    """Decorator timing every call of a function under the shared telemetry registry."""
+
+    def decorate(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with measure(kind, name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -0,0 +1,17 @@
+"""Text helpers shared by the embedding and search code."""
+
+import re
+
+
+def normalize_text(s):
+    """Normalize text for tokenization."""
+
+    s = re.sub(r'\s+',  ' ', s).strip()
+    s = re.sub(r". ,","",s)
+    # remove all instances of multiple spaces
+    s = s.replace("..",".")
+    s = s.replace(". .",".")
+    s = s.replace("\n", "")
+    s = s.strip()
+
+    return s
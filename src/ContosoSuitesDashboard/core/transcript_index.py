@@ -0,0 +1,236 @@
+"""Local vector index over the CallTranscripts container.
+
+The index holds the hot working set of call transcripts so that transcript
+searches can run in-process instead of round-tripping to Cosmos DB. It is
+filled from Cosmos DB on demand and appended to whenever a transcript is saved.
+Saves alone leave it holding only a few transcripts, so searches go to Cosmos
+DB until load_transcript_index_from_cosmos() has copied the whole container
+and marked the index loaded.
+
+Searches are exact by default. Setting kind = "ivf" in the [vector_index]
+secrets section switches them to an approximate IVF index, which
+build_transcript_ann_index() builds offline from the exact index. Setting
+kind = "compact" switches them to float16 or int8 codes of the vectors,
+optionally PCA-reduced, with the best candidates re-ranked exactly; they are
+built by build_transcript_compact_index().
+
+The optional vector_codec setting of the [cosmos] secrets section stores
+request_vector in CallTranscripts documents as float16-rounded values or
+int8 codes, with request_vector_scale next to the codes. Documents in either
+form are decoded when they are added to the index.
+
+A BM25 index over the call_transcript text of the same rows is kept in
+memory next to the exact index, for hybrid searches that also match room
+numbers, booking codes and names exactly. It is built from the exact index
+when first used and extended whenever transcripts are added, here or by
+another process."""
+
+import os
+
+import streamlit as st
+
+from core.ann_index import IVFIndex
+from core.clients import get_cosmos_container
+from core.lexical_index import DEFAULT_CANDIDATES, BM25Index, hybrid_search
+from core.services import call_service
+from core.vector_codec import CompactIndex, check_codec, decode_document_vector, encode_document_vector
+from core.vector_index import VectorIndex
+from core.webapi import RetryPolicy
+
+TRANSCRIPT_CONTAINER_NAME = "CallTranscripts"
+DEFAULT_INDEX_PATH = ".cache/transcript_index"
+# Fields kept alongside each vector; these match the columns the Cosmos DB search returns.
+INDEXED_FIELDS = ("id", "call_id", "call_transcript", "abstractive_summary")
+LOAD_BATCH_SIZE = 1000
+
+
+def to_index_item(transcript_item):
+    """Return the metadata the index keeps for a transcript document."""
+
+    return {field: transcript_item.get(field) for field in INDEXED_FIELDS}
+
+
+def get_index_settings():
+    return st.secrets.get("vector_index", {})
+
+
+def get_ann_index_path():
+    return os.path.join(get_index_settings().get("path", DEFAULT_INDEX_PATH), "ivf")
+
+
+def get_compact_index_path():
+    return os.path.join(get_index_settings().get("path", DEFAULT_INDEX_PATH), "compact")
+
+
+def get_document_vector_codec():
+    """The codec of request_vector in the CallTranscripts documents this process writes."""
+
+    return check_codec(st.secrets.get("cosmos", {}).get("vector_codec", "float32"))
+
+
+def encode_transcript_vector(transcript_item):
+    """Return a copy of a transcript document with request_vector in the configured codec."""
+
+    values, scale = encode_document_vector(transcript_item["request_vector"], get_document_vector_codec())
+    transcript_item = {**transcript_item, "request_vector": values}
+    if scale is not None:
+        transcript_item["request_vector_scale"] = scale
+    return transcript_item
+
+
+def encode_transcript_query_vector(query_embedding):
+    """Return a query embedding in the form VectorDistance compares with the stored request_vector."""
+
+    return encode_document_vector(query_embedding, get_document_vector_codec())[0]
+
+
+@st.cache_resource
+def get_transcript_index():
+    """Return the shared transcript index. Key assumptions:
+    - The optional [vector_index] secrets section may set path."""
+
+    return VectorIndex(get_index_settings().get("path", DEFAULT_INDEX_PATH))
+
+
+@st.cache_resource
+def get_transcript_ann_index():
+    """Return the shared approximate index, or None when it is not enabled or not built yet.
+    The optional [vector_index] secrets section may set kind and nprobe."""
+
+    settings = get_index_settings()
+    if settings.get("kind", "exact") != "ivf" or not IVFIndex.exists(get_ann_index_path()):
+        return None
+    nprobe = settings.get("nprobe")
+    return IVFIndex.load(get_ann_index_path(), int(nprobe) if nprobe else None)
+
+
+@st.cache_resource
+def get_transcript_compact_index():
+    """Return the shared compact index, or None when it is not enabled or not built yet.
+    The optional [vector_index] secrets section may set kind and rerank."""
+
+    settings = get_index_settings()
+    if settings.get("kind", "exact") != "compact" or not CompactIndex.exists(get_compact_index_path()):
+        return None
+    rerank = settings.get("rerank")
+    return CompactIndex.load(get_compact_index_path(), get_transcript_index(), int(rerank) if rerank else None)
+
+
+@st.cache_resource
+def get_transcript_lexical_index():
+    """Return the shared BM25 index over the transcripts of the exact index, whose rows it shares."""
+
+    lexical_index = BM25Index()
+    update_transcript_lexical_index(lexical_index)
+    return lexical_index
+
+
+def update_transcript_lexical_index(lexical_index=None):
+    """Index the transcripts added to the exact index since the lexical index was last updated."""
+
+    index = get_transcript_index()
+    index.refresh()
+    if lexical_index is None:
+        lexical_index = get_transcript_lexical_index()
+    lexical_index.extend(len(index), lambda row: index.item(row).get("call_transcript"))
+    return lexical_index
+
+
+def build_transcript_ann_index(nlist=None):
+    """Build the IVF index from every vector in the exact index and save it.
+    Run this offline, or whenever many transcripts have been added since the last build."""
+
+    index = get_transcript_index()
+    ann_index = IVFIndex.build(index.items(), index.vectors(), nlist=nlist)
+    ann_index.save(get_ann_index_path())
+    get_transcript_ann_index.clear()
+    return ann_index
+
+
+def build_transcript_compact_index(codec=None, components=None):
+    """Encode every vector in the exact index with the compact codec and save the codes.
+    codec and components default to the codec and components settings of [vector_index]."""
+
+    settings = get_index_settings()
+    components = components or settings.get("components")
+    compact_index = CompactIndex.build(get_transcript_index(), codec or settings.get("codec", "int8"),
+                                       int(components) if components else None)
+    compact_index.save(get_compact_index_path())
+    get_transcript_compact_index.clear()
+    return compact_index
+
+
+def add_transcripts_to_index(transcript_items):
+    """Append transcript documents (with request_vector, in any codec) to the local index."""
+
+    transcript_items = [item for item in transcript_items if item.get("request_vector")]
+    if not transcript_items:
+        return 0
+    items = [to_index_item(item) for item in transcript_items]
+    vectors = [decode_document_vector(item["request_vector"], item.get("request_vector_scale"))
+               for item in transcript_items]
+    # The approximate index takes new vectors without retraining; they are
+    # persisted the next time build_transcript_ann_index() runs.
+    ann_index = get_transcript_ann_index()
+    if ann_index is not None:
+        ann_index.add(items, vectors)
+    added = get_transcript_index().add(items, vectors)
+    update_transcript_lexical_index()
+    return added
+
+
+def load_transcript_index_from_cosmos():
+    """Copy every transcript in Cosmos DB that is not yet indexed into the local index.
+    Returns the number of transcripts added."""
+
+    container = get_cosmos_container(TRANSCRIPT_CONTAINER_NAME)
+    fields = ", ".join(f"c.{field}" for field in INDEXED_FIELDS)
+    pages = container.query_items(
+        query=f"SELECT {fields}, c.request_vector, c.request_vector_scale FROM c",
+        enable_cross_partition_query=True,
+        max_item_count=LOAD_BATCH_SIZE
+    ).by_page()
+
+    def read_page(_client):
+        page = next(pages, None)
+        return None if page is None else list(page)
+
+    added = 0
+    while True:
+        # Each page is read on a worker thread under the Cosmos DB concurrency limit and
+        # deadline. A retry could skip a page of the shared iterator, so each read is
+        # attempted once; the Cosmos SDK already retries throttled requests itself.
+        batch = call_service("cosmos", read_page, blocking=True, retry=RetryPolicy(max_attempts=1),
+                             name="load_transcripts")
+        if batch is None:
+            break
+        added += add_transcripts_to_index(batch)
+    get_transcript_index().mark_loaded()
+    return added
+
+
+def is_transcript_index_loaded():
+    """True once the local index holds every transcript in Cosmos DB, so searches can use it."""
+
+    return get_transcript_index().loaded
+
+
+def search_transcript_index(query_embedding, max_results=5, minimum_similarity_score=0.5):
+    """Search the local index and return results shaped like the Cosmos DB vector search."""
+
+    index = get_transcript_ann_index() or get_transcript_compact_index() or get_transcript_index()
+    return index.search(query_embedding, max_results, minimum_similarity_score)
+
+
+def search_transcript_lexical_index(query, max_candidates=DEFAULT_CANDIDATES):
+    """Return the rows of the transcripts matching the words of query, best first, and their
+    BM25 scores. Needs no embedding, so it can run while the query is being embedded."""
+
+    return update_transcript_lexical_index().search(query, max_candidates)
+
+
+def hybrid_search_transcript_index(lexical_hits, query_embedding, max_results=5, minimum_similarity_score=0.5):
+    """Fuse lexical hits from search_transcript_lexical_index() with vector similarity,
+    returning results shaped like the Cosmos DB vector search with LexicalScore and HybridScore."""
+
+    return hybrid_search(get_transcript_index(), lexical_hits, query_embedding, max_results, minimum_similarity_score)
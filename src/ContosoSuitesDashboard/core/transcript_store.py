@@ -0,0 +1,146 @@
+"""Writes of call transcripts to the CallTranscripts container.
+
+Document IDs are derived from the transcript text, so saving the same
+transcript twice, or from two replicas, writes the same document instead of
+a duplicate. is_transcript_stored() lets callers skip embedding a transcript
+that is already saved.
+
+save_transcripts() upserts documents in bulk: they are grouped by partition
+key (call_id) into transactional batches within the service's operation and
+payload limits, and the batches run concurrently with a bound on how many are
+in flight. Request charges are summed from the response headers."""
+
+import hashlib
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from core.lazy import lazy_module
+from core.text import normalize_text
+
+cosmos_exceptions = lazy_module("azure.cosmos.exceptions")
+
+# Limits of a Cosmos DB transactional batch, with headroom on the payload size.
+MAX_BATCH_OPERATIONS = 100
+MAX_BATCH_BYTES = 1_800_000
+DEFAULT_MAX_CONCURRENCY = 8
+REQUEST_CHARGE_HEADER = "x-ms-request-charge"
+# Upper bound on the JSON length of a float and its separator, for sizing vectors without serializing them.
+FLOAT_JSON_BYTES = 25
+
+
+def transcript_digest(call_transcript):
+    """SHA-256 of the normalized transcript text."""
+
+    return hashlib.sha256(normalize_text(call_transcript).encode("utf-8")).hexdigest()
+
+
+def make_call_id(call_transcript):
+    """Stable call ID for a transcript: the first 48 bits of its digest, which fit a JSON number exactly."""
+
+    return int(transcript_digest(call_transcript)[:12], 16)
+
+
+def make_transcript_item(call_transcript, request_vector):
+    """Build the CallTranscripts document for a transcript, with IDs derived from its text."""
+
+    digest = transcript_digest(call_transcript)
+    return {
+        "id": digest,
+        "call_id": int(digest[:12], 16),
+        "call_transcript": call_transcript,
+        "request_vector": request_vector
+    }
+
+
+class RequestCharge:
+    """Thread-safe total of the request units reported by Cosmos DB responses.
+    Pass hook as the response_hook keyword of a container call."""
+
+    def __init__(self):
+        self.total = 0.0
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def hook(self, headers, _result=None):
+        charge = float(headers.get(REQUEST_CHARGE_HEADER, 0) or 0)
+        with self._lock:
+            self.total += charge
+            self.requests += 1
+
+
+def is_transcript_stored(container, call_transcript, local_index=None, request_charge=None):
+    """Return True if the document for this transcript is already saved.
+    The local transcript index is checked first; otherwise a point read costs about one RU."""
+
+    digest = transcript_digest(call_transcript)
+    if local_index is not None and digest in local_index:
+        return True
+    hook = request_charge.hook if request_charge is not None else None
+    try:
+        container.read_item(item=digest, partition_key=int(digest[:12], 16), response_hook=hook)
+    except cosmos_exceptions.CosmosResourceNotFoundError:
+        return False
+    return True
+
+
+def estimate_document_bytes(document):
+    """Upper bound on a document's JSON size. Lists of numbers, such as embeddings, are
+    sized from their length, which is much faster than serializing them."""
+
+    size = 0
+    fields = {}
+    for field, value in document.items():
+        if isinstance(value, list) and value and isinstance(value[0], (int, float)):
+            size += len(field) + 4 + FLOAT_JSON_BYTES * len(value)
+        else:
+            fields[field] = value
+    return size + len(json.dumps(fields, default=str))
+
+
+def make_batches(documents, partition_key_field="call_id", max_operations=MAX_BATCH_OPERATIONS,
+                 max_bytes=MAX_BATCH_BYTES):
+    """Group documents by partition key into batches within the operation and payload limits.
+    Returns a list of (partition_key, documents) pairs."""
+
+    by_partition = {}
+    for item in documents:
+        by_partition.setdefault(item[partition_key_field], []).append(item)
+
+    batches = []
+    for partition_key, items in by_partition.items():
+        batch = []
+        batch_bytes = 0
+        for item in items:
+            size = estimate_document_bytes(item)
+            if batch and (len(batch) >= max_operations or batch_bytes + size > max_bytes):
+                batches.append((partition_key, batch))
+                batch = []
+                batch_bytes = 0
+            batch.append(item)
+            batch_bytes += size
+        batches.append((partition_key, batch))
+    return batches
+
+
+def save_transcripts(container, transcript_items, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+    """Upsert transcript documents in transactional batches per partition key.
+    Returns the number of documents and batches written and the request charge in RUs."""
+
+    transcript_items = list({item["id"]: item for item in transcript_items}.values())
+    batches = make_batches(transcript_items)
+    request_charge = RequestCharge()
+
+    def write(batch):
+        partition_key, items = batch
+        container.execute_item_batch(
+            batch_operations=[("upsert", (item,)) for item in items],
+            partition_key=partition_key,
+            response_hook=request_charge.hook
+        )
+
+    if batches:
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(batches))) as executor:
+            # list() re-raises the first failed batch.
+            list(executor.map(write, batches))
+    return {"documents": len(transcript_items), "batches": len(batches), "request_charge": request_charge.total}
@@ -0,0 +1,260 @@
+"""Compact encodings of embedding vectors, and a local index searched through them.
+
+An ada-002 embedding is 1536 float32 values: 6 KB in memory and about 34 KB
+as the JSON list Cosmos DB stores. Two codecs shrink it:
+
+- float16 halves the memory. In a document, each value is written with the
+  few digits float16 keeps, which makes the JSON list less than half the size.
+  NumPy converts float16 slowly, so scanning it takes longer than float32.
+- int8 keeps one signed byte per value and a float32 scale factor per vector,
+  the largest magnitude in it divided by 127, which is a quarter of the memory.
+  In a document the list is of small integers, a fifth of the size, with the
+  scale stored next to it.
+
+VectorCodec can also reduce the dimensions with PCA, fitted with
+scikit-learn on a sample of the vectors, before quantizing. With 256
+components and int8 a vector is 260 bytes, and the scan is several times
+faster than an exact search, but its ranking is rougher.
+
+CompactIndex is searched in two steps. The compact codes, which are small
+enough to stay in memory, are scanned for the rerank best candidates, and
+only those are scored exactly against the full float32 vectors of the
+VectorIndex it was built from. That matrix is memory-mapped, so only the
+pages of those rows are read. The similarity scores returned are exact.
+
+    python -m benchmarks.bench_vector_codec
+
+reports the memory and document size of each codec against recall@k, with
+and without the exact re-ranking."""
+
+import json
+import os
+import threading
+
+import numpy as np
+
+from core.lazy import lazy_module
+from core.vector_index import normalize_rows, top_k
+
+# Only fit() needs scikit-learn; loading a codec to search with it does not.
+decomposition = lazy_module("sklearn.decomposition")
+
+CODECS = ("float32", "float16", "int8")
+INT8_MAX = 127
+# PCA is fitted on at most this many vectors.
+MAX_TRAINING_SAMPLES = 20_000
+# Candidates from the compact scan that are scored exactly.
+DEFAULT_RERANK = 100
+# Values converted to float32 at a time during the compact scan: 2 MB, which stays in cache.
+SCAN_BLOCK_VALUES = 2**19
+
+
+def check_codec(kind):
+    if kind not in CODECS:
+        raise ValueError(f"Unknown vector codec {kind!r}; expected one of {', '.join(CODECS)}.")
+    return kind
+
+
+def quantize(vectors, kind):
+    """Encode the rows of vectors with codec kind. Returns the codes and the
+    per-row scale factors that multiply them back, which are 1.0 unless kind is int8."""
+
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    scales = np.ones(len(vectors), dtype=np.float32)
+    if check_codec(kind) == "float32":
+        return vectors, scales
+    if kind == "float16":
+        return vectors.astype(np.float16), scales
+    largest = np.abs(vectors).max(axis=1)
+    scales = np.where(largest > 0, largest / INT8_MAX, 1.0).astype(np.float32)
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales
+
+
+def dequantize(codes, scales):
+    """Return the float32 vectors that codes and scales, from quantize(), stand for."""
+
+    return np.asarray(codes, dtype=np.float32) * np.asarray(scales, dtype=np.float32)[:, None]
+
+
+def encode_document_vector(vector, kind="float32"):
+    """Return a vector as it is stored in a Cosmos DB document with codec kind: a
+    JSON-ready list, and the scale factor to store with it, or None unless kind is int8."""
+
+    if check_codec(kind) == "float32":
+        return [float(value) for value in vector], None
+    codes, scales = quantize(vector, kind)
+    if kind == "float16":
+        # str() of a float16 is the shortest text that reads back as the same float16.
+        return [float(str(value)) for value in codes[0]], None
+    return codes[0].tolist(), float(scales[0])
+
+
+def decode_document_vector(values, scale=None):
+    """Return the float32 vector of a list from encode_document_vector() and its scale."""
+
+    vector = np.asarray(values, dtype=np.float32)
+    return vector * np.float32(scale) if scale is not None else vector
+
+
+class VectorCodec:
+    """Scalar quantization of unit-length vectors, optionally after a PCA projection."""
+
+    def __init__(self, kind="int8", mean=None, components=None):
+        self.kind = check_codec(kind)
+        self.mean = mean
+        self.components = components
+
+    @property
+    def dimensions(self):
+        return None if self.components is None else len(self.components)
+
+    @classmethod
+    def fit(cls, vectors, kind="int8", components=None, seed=42):
+        """Return a codec for vectors, with a PCA projection to components dimensions when it is set."""
+
+        if not components:
+            return cls(kind)
+        vectors = normalize_rows(vectors)
+        if len(vectors) > MAX_TRAINING_SAMPLES:
+            rng = np.random.default_rng(seed)
+            vectors = vectors[rng.choice(len(vectors), MAX_TRAINING_SAMPLES, replace=False)]
+        pca = decomposition.PCA(n_components=min(components, *vectors.shape), random_state=seed).fit(vectors)
+        return cls(kind, pca.mean_.astype(np.float32), pca.components_.astype(np.float32))
+
+    def project(self, vectors):
+        """Normalize vectors and, with PCA, project them, centred, onto the components."""
+
+        vectors = normalize_rows(vectors)
+        if self.components is None:
+            return vectors
+        return (vectors - self.mean) @ self.components.T
+
+    def project_query(self, query_vector):
+        # The query is not centred: (x - mean) . q differs from x . q by
+        # mean . q, which is the same for every row, so the ranking is unchanged.
+        query = normalize_rows(query_vector)[0]
+        return query if self.components is None else self.components @ query
+
+    def encode(self, vectors):
+        """Return the codes and scale factors of vectors."""
+
+        return quantize(self.project(vectors), self.kind)
+
+    def scores(self, codes, scales, query_vector):
+        """Approximate similarity of query_vector to every encoded row, for ranking them."""
+
+        query = self.project_query(query_vector)
+        scores = np.empty(len(codes), dtype=np.float32)
+        block_rows = max(1, SCAN_BLOCK_VALUES // len(query))
+        for start in range(0, len(codes), block_rows):
+            block = codes[start:start + block_rows]
+            scores[start:start + len(block)] = block.astype(np.float32, copy=False) @ query
+        return scores * scales
+
+    def bytes_per_vector(self, dimensions):
+        """Memory of one encoded vector of the given dimensions, scale factor included."""
+
+        dimensions = self.dimensions or dimensions
+        return dimensions * np.dtype(self.kind).itemsize + (4 if self.kind == "int8" else 0)
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "codec.json"), "w", encoding="utf-8") as f:
+            json.dump({"kind": self.kind}, f)
+        if self.components is not None:
+            np.save(os.path.join(directory, "pca_mean.npy"), self.mean)
+            np.save(os.path.join(directory, "pca_components.npy"), self.components)
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, "codec.json"), encoding="utf-8") as f:
+            kind = json.load(f)["kind"]
+        if not os.path.exists(os.path.join(directory, "pca_components.npy")):
+            return cls(kind)
+        return cls(kind, np.load(os.path.join(directory, "pca_mean.npy")),
+                   np.load(os.path.join(directory, "pca_components.npy")))
+
+
+class CompactIndex:
+    """Compact codes of the vectors of a VectorIndex, searched with exact re-ranking.
+    Rows appended to the VectorIndex after build() are encoded when the next search sees them."""
+
+    def __init__(self, codec, exact_index, codes, scales, rerank=DEFAULT_RERANK):
+        self.codec = codec
+        self.rerank = rerank
+        self._exact_index = exact_index
+        self._codes = codes
+        self._scales = scales
+        # The index is shared by every session; one thread at a time encodes appended rows.
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._codes)
+
+    @classmethod
+    def build(cls, exact_index, kind="int8", components=None, rerank=DEFAULT_RERANK):
+        """Fit a codec to the vectors of exact_index and encode them all."""
+
+        vectors = exact_index.vectors()
+        if not len(vectors):
+            raise ValueError("The exact index has no vectors to build a compact index from.")
+        codec = VectorCodec.fit(vectors, kind, components)
+        codes, scales = codec.encode(vectors)
+        return cls(codec, exact_index, codes, scales, rerank)
+
+    def memory_bytes(self):
+        return self._codes.nbytes + self._scales.nbytes
+
+    def _catch_up(self):
+        """Encode the rows appended to the exact index since the last search, and return
+        the vectors, codes and scale factors as of now, all with the same number of rows."""
+
+        with self._lock:
+            vectors = self._exact_index.vectors()
+            if len(vectors) > len(self._codes):
+                codes, scales = self.codec.encode(vectors[len(self._codes):])
+                self._codes = np.concatenate([self._codes, codes])
+                self._scales = np.concatenate([self._scales, scales])
+            return vectors, self._codes, self._scales
+
+    def search(self, query_vector, max_results=5, minimum_similarity_score=0.0, rerank=None):
+        """Return up to max_results items with exact cosine similarity at or above
+        minimum_similarity_score, best first, shaped like VectorIndex.search() results.
+        Only the best rerank rows of the compact scan are scored exactly."""
+
+        self._exact_index.refresh()
+        vectors, codes, scales = self._catch_up()
+        if not len(vectors):
+            return []
+        rerank = max(rerank or self.rerank, max_results)
+        candidates = top_k(self.codec.scores(codes, scales, query_vector), rerank)
+        candidates.sort()
+        query = normalize_rows(query_vector)[0]
+        # Sorted rows read the memory-mapped matrix front to back.
+        exact = vectors[candidates] @ query
+        results = []
+        for position in top_k(exact, max_results):
+            score = float(exact[position])
+            if score < minimum_similarity_score:
+                break
+            results.append({**self._exact_index.item(int(candidates[position])), "SimilarityScore": score})
+        return results
+
+    def save(self, directory):
+        """Save the codec and the codes; the full vectors stay in the VectorIndex."""
+
+        self.codec.save(directory)
+        np.save(os.path.join(directory, "codes.npy"), self._codes)
+        np.save(os.path.join(directory, "scales.npy"), self._scales)
+
+    @classmethod
+    def exists(cls, directory):
+        return os.path.exists(os.path.join(directory, "codes.npy"))
+
+    @classmethod
+    def load(cls, directory, exact_index, rerank=None):
+        codec = VectorCodec.load(directory)
+        codes = np.load(os.path.join(directory, "codes.npy"))
+        scales = np.load(os.path.join(directory, "scales.npy"))
+        return cls(codec, exact_index, codes, scales, rerank or DEFAULT_RERANK)
@@ -0,0 +1,245 @@
+"""In-process exact vector index persisted as memory-mapped .npy files.
+
+Vectors are L2-normalized and stored as one contiguous float32 matrix, so a
+cosine-similarity search is a single matrix-vector product followed by
+argpartition for the top k. The matrix lives in vectors.npy and is opened with
+mmap_mode, so a new replica starts by mapping the file rather than reading and
+copying it. Appends write straight into the mapped file, which grows by
+doubling its capacity when it fills up.
+
+Files in the index directory:
+- vectors.npy: float32 matrix with room for capacity rows.
+- items.jsonl: one JSON object of metadata per row, in row order. Lines after the
+  first count, left by an append that did not finish, are ignored and overwritten.
+- meta.json: row count, capacity, dimensions, whether the index holds a complete copy
+  of its source, and a generation number that goes up with each change. It is
+  replaced atomically after each change, and other processes reload the index
+  when they see a new generation."""
+
+import json
+import os
+import threading
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only safe from a single process.
+    fcntl = None
+
+INITIAL_CAPACITY = 1024
+
+
+def normalize_rows(vectors):
+    """Return vectors as a float32 matrix with unit-length rows."""
+
+    matrix = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k(scores, k):
+    """Return the indexes of the k highest scores, best first."""
+
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class _FileLock:
+    """Advisory lock so that only one process appends at a time."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, "a")
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+
+
+class VectorIndex:
+    """Exact cosine-similarity index over vectors with JSON metadata."""
+
+    def __init__(self, directory, dimensions=None):
+        self.directory = directory
+        self.dimensions = dimensions
+        self._lock = threading.RLock()
+        self._matrix = None
+        self._items = []
+        self._ids = {}
+        self._count = 0
+        self._capacity = 0
+        self._generation = 0
+        # Size of the first count lines of items.jsonl.
+        self._items_bytes = 0
+        self._loaded = False
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _read_meta(self):
+        try:
+            with open(self._path("meta.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _load(self):
+        meta = self._read_meta()
+        if meta is None:
+            return
+        self.dimensions = meta["dimensions"]
+        self._count = meta["count"]
+        self._capacity = meta["capacity"]
+        self._loaded = meta.get("loaded", False)
+        self._generation = meta.get("generation", 0)
+        if not self._capacity:
+            return
+        self._matrix = np.load(self._path("vectors.npy"), mmap_mode="r+")
+        self._items = []
+        self._items_bytes = 0
+        with open(self._path("items.jsonl"), "rb") as f:
+            for line in f:
+                if len(self._items) == self._count:
+                    break
+                self._items.append(json.loads(line))
+                self._items_bytes += len(line)
+        self._ids = {item["id"]: row for row, item in enumerate(self._items)}
+
+    def refresh(self):
+        """Pick up rows appended by other processes since this index was loaded."""
+
+        meta = self._read_meta()
+        if meta is not None and meta.get("generation", 0) != self._generation:
+            with self._lock:
+                self._load()
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, item_id):
+        return item_id in self._ids
+
+    @property
+    def loaded(self):
+        """True once mark_loaded() has been called, by this process or another."""
+
+        self.refresh()
+        return self._loaded
+
+    def mark_loaded(self):
+        """Record that the index holds every item of its source, not only the ones appended since."""
+
+        with self._lock, _FileLock(self._path("index.lock")):
+            self.refresh()
+            self._loaded = True
+            self._write_meta()
+
+    def _write_meta(self):
+        meta = {"count": self._count, "capacity": self._capacity, "dimensions": self.dimensions,
+                "loaded": self._loaded, "generation": self._generation + 1}
+        temp_path = self._path("meta.json.tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(temp_path, self._path("meta.json"))
+        self._generation += 1
+
+    def _ensure_capacity(self, needed):
+        if self._matrix is not None and needed <= self._capacity:
+            return
+        capacity = max(INITIAL_CAPACITY, self._capacity)
+        while capacity < needed:
+            capacity *= 2
+        temp_path = self._path("vectors.npy.tmp")
+        grown = np.lib.format.open_memmap(temp_path, mode="w+", dtype=np.float32,
+                                          shape=(capacity, self.dimensions))
+        if self._count:
+            grown[:self._count] = self._matrix[:self._count]
+        grown.flush()
+        del grown
+        os.replace(temp_path, self._path("vectors.npy"))
+        self._matrix = np.load(self._path("vectors.npy"), mmap_mode="r+")
+        self._capacity = capacity
+
+    def add(self, items, vectors):
+        """Append items (dicts with a unique "id") and their vectors.
+        Items whose id is already in the index are skipped. Returns the number added."""
+
+        vectors = normalize_rows(vectors)
+        with self._lock, _FileLock(self._path("index.lock")):
+            self.refresh()
+            if self.dimensions is None:
+                self.dimensions = vectors.shape[1]
+            new_rows = [row for row, item in enumerate(items) if item["id"] not in self._ids]
+            if not new_rows:
+                return 0
+            self._ensure_capacity(self._count + len(new_rows))
+            start = self._count
+            self._matrix[start:start + len(new_rows)] = vectors[new_rows]
+            self._matrix.flush()
+            lines = [(json.dumps(items[row]) + "\n").encode("utf-8") for row in new_rows]
+            with open(self._path("items.jsonl"), "ab") as f:
+                # Drop any lines an earlier add wrote without publishing them,
+                # so that line n of the file stays the metadata of row n.
+                f.truncate(self._items_bytes)
+                f.writelines(lines)
+            for offset, row in enumerate(new_rows):
+                self._items.append(items[row])
+                self._ids[items[row]["id"]] = start + offset
+            self._items_bytes += sum(len(line) for line in lines)
+            self._count += len(new_rows)
+            # Readers only look at rows below count, so publishing it last keeps them consistent.
+            self._write_meta()
+            return len(new_rows)
+
+    def vectors(self):
+        """Return a read-only view of the stored vectors, without copying."""
+
+        if self._matrix is None:
+            return np.empty((0, self.dimensions or 0), dtype=np.float32)
+        view = self._matrix[:self._count].view()
+        view.flags.writeable = False
+        return view
+
+    def item(self, row):
+        return self._items[row]
+
+    def items(self):
+        """Return the metadata of every row, in row order."""
+
+        return list(self._items)
+
+    def search(self, query_vector, max_results=5, minimum_similarity_score=0.0):
+        """Return up to max_results items with cosine similarity at or above
+        minimum_similarity_score, best first. Each result is the item's metadata
+        plus a SimilarityScore field."""
+
+        self.refresh()
+        with self._lock:
+            if not self._count:
+                return []
+            query = normalize_rows(query_vector)[0]
+            scores = self.vectors() @ query
+            results = []
+            for row in top_k(scores, max_results):
+                score = float(scores[row])
+                if score < minimum_similarity_score:
+                    break
+                results.append({**self._items[row], "SimilarityScore": score})
+            return results
@@ -0,0 +1,258 @@
+"""Shared HTTP client for the ContosoSuitesWebAPI.
+
+The sync client keeps a pool of keep-alive connections (HTTP/2 where the
+server offers it) that every page reuses. The async path fans out many
+requests at once, for example the bookings of every hotel, with a bound on
+how many are in flight. Both paths share the same retry and timeout policies.
+
+The client returned by get_webapi_client() sends its requests on the shared
+service loop from core.services, under the process-wide Web API concurrency
+limit and deadline, instead of starting an event loop for every batch."""
+
+import asyncio
+import random
+import re
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+import httpx
+import streamlit as st
+
+# Status codes that are safe to retry: throttling and transient gateway errors.
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+# Path segments that are IDs or dates, folded together so every hotel's bookings share one metric.
+PATH_PARAMETER = re.compile(r"/\d[^/]*")
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """How many times to retry a request and how long to wait between attempts."""
+
+    max_attempts: int = 3
+    backoff_seconds: float = 0.5
+    max_backoff_seconds: float = 8.0
+    retry_on_status: tuple = RETRYABLE_STATUS_CODES
+
+    def should_retry(self, attempt, response=None, error=None):
+        if attempt >= self.max_attempts:
+            return False
+        if error is not None:
+            return isinstance(error, (httpx.TransportError, httpx.TimeoutException))
+        return response.status_code in self.retry_on_status
+
+    def delay(self, attempt, response=None):
+        """Seconds to wait before the next attempt.
+        Honors a Retry-After header; otherwise uses jittered exponential backoff."""
+
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    return min(float(retry_after), self.max_backoff_seconds)
+                except ValueError:
+                    pass
+        backoff = min(self.backoff_seconds * (2 ** (attempt - 1)), self.max_backoff_seconds)
+        return random.uniform(0, backoff)
+
+
+@dataclass(frozen=True)
+class TimeoutPolicy:
+    """Per-request timeouts, in seconds."""
+
+    connect: float = 5.0
+    read: float = 10.0
+    write: float = 10.0
+    pool: float = 5.0
+
+    def to_httpx(self):
+        return httpx.Timeout(connect=self.connect, read=self.read, write=self.write, pool=self.pool)
+
+
+@dataclass(frozen=True)
+class WebApiSettings:
+    """Connection settings for the Web API."""
+
+    base_url: str
+    verify: bool = True
+    http2: bool = True
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    max_concurrency: int = 8
+    retry: RetryPolicy = field(default_factory=RetryPolicy)
+    timeout: TimeoutPolicy = field(default_factory=TimeoutPolicy)
+
+    def limits(self):
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections
+        )
+
+
+def load_settings(verify=True):
+    """Build Web API settings from Streamlit secrets. Key assumptions:
+    - The Web API endpoint is stored in Streamlit secrets.
+    - Optional keys max_attempts, timeout and max_concurrency may override the defaults."""
+
+    api_secrets = st.secrets["api"]
+    return WebApiSettings(
+        base_url=api_secrets["endpoint"].rstrip("/"),
+        verify=verify,
+        max_concurrency=int(api_secrets.get("max_concurrency", 8)),
+        retry=RetryPolicy(max_attempts=int(api_secrets.get("max_attempts", 3))),
+        timeout=TimeoutPolicy(read=float(api_secrets.get("timeout", 10.0)))
+    )
+
+
+def build_client(settings):
+    """Create a pooled sync client for the Web API."""
+
+    return httpx.Client(
+        base_url=settings.base_url,
+        verify=settings.verify,
+        http2=settings.http2,
+        limits=settings.limits(),
+        timeout=settings.timeout.to_httpx()
+    )
+
+
+def build_async_client(settings):
+    """Create a pooled async client for the Web API."""
+
+    return httpx.AsyncClient(
+        base_url=settings.base_url,
+        verify=settings.verify,
+        http2=settings.http2,
+        limits=settings.limits(),
+        timeout=settings.timeout.to_httpx()
+    )
+
+
+def send_with_retry(client, policy, method, url, **kwargs):
+    """Send a request, retrying on transient failures according to policy."""
+
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            response = client.request(method, url, **kwargs)
+        except httpx.HTTPError as error:
+            if not policy.should_retry(attempt, error=error):
+                raise
+            time.sleep(policy.delay(attempt))
+            continue
+        if not policy.should_retry(attempt, response=response):
+            return response
+        time.sleep(policy.delay(attempt, response))
+
+
+@contextmanager
+def stream_with_retry(client, policy, method, url, **kwargs):
+    """Send a request and yield the response before its body has been read.
+    Retries happen only until a response is accepted, never partway through the body."""
+
+    attempt = 0
+    while True:
+        attempt += 1
+        request = client.build_request(method, url, **kwargs)
+        try:
+            response = client.send(request, stream=True)
+        except httpx.HTTPError as error:
+            if not policy.should_retry(attempt, error=error):
+                raise
+            time.sleep(policy.delay(attempt))
+            continue
+        if not policy.should_retry(attempt, response=response):
+            break
+        response.close()
+        time.sleep(policy.delay(attempt, response))
+    try:
+        yield response
+    finally:
+        response.close()
+
+
+async def send_with_retry_async(client, policy, method, url, **kwargs):
+    """Async version of send_with_retry()."""
+
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError as error:
+            if not policy.should_retry(attempt, error=error):
+                raise
+            await asyncio.sleep(policy.delay(attempt))
+            continue
+        if not policy.should_retry(attempt, response=response):
+            return response
+        await asyncio.sleep(policy.delay(attempt, response))
+
+
+class WebApiClient:
+    """Pooled, retrying client for the ContosoSuitesWebAPI routes."""
+
+    def __init__(self, settings, services=None):
+        self.settings = settings
+        self.services = services
+        self._client = build_client(settings)
+        # Built on the service loop the first time it is needed.
+        self._async_client = None
+
+    def request(self, method, path, **kwargs):
+        if self.services is not None:
+            return self.services.run(self._send(method, path, **kwargs))
+        return send_with_retry(self._client, self.settings.retry, method, path, **kwargs)
+
+    async def _send(self, method, path, **kwargs):
+        if self._async_client is None:
+            self._async_client = build_async_client(self.settings)
+        return await self.services.call(
+            "webapi", lambda _: self._async_client.request(method, path, **kwargs), retry=self.settings.retry,
+            name=f"{method} {PATH_PARAMETER.sub('/{id}', path)}")
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def stream(self, method, path, **kwargs):
+        """Context manager yielding a response whose body can be read as it arrives."""
+
+        return stream_with_retry(self._client, self.settings.retry, method, path, **kwargs)
+
+    def get_many(self, paths, **kwargs):
+        """GET every path concurrently and return the responses in the same order."""
+
+        if self.services is not None:
+            return self.services.run(self._send_many(paths, **kwargs))
+        return asyncio.run(self._get_many(paths, **kwargs))
+
+    async def _send_many(self, paths, **kwargs):
+        return await asyncio.gather(*(self._send("GET", path, **kwargs) for path in paths))
+
+    async def _get_many(self, paths, **kwargs):
+        semaphore = asyncio.Semaphore(self.settings.max_concurrency)
+        async with build_async_client(self.settings) as client:
+            async def fetch(path):
+                async with semaphore:
+                    return await send_with_retry_async(client, self.settings.retry, "GET", path, **kwargs)
+            return await asyncio.gather(*(fetch(path) for path in paths))
+
+    def close(self):
+        self._client.close()
+        if self._async_client is not None:
+            self.services.run(self._async_client.aclose())
+            self._async_client = None
+
+
+@st.cache_resource
+def get_webapi_client(verify=True):
+    """Return the shared Web API client for this process."""
+
+    # Imported here because core.services builds on this module's retry policy.
+    from core.services import get_service_layer
+
+    return WebApiClient(load_settings(verify), services=get_service_layer())
@@ -0,0 +1,92 @@
+"""Load the seed data in src/data into Cosmos DB with vector embeddings.
+
+Loads maintenance requests into MaintenanceRequests, user reviews into
+UserReviews and customers into Customers. The containers must already exist,
+with the vector policies from the workshop. Run it from this directory so the
+Streamlit secrets in .streamlit/secrets.toml are found:
+
+    python load_data.py maintenance reviews --max-concurrency 32
+
+A manifest in --manifest records what each run wrote; running the same
+command again only loads records that are new or have changed. --full
+reloads everything."""
+
+import argparse
+import json
+import os
+
+from core.bulk_load import (
+    CORPORA,
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_MANIFEST_PATH,
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_MAX_RETRIES,
+    LoadManifest,
+    load_corpus
+)
+from core.clients import get_bulk_cosmos_container
+from core.embeddings import get_embeddings
+
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("corpora", nargs="*", metavar="DATA_SET",
+                        help=f"Data sets to load, from {', '.join(sorted(CORPORA))}; all of them by default.")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR)
+    parser.add_argument("--file", help="Load this file instead of the data set's file in --data-dir.")
+    parser.add_argument("--container", help="Load into this container instead of the data set's default.")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST_PATH)
+    parser.add_argument("--full", action="store_true", help="Reload every record, changed or not.")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Records read and embedded at a time.")
+    parser.add_argument("--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help="Most batches in flight; the loader backs off below this when throttled.")
+    parser.add_argument("--max-retries", type=int, default=DEFAULT_MAX_RETRIES)
+    parser.add_argument("--json", action="store_true", help="Print the reports as JSON.")
+    args = parser.parse_args()
+    args.corpora = args.corpora or sorted(CORPORA)
+    unknown = sorted(set(args.corpora) - set(CORPORA))
+    if unknown:
+        parser.error(f"Unknown data set: {', '.join(unknown)}.")
+    if (args.file or args.container) and len(args.corpora) != 1:
+        parser.error("--file and --container need exactly one data set.")
+
+    manifest = LoadManifest(args.manifest)
+    reports = {}
+    try:
+        for name in args.corpora:
+            corpus = CORPORA[name]
+            if args.container:
+                corpus.container_name = args.container
+            if args.full:
+                manifest.clear(corpus.container_name)
+            path = args.file or os.path.join(args.data_dir, corpus.file_name)
+            reports[name] = load_corpus(
+                corpus, path, get_bulk_cosmos_container(corpus.container_name),
+                embed=get_embeddings,
+                manifest=manifest,
+                chunk_size=args.chunk_size,
+                max_concurrency=args.max_concurrency,
+                max_retries=args.max_retries,
+                progress=None if args.json else lambda counts: print(
+                    f"  {counts['read']} read, {counts['unchanged']} unchanged, {counts['written']} written",
+                    end="\r", flush=True)
+            )
+            if not args.json:
+                report = reports[name]
+                print(f"{name}: {report['read']} read, {report['unchanged']} unchanged, "
+                      f"{report['embedded']} embedded, {report['written']} written into {corpus.container_name} "
+                      f"in {report['elapsed_s']:.1f} s ({report['records_per_second']:.0f} records/s)")
+                print(f"  {report['request_charge']:.0f} RU, {report['throttles']} throttled, "
+                      f"{report['retries']} retries, {report['paused_s']:.1f} s paused, "
+                      f"concurrency {report['final_concurrency']} at the end")
+    finally:
+        manifest.close()
+    if args.json:
+        print(json.dumps(reports, indent=2))
+
+
+if __name__ == "__main__":
+    main()
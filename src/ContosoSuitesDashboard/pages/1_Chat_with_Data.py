@@ -1,6 +1,13 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
-import openai
-from azure.identity import DefaultAzureCredential, get_bearer_token_provider
+from core.chat_history import MAX_PROMPT_TOKENS, ChatHistory
+from core.clients import get_openai_client
+from core.semantic_cache import get_semantic_cache, show_cache_stats
+from core.rate_limit import BACKGROUND, estimate_chat_tokens
+from core.services import call_service, get_service_layer, show_rate_limit_stats
+from core.telemetry import instrumented, measure
+from core.streaming import render_stream
 
 st.set_page_config(layout="wide")
 
@@ -13,51 +20,126 @@ def create_chat_completion(messages):
     # Learn more about Streamlit secrets here: https://docs.streamlit.io/develop/concepts/connections/secrets-management
     # The secrets themselves are stored in the .streamlit/secrets.toml file.
 
-    token_provider = get_bearer_token_provider(
-        DefaultAzureCredential(), "https://cognitiveservices.azure.com/.default"
-    )
-    
-    aoai_endpoint = st.secrets["aoai"]["endpoint"]
     aoai_deployment_name = st.secrets["aoai"]["deployment_name"]
 
-    client = openai.AzureOpenAI(
-        azure_ad_token_provider=token_provider,
-        api_version="2024-06-01",
-        azure_endpoint = aoai_endpoint
-    )
+    messages = [
+        {"role": m["role"], "content": m["content"]}
+        for m in messages
+    ]
+
+    # Wait for the deployment's quota, ahead of any background work queued for it.
+    get_service_layer().admit(aoai_deployment_name, estimate_chat_tokens(messages))
+
+    # The client is built once per process and shared across reruns and sessions.
+    client = get_openai_client()
     # Create and return a new chat completion request
     return client.chat.completions.create(
         model=aoai_deployment_name,
-        messages=[
-            {"role": m["role"], "content": m["content"]}
-            for m in messages
-        ],
+        messages=messages,
         stream=True
     )
 
+def stream_chat_answer(messages):
+    """Yield the text of the answer to the last message as it arrives.
+    The answer to a question that opens a conversation comes from the shared
+    semantic cache when a question close enough in meaning was already answered."""
+
+    question = messages[-1]["content"]
+    # The answer to a follow-up depends on the conversation before it, which is
+    # rarely the same twice, so only opening questions are looked up and stored.
+    cache = get_semantic_cache() if len(messages) == 1 else None
+    scope = "chat-with-data"
+    answer = cache.lookup(question, scope) if cache is not None else None
+    if answer is not None:
+        yield answer
+        return
+
+    start = time.perf_counter()
+    full_response = ""
+    with measure("openai", "chat_stream"):
+        for response in create_chat_completion(messages):
+            if response.choices:
+                delta = response.choices[0].delta.content or ""
+                full_response += delta
+                yield delta
+    if full_response and cache is not None:
+        cache.store(question, full_response, scope, latency=time.perf_counter() - start)
+
+def summarize_conversation(summary, messages):
+    """Fold older chat messages into the running summary of the conversation.
+    Runs on a background thread, so it makes a plain, non-streaming request."""
+
+    aoai_deployment_name = st.secrets["aoai"]["deployment_name"]
+
+    conversation = "\n".join(f'{m["role"]}: {m["content"]}' for m in messages)
+    system = """
+        You maintain a running summary of a conversation between a user and an assistant.
+        Update the summary with the new messages. Keep names, numbers, decisions and
+        open questions. Write at most 200 words.
+    """
+    messages = [
+        {"role": "system", "content": system},
+        {"role": "user", "content": f"Current summary:\n{summary or '(none)'}\n\nNew messages:\n{conversation}"}
+    ]
+    # Sent through the shared service layer, so summaries count against the Azure OpenAI concurrency limit.
+    # They are background work, so they never hold up a chat answer while the quota runs short.
+    response = call_service("openai", lambda client: client.chat.completions.create(
+        model=aoai_deployment_name,
+        messages=messages
+    ), quota=aoai_deployment_name, tokens=estimate_chat_tokens(messages), priority=BACKGROUND,
+        name="conversation_summary")
+    return response.choices[0].message.content
+
+@st.cache_resource
+def get_summary_executor():
+    """Return the process-wide thread pool that folds old chat messages into summaries."""
+
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="chat-summary")
+
+def create_chat_history():
+    """Create the chat history for a session. The optional [chat_history]
+    secrets section may set max_prompt_tokens, the prompt budget for each turn."""
+
+    settings = st.secrets.get("chat_history", {})
+    return ChatHistory(
+        summarize=summarize_conversation,
+        executor=get_summary_executor(),
+        max_prompt_tokens=int(settings.get("max_prompt_tokens", MAX_PROMPT_TOKENS))
+    )
+
 def handle_chat_prompt(prompt):
     """Echo the user's prompt to the chat window.
     Then, send the user's prompt to Azure OpenAI and display the response."""
 
     # Echo the user's prompt to the chat window
-    st.session_state.messages.append({"role": "user", "content": prompt})
+    history = st.session_state.chat_history
+    history.append("user", prompt)
     with st.chat_message("user"):
         st.markdown(prompt)
  
     # Send the user's prompt to Azure OpenAI and display the response
     # The call to Azure OpenAI is handled in create_chat_completion()
-    # This function loops through the responses and displays them as they come in.
+    # The response is displayed as it comes in, re-rendered at most a few times
+    # a second and a paragraph at a time, rather than once per delta.
     # It also appends the full response to the chat history.
-    with st.chat_message("assistant"):
-        message_placeholder = st.empty()
-        full_response = ""
-        for response in create_chat_completion(st.session_state.messages):
-            if response.choices:
-                full_response += (response.choices[0].delta.content or "")
-                message_placeholder.markdown(full_response + "▌")
-        message_placeholder.markdown(full_response)
-    st.session_state.messages.append({"role": "assistant", "content": full_response})
+    # Only the recent messages that fit in the token budget are sent,
+    # after a summary of the older ones.
+    deltas = stream_chat_answer(history.prompt_messages())
+    full_response = render_stream(st.chat_message("assistant"), deltas)
+    history.append("assistant", full_response)
+
+def show_history_metrics(history):
+    """Show how many prompt tokens the history budget saved."""
 
+    if history.turns:
+        turn = history.turns[-1]
+        st.sidebar.metric("Prompt tokens, last turn", turn["prompt_tokens"],
+            delta=-turn["tokens_saved"], delta_color="inverse")
+        st.sidebar.metric("Prompt tokens saved, all turns", history.tokens_saved)
+        st.sidebar.caption(f'{turn["messages_sent"]} recent messages sent; '
+            f'{turn["messages_summarized"]} older messages summarized.')
+
+@instrumented("page", "Chat with Data")
 def main():
     """Main function for the Chat with Data Streamlit app."""
 
@@ -70,11 +152,12 @@ def main():
     )
 
     # Initialize chat history
-    if "messages" not in st.session_state:
-        st.session_state.messages = []
+    if "chat_history" not in st.session_state:
+        st.session_state.chat_history = create_chat_history()
+    history = st.session_state.chat_history
 
     # Display chat messages from history on app rerun
-    for message in st.session_state.messages:
+    for message in history.messages:
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
 
@@ -82,5 +165,9 @@ def main():
     if prompt := st.chat_input("Enter a message:"):
         handle_chat_prompt(prompt)
 
+    show_history_metrics(history)
+    show_cache_stats(get_semantic_cache())
+    show_rate_limit_stats()
+
 if __name__ == "__main__":
     main()
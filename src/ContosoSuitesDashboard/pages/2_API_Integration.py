@@ -1,29 +1,98 @@
-import requests
 import streamlit as st
+from core.bookings import (
+    DEFAULT_PAGE_SIZE,
+    PAGE_SIZES,
+    bookings_fingerprint,
+    fetch_bookings,
+    fetch_bookings_for_hotels,
+    filter_stays,
+    get_page,
+    page_count
+)
+from core.semantic_cache import get_semantic_cache, show_cache_stats
+from core.telemetry import instrumented
+from core.webapi import get_webapi_client
 
 st.set_page_config(layout="wide")
 
+# Bookings are fetched again after this many seconds. Each fetch is compared with
+# the last one, and cached answers about bookings are dropped when they differ.
+BOOKINGS_TTL_SECONDS = 300
+
 @st.cache_data
 def get_hotels():
-    """Return a list of hotels from the API."""
-    api_endpoint = st.secrets["api"]["endpoint"]
-    response = requests.get(f"{api_endpoint}/Hotels", timeout=10)
-    return response
+    """Return the hotels from the API, each a dict with id and name."""
+    response = get_webapi_client().get("/Hotels")
+    response.raise_for_status()
+    return [{"id": hotel["hotelID"], "name": hotel["hotelName"]} for hotel in response.json()]
 
-@st.cache_data
-def get_hotel_bookings(hotel_id):
-    """Return a list of bookings for the specified hotel."""
-    api_endpoint = st.secrets["api"]["endpoint"]
-    response = requests.get(f"{api_endpoint}/Hotels/{hotel_id}/Bookings", timeout=10)
-    return response
+@st.cache_data(ttl=BOOKINGS_TTL_SECONDS)
+def get_hotel_bookings(hotel_id, min_date=None):
+    """Return the bookings for the specified hotel as a DataFrame.
+    With min_date, the API only returns stays beginning on or after it."""
+    bookings = fetch_bookings(get_webapi_client(), hotel_id, min_date)
+    # Cached answers about bookings are dropped when these bookings differ from the last fetch of them.
+    get_semantic_cache().observe("bookings", bookings_fingerprint({hotel_id: bookings}),
+                                 source=("hotel", hotel_id, min_date))
+    return bookings
+
+@st.cache_data(ttl=BOOKINGS_TTL_SECONDS)
+def get_bookings_for_hotels(hotel_ids):
+    """Return the bookings for every specified hotel as DataFrames keyed by hotel ID.
+    The requests are sent concurrently, so this takes about as long as the slowest one."""
+    bookings_by_hotel = fetch_bookings_for_hotels(get_webapi_client(), hotel_ids)
+    # Cached answers about bookings are dropped when freshly fetched bookings differ from the last ones.
+    get_semantic_cache().observe("bookings", bookings_fingerprint(bookings_by_hotel), source=("hotels", hotel_ids))
+    return bookings_by_hotel
+
+def show_bookings(hotel_id, bookings_by_hotel):
+    """Show one page of a hotel's bookings, optionally limited to a range of stay dates."""
+    from_column, until_column, size_column = st.columns(3)
+    min_date = from_column.date_input("Stays from:", value=None, key="bookings_min_date")
+    max_date = until_column.date_input("Stays until:", value=None, key="bookings_max_date")
+    page_size = size_column.selectbox("Rows per page:", PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE))
+
+    # The start date is pushed down to the API; without one, the prefetched bookings are used.
+    bookings = get_hotel_bookings(hotel_id, min_date) if min_date else bookings_by_hotel[hotel_id]
+    bookings = filter_stays(bookings, max_date)
+
+    # Only the current page is sent to the browser.
+    pages = page_count(bookings, page_size)
+    # Go back to the first page whenever the hotel, dates or page size change.
+    view = (hotel_id, min_date, max_date, page_size)
+    if st.session_state.get("bookings_view") != view:
+        st.session_state.bookings_view = view
+        st.session_state.bookings_page = 1
+    page = st.number_input("Page:", min_value=1, max_value=pages, step=1, key="bookings_page")
+    rows = get_page(bookings, page, page_size)
+    st.dataframe(
+        rows,
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            "bookingID": st.column_config.NumberColumn("Booking", format="%d"),
+            "customerID": st.column_config.NumberColumn("Customer", format="%d"),
+            "hotelID": st.column_config.NumberColumn("Hotel", format="%d"),
+            "stayBeginDate": st.column_config.DateColumn("Stay begins"),
+            "stayEndDate": st.column_config.DateColumn("Stay ends"),
+            "numberOfGuests": st.column_config.NumberColumn("Guests")
+        }
+    )
+    if len(rows):
+        first_row = (page - 1) * page_size + 1
+        st.caption(f"Bookings {first_row}-{first_row + len(rows) - 1} of {len(bookings)}")
 
-@st.cache_data
 def invoke_chat_endpoint(question):
-    """Invoke the chat endpoint with the specified question."""
-    api_endpoint = st.secrets["api"]["endpoint"]
-    response = requests.post(f"{api_endpoint}/Chat", data={"message": question}, timeout=10)
-    return response
+    """Invoke the chat endpoint with the specified question and return the answer text.
+    Answers are shared across sessions, and a question close enough in meaning
+    to one already answered reuses its answer instead of calling the endpoint."""
+    def ask():
+        response = get_webapi_client().post("/Chat", data={"message": question})
+        response.raise_for_status()
+        return response.text
+    return get_semantic_cache().get_or_compute(question, ask, scope="bookings-chat", tags=("bookings",))
 
+@instrumented("page", "API Integration")
 def main():
     """Main function for the Chat with Data Streamlit app."""
 
@@ -39,19 +108,24 @@ def main():
     """
     )
 
+    # Fetch the bookings again, dropping cached answers if they changed.
+    if st.sidebar.button("Refresh bookings"):
+        get_hotel_bookings.clear()
+        get_bookings_for_hotels.clear()
+
     # Display the list of hotels as a drop-down list
-    hotels_json = get_hotels().json()
-    # Reshape hotels to an object with hotelID and hotelName
-    hotels = [{"id": hotel["hotelID"], "name": hotel["hotelName"]} for hotel in hotels_json]
-    
+    hotels = get_hotels()
+
     selected_hotel = st.selectbox("Hotel:", hotels, format_func=lambda x: x["name"])
 
-    # Display the list of bookings for the selected hotel as a table
+    # Warm the bookings for every hotel in the drop-down list at once,
+    # so switching hotels does not cost another round trip.
+    bookings_by_hotel = get_bookings_for_hotels(tuple(hotel["id"] for hotel in hotels))
+
+    # Display the bookings for the selected hotel a page at a time
     if selected_hotel:
-        hotel_id = selected_hotel["id"]
-        bookings = get_hotel_bookings(hotel_id).json()
         st.write("### Bookings")
-        st.table(bookings)
+        show_bookings(selected_hotel["id"], bookings_by_hotel)
 
     st.write(
         """
@@ -66,11 +140,13 @@ def main():
     if st.button("Submit"):
         with st.spinner("Calling Chat endpoint..."):
             if question:
-                response = invoke_chat_endpoint(question)
-                st.write(response.text)
+                answer = invoke_chat_endpoint(question)
+                st.write(answer)
                 st.success("Chat endpoint called successfully.")
             else:
                 st.warning("Please enter a question.")
 
+    show_cache_stats(get_semantic_cache())
+
 if __name__ == "__main__":
     main()
@@ -1,21 +1,21 @@
-import requests
 import streamlit as st
+from core.telemetry import instrumented
+from core.webapi import get_webapi_client
 
 st.set_page_config(layout="wide")
 
 def handle_query_vectorization(query):
     """Vectorize the query using the Vectorize endpoint."""
-    api_endpoint = st.secrets["api"]["endpoint"]
-    response = requests.get(f"{api_endpoint}/Vectorize", params={"text": query}, timeout=10, verify=False)
+    response = get_webapi_client(verify=False).get("/Vectorize", params={"text": query})
     return response.text
 
 def handle_vector_search(query_vector, max_results=5, minimum_similarity_score=0.8):
     """Perform a vector search using the VectorSearch endpoint."""
-    api_endpoint = st.secrets["api"]["endpoint"]
     headers = {"Content-Type": "application/json"}
-    response = requests.post(f"{api_endpoint}/VectorSearch", data=query_vector, params={"max_results": max_results, "minimum_similarity_score": minimum_similarity_score}, headers=headers, timeout=10, verify=False)
+    response = get_webapi_client(verify=False).post("/VectorSearch", content=query_vector, params={"max_results": max_results, "minimum_similarity_score": minimum_similarity_score}, headers=headers)
     return response
 
+@instrumented("page", "Vector Search")
 def main():
     """Main function for the Vector Search over Maintenance Requests Streamlit page."""
 
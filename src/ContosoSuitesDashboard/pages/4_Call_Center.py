@@ -1,205 +1,510 @@
 import json
+import queue
 import time
-import re
-import uuid
+from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
-from scipy.io import wavfile
-import azure.cognitiveservices.speech as speechsdk
-from azure.ai.textanalytics import TextAnalyticsClient
-from azure.core.credentials import AzureKeyCredential
-from azure.ai.textanalytics import ExtractiveSummaryAction, AbstractiveSummaryAction
-from azure.cosmos import CosmosClient
-from azure.identity import DefaultAzureCredential, get_bearer_token_provider
-import openai
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+# textanalytics is the Language SDK, imported when the first action is built.
+from core.clients import get_cosmos_container, get_speech_config, textanalytics
+from core.audio import stream_transcription
+from core.embeddings import get_embedding
+from core.result_cache import audio_content_hash, get_result_cache, make_key, shared_result
+from core.rate_limit import estimate_chat_tokens
+from core.services import analyze_actions, call_service, show_rate_limit_stats, submit_service
+from core.telemetry import instrumented
+from core.summarization import (
+    MAX_CHUNK_CHARACTERS,
+    MAX_CHUNK_TOKENS,
+    MAX_IN_FLIGHT,
+    MapReduceSummarizer,
+    TranscriptChunker
+)
+from core.transcript_index import add_transcripts_to_index, encode_transcript_vector, get_transcript_index
+from core.transcript_store import is_transcript_stored, make_transcript_item, save_transcripts
+from core.webapi import RetryPolicy
 
 
 st.set_page_config(layout="wide")
 
-@st.cache_data
-def create_transcription_request(audio_file, speech_recognition_language="en-US"):
-    """Transcribe the contents of an audio file. Key assumptions:
-    - The audio file is in WAV format.
-    - The audio file is mono.
-    - The audio file has a sample rate of 16 kHz.
-    - Speech key and region are stored in Streamlit secrets."""
-
-    speech_key = st.secrets["speech"]["key"]
-    speech_region = st.secrets["speech"]["region"]
-
-    # Create an instance of a speech config with specified subscription key and service region.
-    speech_config = speechsdk.SpeechConfig(subscription=speech_key, region=speech_region)
-    speech_config.speech_recognition_language=speech_recognition_language
+# Documents sent to the Language service in one summarization job.
+# Long calls are spread over several concurrent jobs.
+LANGUAGE_SERVICE_BATCH_SIZE = 5
 
-    # Prepare audio settings for the wave stream
-    channels = 1
-    bits_per_sample = 16
-    samples_per_second = 16000
+# Session state keys holding results derived from the current transcript.
+ANALYSIS_RESULT_KEYS = ("compliance_results", "extractive_summary", "abstractive_summary",
+    "openai_summary", "sentiment_and_mined_opinions", "embedding_status")
 
-    # Create audio configuration using the push stream
-    wave_format = speechsdk.audio.AudioStreamFormat(samples_per_second, bits_per_sample, channels)
-    stream = speechsdk.audio.PushAudioInputStream(stream_format=wave_format)
-    audio_config = speechsdk.audio.AudioConfig(stream=stream)
-
-    transcriber = speechsdk.transcription.ConversationTranscriber(speech_config, audio_config)
-    all_results = []
-
-    def handle_final_result(evt):
-        all_results.append(evt.result.text)
+def stream_transcription_request(audio_file, speech_recognition_language="en-US"):
+    """Transcribe the contents of an audio file, yielding each transcript segment as it is finalized.
+    Key assumptions:
+    - The audio file is in PCM WAV format. Stereo audio and other sample
+        rates are downmixed and resampled to 16 kHz mono as it streams.
+    - Speech key and region are stored in Streamlit secrets."""
 
-    done = False
+    # Get the shared speech config for the requested recognition language.
+    speech_config = get_speech_config(speech_recognition_language)
 
-    def stop_cb(evt):
-        print(f'CLOSING on {evt}')
-        nonlocal done
-        done= True
+    # The file is read in fixed-size frames through a memoryview and pushed to
+    # the transcriber as it goes, so the whole call is never copied into memory.
+    yield from stream_transcription(audio_file, speech_config)
 
-    # TODO: Subscribe to the events fired by the conversation transcriber
-    # TODO: stop continuous transcription on either session stopped or canceled events
+def create_transcription_request(audio_file, speech_recognition_language="en-US"):
+    """Transcribe the contents of an audio file and return all transcript segments.
+    Key assumptions are the same as for stream_transcription_request().
+    Transcripts are shared by every replica through the result cache, so a file
+    is transcribed once no matter how often or where it is uploaded."""
+
+    # The Speech SDK blocks, so the transcription runs on a worker thread under the speech concurrency limit.
+    return get_result_cache().get_or_compute(
+        transcription_cache_key(audio_file, speech_recognition_language),
+        lambda: call_service(
+            "speech",
+            lambda _: list(stream_transcription_request(audio_file, speech_recognition_language)),
+            blocking=True,
+            name="transcription"
+        )
+    )
 
-    # TODO: remove this placeholder code and perform the actual transcription
-    all_results = ['This is a test.', 'Fill in with real transcription.']
+def transcription_cache_key(audio_file, speech_recognition_language="en-US"):
+    """Result cache key for a transcription: a hash of the audio bytes and the recognition language."""
 
-    return all_results
+    return make_key("transcription", audio_content_hash(audio_file), speech_recognition_language)
 
 def make_azure_openai_chat_request(system, call_contents):
     """Create and return a new chat completion request. Key assumptions:
     - Azure OpenAI endpoint, key, and deployment name stored in Streamlit secrets."""
 
-    token_provider = get_bearer_token_provider(
-        DefaultAzureCredential(), "https://cognitiveservices.azure.com/.default"
-    )
-    
-    aoai_endpoint = st.secrets["aoai"]["endpoint"]
     aoai_deployment_name = st.secrets["aoai"]["deployment_name"]
 
-    client = openai.AzureOpenAI(
-        azure_ad_token_provider=token_provider,
-        api_version="2024-06-01",
-        azure_endpoint = aoai_endpoint
-    )
-    # Create and return a new chat completion request
-    return client.chat.completions.create(
+    messages = [
+        {"role": "system", "content": system},
+        {"role": "user", "content": call_contents}
+    ]
+
+    # The request runs on the shared service loop, under the Azure OpenAI concurrency limit and deadline,
+    # once the deployment's quota admits it.
+    return call_service("openai", lambda client: client.chat.completions.create(
         model=aoai_deployment_name,
-        messages=[
-            {"role": "system", "content": system},
-            {"role": "user", "content": call_contents}
-        ],
-    )
+        messages=messages,
+    ), quota=aoai_deployment_name, tokens=estimate_chat_tokens(messages), name="chat")
 
 @st.cache_data
+@shared_result("compliance")
 def is_call_in_compliance(call_contents, include_recording_message, is_relevant_to_topic):
     """Analyze a call for relevance and compliance."""
 
-    return "This is a placeholder result. Fill in with real compliance analysis."
+    joined_call_contents = ' '.join(call_contents)
+    if include_recording_message:
+        include_recording_message_text = "2. Was the caller aware that the call was being recorded?"
+    else:
+        include_recording_message_text = ""
+
+    if is_relevant_to_topic:
+        is_relevant_to_topic_text = "3. Was the call relevant to the hotel and resort industry?"
+    else:
+        is_relevant_to_topic_text = ""
+
+    system = f"""
+        You are an automated analysis system for Contoso Suites.
+        Contoso Suites is a luxury hotel and resort chain with locations
+        in a variety of Caribbean nations and territories.
+
+        You are analyzing a call for relevance and compliance.
+
+        You will only answer the following questions based on the call contents:
+        1. Was there vulgarity on the call?
+        {include_recording_message_text}
+        {is_relevant_to_topic_text}
+    """
+
+    response = make_azure_openai_chat_request(system, joined_call_contents)
+    return response.choices[0].message.content
 
 @st.cache_data
+@shared_result("extractive_summary")
 def generate_extractive_summary(call_contents):
     """Generate an extractive summary of a call transcript. Key assumptions:
     - Azure AI Services Language service endpoint and key stored in Streamlit secrets."""
 
-    language_endpoint = st.secrets["language"]["endpoint"]
-    language_key = st.secrets["language"]["key"]
-
     # The call_contents parameter is formatted as a list of strings.
-    # Join them together with spaces to pass in as a single document.
-    joined_call_contents = ' '.join(call_contents)
-
-    return "This is a placeholder result. Fill in with real extractive summary."
+    # A short call is sent as a single document. A long one is split into
+    # chunks within the service's document limits, the chunks are summarized
+    # in parallel, and their summaries are summarized again. The chunk threads
+    # share this script run's context so cached functions work in them.
+    extractive_summary = get_extractive_summarizer().summarize(
+        call_contents, initializer=add_script_run_ctx, initargs=(None, get_script_run_ctx()))
+
+    # Return the summary as a JSON object in the shape {"call-summary": extractive_summary}
+    return {"call-summary": extractive_summary}
+
+def generate_extractive_summaries(documents):
+    """Generate an extractive summary of each document in one Language service job."""
+
+    # Start a job with the shared async TextAnalyticsClient, passing in the
+    # documents and an ExtractiveSummaryAction with a max_sentence_count of 2.
+    results = call_service("language", lambda client: analyze_actions(
+        client,
+        documents,
+        actions = [
+            textanalytics.ExtractiveSummaryAction(max_sentence_count=2)
+        ]
+    ), name="extractive_summary")
+
+    # Extract the summary sentences of each document and merge them into a single summary string.
+    return [extractive_summary_from_result(result[0])["call-summary"] for result in results]
+
+def extractive_summary_from_result(summary_result):
+    """Convert an ExtractiveSummaryAction result into the shape {"call-summary": extractive_summary}.
+    Raises RuntimeError if the document resulted in an error, so that it is not cached."""
+
+    if summary_result.is_error:
+        raise RuntimeError(f'Extractive summary resulted in an error with code "{summary_result.code}" and message "{summary_result.message}"')
+
+    extractive_summary = " ".join([sentence.text for sentence in summary_result.sentences])
+    return {"call-summary": extractive_summary}
 
 @st.cache_data
+@shared_result("abstractive_summary")
 def generate_abstractive_summary(call_contents):
     """Generate an abstractive summary of a call transcript. Key assumptions:
     - Azure AI Services Language service endpoint and key stored in Streamlit secrets."""
 
-    language_endpoint = st.secrets["language"]["endpoint"]
-    language_key = st.secrets["language"]["key"]
-
     # The call_contents parameter is formatted as a list of strings.
-    # Join them together with spaces to pass in as a single document.
-    joined_call_contents = ' '.join(call_contents)
+    # Long calls are summarized a chunk at a time, as for the extractive summary.
+    abstractive_summary = get_abstractive_summarizer().summarize(
+        call_contents, initializer=add_script_run_ctx, initargs=(None, get_script_run_ctx()))
+
+    # Return the summary as a JSON object in the shape {"call-summary": abstractive_summary}
+    return {"call-summary": abstractive_summary}
+
+def generate_abstractive_summaries(documents):
+    """Generate an abstractive summary of each document in one Language service job."""
+
+    # Start a job with the shared async TextAnalyticsClient, passing in
+    # the documents and an AbstractiveSummaryAction with a sentence_count of 2.
+    results = call_service("language", lambda client: analyze_actions(
+        client,
+        documents,
+        actions = [
+            textanalytics.AbstractiveSummaryAction(sentence_count=2)
+        ]
+    ), name="abstractive_summary")
+
+    # Extract the summary sentences of each document and merge them into a single summary string.
+    return [abstractive_summary_from_result(result[0])["call-summary"] for result in results]
 
-    return "This is a placeholder result. Fill in with real abstractive summary."
+def abstractive_summary_from_result(summary_result):
+    """Convert an AbstractiveSummaryAction result into the shape {"call-summary": abstractive_summary}.
+    Raises RuntimeError if the document resulted in an error, so that it is not cached."""
+
+    if summary_result.is_error:
+        raise RuntimeError(f'Abstractive summary resulted in an error with code "{summary_result.code}" and message "{summary_result.message}"')
+
+    abstractive_summary = " ".join([summary.text for summary in summary_result.summaries])
+    return {"call-summary": abstractive_summary}
 
 @st.cache_data
+@shared_result("query_based_summary")
 def generate_query_based_summary(call_contents):
     """Generate a query-based summary of a call transcript."""
 
     # The call_contents parameter is formatted as a list of strings.
-    # Join them together with spaces to pass in as a single document.
-    joined_call_contents = ' '.join(call_contents)
+    # A call that fits in the model's context goes straight to the final prompt.
+    # A longer one is summarized a chunk at a time first, and the final prompt
+    # is given the chunk summaries instead of the transcript.
+    return get_query_based_summarizer().summarize(
+        call_contents, initializer=add_script_run_ctx, initargs=(None, get_script_run_ctx()))
+
+def make_query_based_summary_request(call_contents):
+    """Generate the title and summary of a call from a single string that fits in the model's context."""
+
+    # Write a system prompt that instructs the large language model to:
+    #    - Generate a short (5 word) summary from the call transcript.
+    #    - Create a two-sentence summary of the call transcript.
+    #    - Output the response in JSON format, with the short summary
+    #       labeled 'call-title' and the longer summary labeled 'call-summary.'
+    system = """
+        Write a five-word summary and label it as call-title.
+        Write a two-sentence summary and label it as call-summary.
+
+        Output the results in JSON format.
+    """
+
+    # Call make_azure_openai_chat_request().
+    response = make_azure_openai_chat_request(system, call_contents)
+
+    # Return the summary.
+    return response.choices[0].message.content
+
+def summarize_call_parts(parts):
+    """Summarize each part of a long call transcript in a few sentences."""
+
+    system = """
+        You are summarizing one part of a longer call transcript for Contoso Suites,
+        a luxury hotel and resort chain. Write a summary of this part in at most
+        three sentences. Keep names, dates, requests and complaints.
+    """
+
+    return [make_azure_openai_chat_request(system, part).choices[0].message.content for part in parts]
+
+@st.cache_resource
+def get_transcript_chunker():
+    """Return the chunker that splits long transcripts. The optional [summarization]
+    secrets section may set max_chunk_tokens and max_chunk_characters."""
+
+    settings = st.secrets.get("summarization", {})
+    return TranscriptChunker(
+        max_chunk_tokens=int(settings.get("max_chunk_tokens", MAX_CHUNK_TOKENS)),
+        max_chunk_characters=int(settings.get("max_chunk_characters", MAX_CHUNK_CHARACTERS))
+    )
+
+def make_summarizer(summarize_batch, finalize=None, batch_size=1):
+    """Create a map-reduce summarizer. The optional [summarization] secrets
+    section may set max_in_flight, the number of concurrent chunk requests."""
+
+    settings = st.secrets.get("summarization", {})
+    return MapReduceSummarizer(
+        summarize_batch,
+        finalize=finalize,
+        chunker=get_transcript_chunker(),
+        batch_size=batch_size,
+        max_in_flight=int(settings.get("max_in_flight", MAX_IN_FLIGHT))
+    )
+
+# The summarizers, and the chunk summaries they cache, are shared across reruns and sessions.
+@st.cache_resource
+def get_extractive_summarizer():
+    return make_summarizer(generate_extractive_summaries, batch_size=LANGUAGE_SERVICE_BATCH_SIZE)
 
-    return "This is a placeholder result. Fill in with real query-based summary."
+@st.cache_resource
+def get_abstractive_summarizer():
+    return make_summarizer(generate_abstractive_summaries, batch_size=LANGUAGE_SERVICE_BATCH_SIZE)
+
+@st.cache_resource
+def get_query_based_summarizer():
+    return make_summarizer(summarize_call_parts, finalize=make_query_based_summary_request)
 
 @st.cache_data
+@shared_result("sentiment")
 def create_sentiment_analysis_and_opinion_mining_request(call_contents):
     """Analyze the sentiment of a call transcript and mine opinions. Key assumptions:
     - Azure AI Services Language service endpoint and key stored in Streamlit secrets."""
 
-    language_endpoint = st.secrets["language"]["endpoint"]
-    language_key = st.secrets["language"]["key"]
-
     # The call_contents parameter is formatted as a list of strings.
     # Join them together with spaces to pass in as a single document.
     joined_call_contents = ' '.join(call_contents)
 
-    return "This is a placeholder result. Fill in with real sentiment analysis."
+    # Analyze sentiment of call transcript with the shared async TextAnalyticsClient, enabling opinion mining.
+    result = call_service("language", lambda client: client.analyze_sentiment(
+        [joined_call_contents], show_opinion_mining=True), name="sentiment")
+
+    # Retrieve all document results that are not an error.
+    doc_result = [doc for doc in result if not doc.is_error]
+
+    sentiment = {}
+    for document in doc_result:
+        sentiment = sentiment_from_document(document)
+
+    return sentiment
+
+def sentiment_from_document(document):
+    """Convert a sentiment analysis document result, with mined opinions, into a dictionary."""
+
+    sentiment = {}
+    if not document.is_error:
+        sentiment["sentiment"] = document.sentiment
+        sentiment["sentiment-scores"] = {
+            "positive": document.confidence_scores.positive,
+            "neutral": document.confidence_scores.neutral,
+            "negative": document.confidence_scores.negative
+        }
+
+        sentences = []
+        for s in document.sentences:
+            sentence = {}
+            sentence["text"] = s.text
+            sentence["sentiment"] = s.sentiment
+            sentence["sentiment-scores"] = {
+                "positive": s.confidence_scores.positive,
+                "neutral": s.confidence_scores.neutral,
+                "negative": s.confidence_scores.negative
+            }
 
-def make_azure_openai_embedding_request(text):
-    """Create and return a new embedding request. Key assumptions:
-    - Azure OpenAI endpoint, key, and deployment name stored in Streamlit secrets."""
+            mined_opinions = []
+            for mined_opinion in s.mined_opinions:
+                opinion = {}
+                opinion["target-text"] = mined_opinion.target.text
+                opinion["target-sentiment"] = mined_opinion.target.sentiment
+                opinion["sentiment-scores"] = {
+                    "positive": mined_opinion.target.confidence_scores.positive,
+                    "negative": mined_opinion.target.confidence_scores.negative,
+                }
+
+                opinion_assessments = []
+                for assessment in mined_opinion.assessments:
+                    opinion_assessment = {}
+                    opinion_assessment["text"] = assessment.text
+                    opinion_assessment["sentiment"] = assessment.sentiment
+                    opinion_assessment["sentiment-scores"] = {
+                        "positive": assessment.confidence_scores.positive,
+                        "negative": assessment.confidence_scores.negative
+                    }
+                    opinion_assessments.append(opinion_assessment)
+
+                opinion["assessments"] = opinion_assessments
+                mined_opinions.append(opinion)
+
+            sentence["mined_opinions"] = mined_opinions
+            sentences.append(sentence)
+
+        sentiment["sentences"] = sentences
+
+    return sentiment
 
-    return "This is a placeholder result. Fill in with real embedding."
+@st.cache_data
+@shared_result("language_analysis")
+def analyze_call_with_language_service(call_contents):
+    """Generate the extractive summary, abstractive summary and sentiment with mined opinions
+    of a call transcript in a single Language service job. Key assumptions:
+    - Azure AI Services Language service endpoint and key stored in Streamlit secrets."""
 
-def normalize_text(s):
-    """Normalize text for tokenization."""
+    # A call too long for one document is summarized a chunk at a time instead.
+    if len(get_transcript_chunker().split(call_contents)) > 1:
+        return {
+            "extractive_summary": generate_extractive_summary(call_contents),
+            "abstractive_summary": generate_abstractive_summary(call_contents),
+            "sentiment_and_mined_opinions": create_sentiment_analysis_and_opinion_mining_request(call_contents)
+        }
 
-    s = re.sub(r'\s+',  ' ', s).strip()
-    s = re.sub(r". ,","",s)
-    # remove all instances of multiple spaces
-    s = s.replace("..",".")
-    s = s.replace(". .",".")
-    s = s.replace("\n", "")
-    s = s.strip()
+    joined_call_contents = ' '.join(call_contents)
 
-    return s
+    # One job runs every action on the same document, instead of one round trip per action.
+    results = call_service("language", lambda client: analyze_actions(
+        client,
+        [joined_call_contents],
+        actions = [
+            textanalytics.ExtractiveSummaryAction(max_sentence_count=2),
+            textanalytics.AbstractiveSummaryAction(sentence_count=2),
+            textanalytics.AnalyzeSentimentAction(show_opinion_mining=True)
+        ]
+    ), name="call_analysis")
+
+    # Raise rather than return empty results, which the result caches would keep.
+    if not results:
+        raise RuntimeError("The Language service returned no results for the call.")
+
+    # There is one document, whose results come back in the same order as the actions.
+    extractive_result, abstractive_result, sentiment_result = results[0]
+    return {
+        "extractive_summary": extractive_summary_from_result(extractive_result),
+        "abstractive_summary": abstractive_summary_from_result(abstractive_result),
+        "sentiment_and_mined_opinions": sentiment_from_document(sentiment_result)
+    }
+
+def analyze_call(call_contents, include_recording_message, is_relevant_to_topic):
+    """Run every analysis of a call transcript at the same time.
+    The Language service job and the two Azure OpenAI requests are independent,
+    so the total time is that of the slowest one. Returns the results keyed by
+    the session state keys the tabs display."""
+
+    # Worker threads share this script run's context so cached functions and st.error() work in them.
+    with ThreadPoolExecutor(max_workers=3, initializer=add_script_run_ctx,
+                            initargs=(None, get_script_run_ctx())) as executor:
+        language_future = executor.submit(analyze_call_with_language_service, call_contents)
+        compliance_future = executor.submit(
+            is_call_in_compliance, call_contents, include_recording_message, is_relevant_to_topic)
+        openai_summary_future = executor.submit(generate_query_based_summary, call_contents)
+
+        return {
+            **language_future.result(),
+            "compliance_results": compliance_future.result(),
+            "openai_summary": openai_summary_future.result()
+        }
 
 def generate_embeddings_for_call_contents(call_contents):
     """Generate embeddings for call contents. Key assumptions:
     - Call contents is a single string.
     - Azure OpenAI endpoint, key, and deployment name stored in Streamlit secrets."""
 
-    # Normalize the text for tokenization
-    # Call make_azure_openai_embedding_request() with the normalized content
-    # Return the embeddings
+    # get_embedding() normalizes the text for tokenization and only calls
+    # make_azure_openai_embedding_request() for text it has not embedded before.
+    return get_embedding(call_contents)
 
-    return [0, 0, 0]
+def is_transcript_saved(call_transcript):
+    """Check whether a transcript is already in Cosmos DB, using the local index before a point read."""
 
-def save_transcript_to_cosmos_db(transcript_item):
+    container = get_cosmos_container("CallTranscripts")
+    # The transcript store uses the sync container, shared with the batch pipeline; it runs
+    # on a worker thread under the Cosmos DB concurrency limit, deadline and retries.
+    return call_service("cosmos", lambda _: is_transcript_stored(
+        container, call_transcript, local_index=get_transcript_index()), blocking=True, name="read_transcript")
+
+def save_transcript_to_cosmos_db(transcript_items):
     """Save embeddings to Cosmos DB vector store. Key assumptions:
-    - transcript_item is a JSON object containing call_id (int), 
+    - transcript_items is a JSON object, or a list of them, containing call_id (int), 
         call_transcript (string), and request_vector (list).
     - Cosmos DB endpoint, client_id, and database name stored in Streamlit secrets."""
 
-    cosmos_client_id = st.secrets["cosmos"]["client_id"]
-    cosmos_credentials = DefaultAzureCredential(managed_identity_client_id=cosmos_client_id)
+    if isinstance(transcript_items, dict):
+        transcript_items = [transcript_items]
+    # Store request_vector in the codec set by vector_codec in the [cosmos] secrets section.
+    transcript_items = [encode_transcript_vector(item) for item in transcript_items]
 
-    cosmos_endpoint = st.secrets["cosmos"]["endpoint"]
-    cosmos_database_name = st.secrets["cosmos"]["database_name"]
     cosmos_container_name = "CallTranscripts"
 
-    # Create a CosmosClient
-    # Load the Cosmos database and container
-    # Insert the call transcript
+    # Load the shared Cosmos container client
+    container = get_cosmos_container(cosmos_container_name)
+
+    # Upsert the call transcripts in transactional batches per call_id, under the Cosmos DB
+    # concurrency limit, deadline and retries. IDs derive from the transcript text, so saving
+    # again, or retrying, overwrites instead of duplicating.
+    result = call_service("cosmos", lambda _: save_transcripts(container, transcript_items),
+                          blocking=True, name="save_transcripts")
+
+    # Append the transcripts to the local vector index used by the search page.
+    add_transcripts_to_index(transcript_items)
+    return result
 
 ####################### HELPER FUNCTIONS FOR MAIN() #######################
+@instrumented("phase", "audio_transcription")
 def perform_audio_transcription(uploaded_file):
     """Generate a transcription of an uploaded audio file."""
 
     st.audio(uploaded_file, format='audio/wav')
     with st.spinner("Transcribing the call..."):
-        all_results = create_transcription_request(uploaded_file)
+        # Show each segment as soon as the Speech service finalizes it.
+        transcript_placeholder = st.empty()
+
+        def transcribe():
+            # The Speech SDK runs on a worker thread under the speech concurrency limit
+            # and deadline, and hands each segment to this thread to show.
+            segments = queue.Queue()
+
+            def stream(_client):
+                for segment in stream_transcription_request(uploaded_file):
+                    segments.put(segment)
+
+            # A retry would stream the segments again, so the call is attempted once.
+            future = submit_service("speech", stream, blocking=True, retry=RetryPolicy(max_attempts=1),
+                                    name="stream_transcription")
+            all_results = []
+            while not (future.done() and segments.empty()):
+                try:
+                    all_results.append(segments.get(timeout=0.1))
+                except queue.Empty:
+                    continue
+                transcript_placeholder.write(all_results)
+            # Raises the transcription's error, or DeadlineExceeded.
+            future.result()
+            return all_results
+
+        # A file transcribed before, by this or another replica, comes from the
+        # result cache; if it is being transcribed right now, wait for that instead.
+        all_results = get_result_cache().get_or_compute(transcription_cache_key(uploaded_file), transcribe)
+        transcript_placeholder.empty()
         return all_results
 
+@instrumented("phase", "compliance_check")
 def perform_compliance_check(call_contents, include_recording_message, is_relevant_to_topic):
     """Perform a compliance check on a call transcript."""
 
@@ -213,6 +518,21 @@ def perform_compliance_check(call_contents, include_recording_message, is_releva
         else:
             st.write("Please upload an audio file before checking for compliance.")
 
+@instrumented("phase", "full_analysis")
+def perform_full_analysis(include_recording_message, is_relevant_to_topic):
+    """Run every analysis of a call transcript at once and fill in all of the tabs."""
+
+    if 'file_transcription_results' in st.session_state:
+        with st.spinner("Analyzing the call..."):
+            start = time.perf_counter()
+            results = analyze_call(st.session_state.file_transcription_results,
+                                   include_recording_message, is_relevant_to_topic)
+            st.session_state.update(results)
+            st.success(f"Analysis complete in {time.perf_counter() - start:.1f} seconds!")
+    else:
+        st.error("Please upload an audio file before attempting to analyze the call.")
+
+@instrumented("phase", "extractive_summary_generation")
 def perform_extractive_summary_generation():
     """Generate an extractive summary of a call transcript.
     That is, a summary that extracts key sentences from the call transcript."""
@@ -238,6 +558,7 @@ def perform_extractive_summary_generation():
     else:
         st.error("Please upload an audio file before attempting to generate a summary.")
 
+@instrumented("phase", "abstractive_summary_generation")
 def perform_abstractive_summary_generation():
     """Generate an abstractive summary of a call transcript.
     That is, a summary that generates new sentences to summarize the call transcript."""
@@ -260,6 +581,7 @@ def perform_abstractive_summary_generation():
     else:
         st.error("Please upload an audio file before attempting to generate a summary.")
 
+@instrumented("phase", "openai_summary")
 def perform_openai_summary():
     """Generate a query-based summary of a call transcript."""
 
@@ -279,6 +601,7 @@ def perform_openai_summary():
     else:
         st.error("Please upload an audio file before attempting to generate a summary.")
 
+@instrumented("phase", "sentiment_analysis_and_opinion_mining")
 def perform_sentiment_analysis_and_opinion_mining():
     """Analyze the sentiment of a call transcript and mine opinions."""
 
@@ -300,6 +623,7 @@ def perform_sentiment_analysis_and_opinion_mining():
     else:
         st.error("Please upload an audio file before attempting to analyze sentiment.")
 
+@instrumented("phase", "save_embeddings_to_cosmos_db")
 def perform_save_embeddings_to_cosmos_db():
     """Save embeddings to Cosmos DB vector store."""
 
@@ -309,22 +633,21 @@ def perform_save_embeddings_to_cosmos_db():
         # Use st.spinner() to wrap the embeddings saving process.
         with st.spinner("Saving embeddings to Cosmos DB..."):
             ftr = ' '.join(st.session_state.file_transcription_results)
-            # Generate a call ID based on the text.
-            # This is for demonstration purposes--a real system should use a unique ID.
-            call_id = abs(hash(ftr)) % (10 ** 8)
+            # The call ID and document ID derive from the text, so a transcript
+            # that is already saved does not need to be embedded again.
+            if is_transcript_saved(ftr):
+                st.session_state.embedding_status = "Transcript and embeddings already saved for this audio."
+                st.info("This transcript is already saved in Cosmos DB.")
+                return
             embeddings = generate_embeddings_for_call_contents(ftr)
-            transcript_item = {
-                "id": f'{call_id}_{uuid.uuid4()}',
-                "call_id": call_id,
-                "call_transcript": ftr,
-                "request_vector": embeddings
-            }
+            transcript_item = make_transcript_item(ftr, embeddings)
             save_transcript_to_cosmos_db(transcript_item)
             st.session_state.embedding_status = "Transcript and embeddings saved for this audio."
             st.success("Embeddings saved to Cosmos DB!")
     else:
         st.error("Please upload an audio file before attempting to save embeddings.")
 
+@instrumented("page", "Call Center")
 def main():
     """Main function for the call center dashboard."""
 
@@ -342,8 +665,14 @@ def main():
     st.write("## Upload a Call")
 
     uploaded_file = st.file_uploader("Upload an audio file", type="wav")
-    if uploaded_file is not None and ('file_transcription_results' not in st.session_state):
+    # Transcription results live in session state, keyed by the upload,
+    # so reruns do not transcribe (or hash) the same file again.
+    if uploaded_file is not None and st.session_state.get('transcribed_file_id') != uploaded_file.file_id:
+        # Results computed for a previous upload no longer apply.
+        for key in ANALYSIS_RESULT_KEYS:
+            st.session_state.pop(key, None)
         st.session_state.file_transcription_results = perform_audio_transcription(uploaded_file)
+        st.session_state.transcribed_file_id = uploaded_file.file_id
         st.success("Transcription complete!")
 
     if 'file_transcription_results' in st.session_state:
@@ -351,6 +680,11 @@ def main():
 
     st.write("## Transcription Operations")
 
+    # The checkboxes live on the Compliance tab; their keys make their values available here.
+    if st.button("Analyze everything"):
+        perform_full_analysis(st.session_state.get("include_recording_message", False),
+                              st.session_state.get("is_relevant_to_topic", False))
+
     comp, esum, asum, osum, sent, db = st.tabs(["Compliance",
         "Extractive Summary", "Abstractive Summary", "Azure OpenAI Summary",
         "Sentiment and Opinions", "Save to DB"])
@@ -358,8 +692,10 @@ def main():
     with comp:
         st.write("## Is Your Call in Compliance?")
 
-        include_recording_message = st.checkbox("Call needs an indicator we are recording it")
-        is_relevant_to_topic = st.checkbox("Call is relevant to the hotel and resort industry")
+        include_recording_message = st.checkbox("Call needs an indicator we are recording it",
+            key="include_recording_message")
+        is_relevant_to_topic = st.checkbox("Call is relevant to the hotel and resort industry",
+            key="is_relevant_to_topic")
 
         if st.button("Check for Compliance"):
             perform_compliance_check(call_contents, include_recording_message, is_relevant_to_topic)
@@ -403,5 +739,7 @@ def main():
         if 'embedding_status' in st.session_state:
             st.write(st.session_state.embedding_status)
 
+    show_rate_limit_stats()
+
 if __name__ == "__main__":
     main()
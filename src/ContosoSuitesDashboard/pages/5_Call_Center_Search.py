@@ -1,34 +1,72 @@
+from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
-from azure.cosmos import CosmosClient
-import openai
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from core.embeddings import get_embedding
+from core.services import call_service, query_items
+from core.telemetry import instrumented, measure
+from core.transcript_index import (
+    build_transcript_ann_index,
+    build_transcript_compact_index,
+    encode_transcript_query_vector,
+    get_index_settings,
+    get_transcript_index,
+    hybrid_search_transcript_index,
+    is_transcript_index_loaded,
+    load_transcript_index_from_cosmos,
+    search_transcript_index,
+    search_transcript_lexical_index
+)
 
 st.set_page_config(layout="wide")
 
-def make_azure_openai_embedding_request(text):
-    """Create and return a new embedding request. Key assumptions:
-    - Azure OpenAI endpoint, key, and deployment name stored in Streamlit secrets."""
-
-    return "This is a placeholder result. Fill in with real embedding."
+SEARCH_MODES = ("Hybrid", "Vector")
 
 def make_cosmos_db_vector_search_request(query_embedding, max_results=5, minimum_similarity_score=0.5):
     """Create and return a new vector search request. Key assumptions:
     - Query embedding is a list of floats based on a search string.
     - Cosmos DB endpoint, client_id, and database name stored in Streamlit secrets."""
 
-    cosmos_client_id = st.secrets["cosmos"]["client_id"]
-    cosmos_credentials = DefaultAzureCredential(managed_identity_client_id=cosmos_client_id)
-
-    cosmos_endpoint = st.secrets["cosmos"]["endpoint"]
-    cosmos_database_name = st.secrets["cosmos"]["database_name"]
     cosmos_container_name = "CallTranscripts"
 
-    # Create a CosmosClient
-    # Load the Cosmos database and container
+    query = f"""
+            SELECT TOP {max_results}
+                c.id,
+                c.call_id,
+                c.call_transcript,
+                c.abstractive_summary,
+                VectorDistance(c.request_vector, @request_vector) AS SimilarityScore
+            FROM c
+            WHERE
+                VectorDistance(c.request_vector, @request_vector) > {minimum_similarity_score}
+            ORDER BY
+                VectorDistance(c.request_vector, @request_vector)
+            """
+
+    # Run the query with the shared async Cosmos client, which queries across partitions.
+    return call_service("cosmos", lambda client: query_items(
+        client, cosmos_container_name, query,
+        parameters=[
+            # The stored request_vector may be float16-rounded or int8 codes; the query matches its form.
+            {"name": "@request_vector", "value": encode_transcript_query_vector(query_embedding)}
+        ]
+    ), name="vector_search")
+
+def hybrid_search_request(query, max_results=5, minimum_similarity_score=0.5):
+    """Search the local index by keywords and by embedding similarity, and fuse the results.
+    The keyword search runs while the query is being embedded."""
 
-    # Create and return a new vector search request
-    return "This is a stub result. Fill in with real search results."
+    # The worker shares this script run's context so the cached embedding functions work in it.
+    with ThreadPoolExecutor(max_workers=1, initializer=add_script_run_ctx,
+                            initargs=(None, get_script_run_ctx())) as executor:
+        query_embedding = executor.submit(get_embedding, query)
+        with measure("lexical_index", "search"):
+            lexical_hits = search_transcript_lexical_index(query)
+        query_embedding = query_embedding.result()
+    with measure("vector_index", "hybrid_search"):
+        return hybrid_search_transcript_index(lexical_hits, query_embedding, max_results, minimum_similarity_score)
 
 
+@instrumented("page", "Call Center Search")
 def main():
     """Main function for the call center search dashboard."""
 
@@ -42,16 +80,53 @@ def main():
     """
     )
 
+    with st.sidebar:
+        st.write(f"Local transcript index: {len(get_transcript_index())} transcripts")
+        if not is_transcript_index_loaded():
+            st.caption("Searches use Cosmos DB until the transcripts are loaded into the local index.")
+        if st.button("Load transcripts from Cosmos DB"):
+            with st.spinner("Loading transcripts into the local index..."):
+                added = load_transcript_index_from_cosmos()
+            st.success(f"Added {added} transcripts to the local index.")
+        if get_index_settings().get("kind") == "ivf" and st.button("Rebuild approximate index"):
+            if len(get_transcript_index()) == 0:
+                st.error("Load transcripts into the local index before building the approximate index.")
+            else:
+                with st.spinner("Building the approximate index..."):
+                    ann_index = build_transcript_ann_index()
+                st.success(f"Built {ann_index.nlist} lists over {len(ann_index)} transcripts.")
+        if get_index_settings().get("kind") == "compact" and st.button("Rebuild compact index"):
+            if len(get_transcript_index()) == 0:
+                st.error("Load transcripts into the local index before building the compact index.")
+            else:
+                with st.spinner("Encoding the transcript vectors..."):
+                    compact_index = build_transcript_compact_index()
+                st.success(f"Encoded {len(compact_index)} transcripts in {compact_index.memory_bytes() / 2**20:.1f} MB.")
+
     st.write("## Search for Text")
 
     query = st.text_input("Query:", key="query")
     max_results = st.number_input("Max Results:", min_value=1, max_value=10, value=5)
     minimum_similarity_score = st.slider("Minimum Similarity Score:", min_value=0.0, max_value=1.0, value=0.5, step=0.01)
+    search_mode = st.radio("Search mode:", SEARCH_MODES, horizontal=True,
+        help="Hybrid also finds exact matches on room numbers, booking codes and names. "
+             "It needs the local transcript index to be loaded from Cosmos DB.")
     if st.button("Submit"):
         with st.spinner("Searching transcripts..."):
             if query:
-                query_embedding = make_azure_openai_embedding_request(query).data[0].embedding
-                response = make_cosmos_db_vector_search_request(query_embedding, max_results, minimum_similarity_score)
+                # Search the local index once it holds every transcript; until then it only has
+                # the ones saved on this host, so Cosmos DB is searched instead.
+                index_loaded = is_transcript_index_loaded()
+                if index_loaded and search_mode == "Hybrid":
+                    response = hybrid_search_request(query, max_results, minimum_similarity_score)
+                elif index_loaded:
+                    # Repeated queries are served from the shared embedding cache.
+                    query_embedding = get_embedding(query)
+                    with measure("vector_index", "search"):
+                        response = search_transcript_index(query_embedding, max_results, minimum_similarity_score)
+                else:
+                    query_embedding = get_embedding(query)
+                    response = make_cosmos_db_vector_search_request(query_embedding, max_results, minimum_similarity_score)
                 for item in response:
                     st.write(item)
                 st.success("Transcript search completed successfully.")
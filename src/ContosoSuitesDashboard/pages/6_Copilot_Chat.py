@@ -1,15 +1,29 @@
-import requests
 import streamlit as st
+from core.streaming import iter_response_text, render_stream
+from core.telemetry import instrumented, measure
+from core.webapi import get_webapi_client
 
 st.set_page_config(layout="wide")
 
+# Some of the Copilot's database calls take longer than the default timeout.
+COPILOT_TIMEOUT_SECONDS = 60
+
+def stream_message_to_copilot(message):
+    """Send a message to the Copilot chat endpoint and yield the response text as it arrives."""
+
+    client = get_webapi_client()
+    with measure("webapi", "POST /MaintenanceCopilotChat stream") as measurement, \
+            client.stream("POST", "/MaintenanceCopilotChat", json=message, timeout=COPILOT_TIMEOUT_SECONDS) as response:
+        response.raise_for_status()
+        yield from iter_response_text(response)
+        measurement.payload_bytes = response.num_bytes_downloaded
+
 def send_message_to_copilot(message):
     """Send a message to the Copilot chat endpoint."""
-    api_endpoint = st.secrets["api"]["endpoint"]
-    # Exercise 5 Task 2 TODO #11: Send a POST request to the Copilot chat endpoint with the user message and assign the return value to response.
-    response = ""
-    return response.text
 
+    return "".join(stream_message_to_copilot(message))
+
+@instrumented("page", "Copilot Chat")
 def main():
     """Main function for the Maintenance Copilot Chat Streamlit page."""
 
@@ -36,18 +50,18 @@ def main():
     # React to user input
     if prompt := st.chat_input("How I can help you today?"):
         with st.spinner("Awaiting the Copilot's response to your question..."):
-            # Exercise 5 Task 2 TODO #10: Set up a conversational chat interface with the Copilot using the steps below.
-            pass # Remove this once you have defined the conversational chat interface
-
             # Display user message in chat message container
+            st.chat_message("user").markdown(prompt)
 
             # Add user message to chat history
+            st.session_state.chat_messages.append({"role": "user", "content": prompt})
 
-            # Send user message to Copilot and get response
-
-            # Display assistant response in chat message container
+            # Send user message to Copilot and display the response in a chat
+            # message container as it arrives
+            response = render_stream(st.chat_message("assistant"), stream_message_to_copilot(prompt))
 
             # Add assistant response to chat history
+            st.session_state.chat_messages.append({"role": "assistant", "content": response})
 
 if __name__ == "__main__":
-    main()        
+    main()
@@ -0,0 +1,68 @@
+"""Process a directory of recorded calls without the dashboard.
+
+Runs every WAV file through the Call Center page's stages and prints a
+throughput report. Run it from this directory so the Streamlit secrets in
+.streamlit/secrets.toml are found:
+
+    python process_calls.py recordings/ --max-calls 8 --audio-workers 4
+
+Progress is checkpointed in --state-dir; run the same command again to
+resume after an interruption or to retry failed calls."""
+
+import argparse
+import json
+import logging
+
+from core.call_pipeline import (
+    DEFAULT_SERVICE_CONCURRENCY,
+    DEFAULT_STATE_DIR,
+    CallPipeline,
+    find_recordings,
+    load_call_center_page
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("directory", help="Directory of WAV recordings.")
+    parser.add_argument("--state-dir", default=DEFAULT_STATE_DIR)
+    parser.add_argument("--max-calls", type=int, default=8, help="Calls in flight at once.")
+    parser.add_argument("--audio-workers", type=int, default=None, help="Processes for audio normalization.")
+    for service, limit in DEFAULT_SERVICE_CONCURRENCY.items():
+        parser.add_argument(f"--{service}-concurrency", type=int, default=limit)
+    parser.add_argument("--no-recording-message", action="store_true",
+                        help="Do not require an indicator that the call is recorded.")
+    parser.add_argument("--any-topic", action="store_true",
+                        help="Do not require the call to be relevant to the hotel and resort industry.")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    args = parser.parse_args()
+    # Progress of each call goes to stderr, so --json output stays parseable.
+    # Only the pipeline logs at INFO; the Azure SDKs log every request at that level.
+    logging.basicConfig(format="%(message)s")
+    logging.getLogger("core.call_pipeline").setLevel(logging.INFO)
+
+    pipeline = CallPipeline(
+        load_call_center_page(),
+        state_dir=args.state_dir,
+        audio_workers=args.audio_workers,
+        max_calls=args.max_calls,
+        service_concurrency={service: getattr(args, f"{service}_concurrency") for service in DEFAULT_SERVICE_CONCURRENCY},
+        include_recording_message=not args.no_recording_message,
+        is_relevant_to_topic=not args.any_topic
+    )
+    report = pipeline.run(find_recordings(args.directory))
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"Processed {report['processed']}, skipped {report['skipped']} already done, {report['failed']} failed "
+          f"in {report['elapsed_s']:.1f} s")
+    print(f"Throughput: {report['calls_per_hour']:.1f} calls/hour, "
+          f"{report['audio_hours_per_hour']:.2f} hours of audio per hour")
+    print(f"{'stage':<20}{'count':>8}{'mean_s':>10}{'max_s':>10}")
+    for stage, timing in report["stages"].items():
+        print(f"{stage:<20}{timing['count']:>8}{timing['mean_s']:>10.2f}{timing['max_s']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()